@@ -0,0 +1,24 @@
+"""
+Offline benchmarks for condor_watch_q.
+
+None of these need a running HTCondor pool:
+
+- ``benchmarks.generate`` writes synthetic job event logs.
+- ``benchmarks.fake_htcondor`` is an in-process stand-in for the parts of the
+  ``htcondor`` and ``classad`` modules that condor_watch_q uses.
+- ``benchmarks.run`` times discovery, event processing, aggregation and table
+  rendering at several job counts, and saves the results as JSON so that runs
+  can be compared.
+- ``benchmarks.redraw`` counts the bytes written to the terminal to redraw a
+  large table.
+- ``benchmarks.startup`` times importing condor_watch_q and printing -help,
+  and checks that neither loads the HTCondor bindings.
+- ``benchmarks.rotation`` rotates and truncates event logs while they are
+  being read, and checks that the tracked job states stay correct.
+- ``benchmarks.backlog`` measures how long jobs in a small event log take to
+  show up while a large backlog in another event log is being read.
+- ``benchmarks.shared_log`` measures the time and memory it takes to follow a
+  few clusters in an event log shared with many others.
+
+Run them from the root of the repository, e.g. ``python -m benchmarks.run``.
+"""
@@ -0,0 +1,185 @@
+"""
+Measure how current a small, active event log stays while a large backlog in
+another event log is being read, with and without a time budget per pass.
+
+    python -m benchmarks.backlog --backlog-jobs 50000 --reader htcondor
+"""
+
+import argparse
+import datetime
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks import fake_htcondor, generate
+
+
+def write_backlog(path, num_jobs, procs_per_cluster, seed):
+    rng = random.Random(seed)
+    start = datetime.datetime(2020, 1, 1)
+    with open(path, "w") as f:
+        for cluster_id in range(1, num_jobs // procs_per_cluster + 1):
+            generate.write_cluster(
+                f,
+                rng,
+                cluster_id,
+                procs_per_cluster,
+                generate.DEFAULT_MIX,
+                "bench",
+                start,
+            )
+
+
+def submit(path, cluster_id):
+    with open(path, "a") as f:
+        f.write(
+            "000 ({}.000.000) 2020-01-01 00:00:00 Job submitted from host: <10.0.0.1:9618>\n...\n".format(
+                cluster_id
+            )
+        )
+
+
+def run(cwq, backlog_path, active_path, reader, max_events, max_seconds, interval):
+    """
+    Read both event logs the way the ingester does, while another thread
+    submits a job to the active event log every interval seconds. Returns how
+    long the backlog took to read and how long each submitted job took to
+    show up.
+    """
+    open(active_path, "w").close()
+    tracker = cwq.JobStateTracker(
+        [backlog_path, active_path], {}, group_by="cluster_id", reader=reader
+    )
+
+    submitted = {}
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def submitter():
+        # the active event log's jobs get cluster ids the backlog doesn't use
+        cluster_id = 10**9
+        while not done.wait(interval):
+            submit(active_path, cluster_id)
+            with lock:
+                submitted[cluster_id] = time.time()
+            cluster_id += 1
+
+    thread = threading.Thread(target=submitter)
+    thread.start()
+
+    latencies = []
+
+    def record_latencies():
+        now = time.time()
+        with lock:
+            for cluster_id in list(submitted):
+                if cluster_id in tracker.cluster_id_to_cluster:
+                    latencies.append(now - submitted.pop(cluster_id))
+
+    start = time.time()
+    try:
+        # new events in the active event log are noticed between passes
+        pending = {backlog_path, active_path}
+        while backlog_path in pending:
+            tracker.process_events(
+                pending, max_events=max_events, max_seconds=max_seconds
+            )
+            pending = set(tracker.behind) | {active_path}
+            record_latencies()
+        backlog_done = time.time() - start
+    finally:
+        done.set()
+        thread.join()
+
+    # the jobs submitted during the last pass
+    tracker.process_events([active_path])
+    record_latencies()
+    tracker.close()
+
+    return backlog_done, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--backlog-jobs", type=int, default=50000)
+    parser.add_argument("--procs-per-cluster", type=int, default=100)
+    parser.add_argument("--reader", choices=("htcondor", "scan"), default="htcondor")
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=20000,
+        help="Read at most this many events from each event log per pass, when limited.",
+    )
+    parser.add_argument(
+        "--batch-seconds",
+        type=float,
+        default=0.25,
+        help="The time budget per pass, when one is used.",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=0.05,
+        help="Submit a job to the active event log this often.",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    fake_htcondor.install()
+    import condor_watch_q as cwq
+
+    directory = tempfile.mkdtemp()
+    try:
+        backlog_path = os.path.join(directory, "backlog.log")
+        active_path = os.path.join(directory, "active.log")
+        write_backlog(
+            backlog_path, args.backlog_jobs, args.procs_per_cluster, args.seed
+        )
+        print(
+            "{} reader, backlog of {} jobs ({:.1f} MB)".format(
+                args.reader,
+                args.backlog_jobs,
+                os.path.getsize(backlog_path) / 1024.0 / 1024.0,
+            )
+        )
+
+        for name, max_events, max_seconds in (
+            ("drain each log", None, None),
+            ("{} events".format(args.batch_size), args.batch_size, None),
+            (
+                "{:g}s per pass".format(args.batch_seconds),
+                args.batch_size,
+                args.batch_seconds,
+            ),
+        ):
+            backlog_done, latencies = run(
+                cwq,
+                backlog_path,
+                active_path,
+                args.reader,
+                max_events,
+                max_seconds,
+                args.interval,
+            )
+            latencies.sort()
+            print(
+                "{:<15} backlog read in {:6.2f}s; {:>4} jobs submitted meanwhile, seen after {:.3f}s on average, {:.3f}s at worst".format(
+                    name,
+                    backlog_done,
+                    len(latencies),
+                    sum(latencies) / max(1, len(latencies)),
+                    latencies[-1] if latencies else 0,
+                )
+            )
+    finally:
+        shutil.rmtree(directory)
+
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
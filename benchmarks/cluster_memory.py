@@ -0,0 +1,78 @@
+"""
+Measure how much memory it takes to hold job states in Cluster objects,
+compared to the dict-per-cluster layout that Cluster used to have.
+
+    python benchmarks/cluster_memory.py --jobs 1000000 --procs-per-cluster 1000
+"""
+
+import argparse
+import gc
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from condor_watch_q import Cluster, JobStatus
+
+
+class DictCluster:
+    """The old Cluster storage: one dict entry per job."""
+
+    def __init__(self, cluster_id, event_log_path, batch_name):
+        self.cluster_id = cluster_id
+        self.event_log_path = event_log_path
+        self._batch_name = batch_name
+
+        self.job_to_state = {}
+
+    def __setitem__(self, key, value):
+        self.job_to_state[key] = value
+
+
+def measure(cluster_type, num_jobs, procs_per_cluster, seed):
+    rng = random.Random(seed)
+    states = list(JobStatus)
+
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+
+    clusters = {}
+    for job in range(num_jobs):
+        cluster_id, proc_id = divmod(job, procs_per_cluster)
+        cluster = clusters.get(cluster_id)
+        if cluster is None:
+            cluster = clusters[cluster_id] = cluster_type(cluster_id, "log", None)
+        cluster[proc_id] = rng.choice(states)
+
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return after - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=1000000)
+    parser.add_argument("--procs-per-cluster", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    results = {}
+    for name, cluster_type in (("dict", DictCluster), ("compact", Cluster)):
+        nbytes = measure(cluster_type, args.jobs, args.procs_per_cluster, args.seed)
+        results[name] = nbytes
+        print(
+            "{:>8}: {:>12,} bytes total, {:>7.1f} bytes/job".format(
+                name, nbytes, nbytes / args.jobs
+            )
+        )
+
+    print("reduction: {:.1f}x".format(results["dict"] / max(results["compact"], 1)))
+
+
+if __name__ == "__main__":
+    main()
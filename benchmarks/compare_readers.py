@@ -0,0 +1,60 @@
+"""
+Check that the scanning event log reader produces exactly the same job state
+transitions as the HTCondor bindings' reader on recorded event logs, and
+compare how long each takes.
+
+    python benchmarks/compare_readers.py path/to/job.log [more.log ...]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from condor_watch_q import EVENT_LOG_READERS
+
+
+def read_all(reader_name, path):
+    start = time.perf_counter()
+    transitions, messages = EVENT_LOG_READERS[reader_name](path).read()
+    return transitions, messages, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("event_logs", nargs="+", metavar="EVENT_LOG")
+    args = parser.parse_args()
+
+    mismatches = 0
+    for path in args.event_logs:
+        expected, _, htcondor_time = read_all("htcondor", path)
+        actual, messages, scan_time = read_all("scan", path)
+
+        for message in messages:
+            print(message)
+
+        if actual == expected:
+            status = "OK"
+        else:
+            mismatches += 1
+            first_difference = next(
+                (index for index, (a, e) in enumerate(zip(actual, expected)) if a != e),
+                min(len(actual), len(expected)),
+            )
+            status = "MISMATCH at transition {} (htcondor: {}, scan: {})".format(
+                first_difference, len(expected), len(actual)
+            )
+
+        print(
+            "{}: {} transitions, htcondor {:.3f}s, scan {:.3f}s: {}".format(
+                path, len(expected), htcondor_time, scan_time, status
+            )
+        )
+
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
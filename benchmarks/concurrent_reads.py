@@ -0,0 +1,77 @@
+"""
+Compare reading many event logs one at a time with reading them in a pool of
+worker threads, when every read has some latency (like a log on NFS).
+
+    python benchmarks/concurrent_reads.py --logs 64 --latency 0.02 --workers 8
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from condor_watch_q import JobStateTracker, JobStatus
+
+
+class SlowReader:
+    """Stands in for an EventLogReader whose reads each take a while."""
+
+    def __init__(self, path, cluster_id, num_jobs, latency):
+        self.path = path
+        self.cluster_id = cluster_id
+        self.num_jobs = num_jobs
+        self.latency = latency
+        self.caught_up = True
+        self.truncations = []
+
+    def read(self, max_events=None):
+        time.sleep(self.latency)
+        transitions = [
+            (self.cluster_id, proc_id, status)
+            for status in (JobStatus.IDLE, JobStatus.RUNNING, JobStatus.COMPLETED)
+            for proc_id in range(self.num_jobs)
+        ]
+        return transitions, []
+
+    def close(self):
+        pass
+
+
+def run(num_logs, jobs_per_log, latency, workers):
+    tracker = JobStateTracker([], {}, read_workers=workers)
+    for cluster_id in range(num_logs):
+        path = "{}.log".format(cluster_id)
+        tracker.event_readers[path] = SlowReader(
+            path, cluster_id, jobs_per_log, latency
+        )
+
+    start = time.perf_counter()
+    tracker.process_events()
+    elapsed = time.perf_counter() - start
+    tracker.close()
+
+    assert tracker.totals[JobStatus.COMPLETED] == num_logs * jobs_per_log
+
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--logs", type=int, default=64)
+    parser.add_argument("--jobs-per-log", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    sequential = run(args.logs, args.jobs_per_log, args.latency, 1)
+    pooled = run(args.logs, args.jobs_per_log, args.latency, args.workers)
+
+    print("sequential: {:.3f}s".format(sequential))
+    print("{} workers: {:.3f}s".format(args.workers, pooled))
+    print("speedup: {:.1f}x".format(sequential / pooled))
+
+
+if __name__ == "__main__":
+    main()
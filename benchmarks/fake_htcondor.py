@@ -0,0 +1,348 @@
+"""
+An in-process stand-in for the parts of the htcondor and classad modules
+that condor_watch_q uses, so that it can be benchmarked without a pool.
+
+Call install() before importing condor_watch_q.
+
+The fake JobEventLog reads the text event log format and parses every
+event fully, including its body. That is roughly the work the real reader
+does, though the fake is slower because it is written in Python. The fake
+Schedd answers queries from a list of cluster ads, like the ones that
+benchmarks.generate.generate() returns. It expands each cluster ad into one
+ad per job (or, if the cluster ad has a ProcAds dict, into one ad for each
+proc id in it, with the attributes given there), and understands just
+enough of the constraints condor_watch_q sends to pick out cluster ads and
+skip already-seen clusters.
+"""
+
+import enum
+import itertools
+import re
+import sys
+import types
+
+
+class JobEventType(enum.IntEnum):
+    SUBMIT = 0
+    EXECUTE = 1
+    EXECUTABLE_ERROR = 2
+    CHECKPOINTED = 3
+    JOB_EVICTED = 4
+    JOB_TERMINATED = 5
+    IMAGE_SIZE = 6
+    SHADOW_EXCEPTION = 7
+    GENERIC = 8
+    JOB_ABORTED = 9
+    JOB_SUSPENDED = 10
+    JOB_UNSUSPENDED = 11
+    JOB_HELD = 12
+    JOB_RELEASED = 13
+    NODE_EXECUTE = 14
+    NODE_TERMINATED = 15
+    POST_SCRIPT_TERMINATED = 16
+    GLOBUS_SUBMIT = 17
+    GLOBUS_SUBMIT_FAILED = 18
+    GLOBUS_RESOURCE_UP = 19
+    GLOBUS_RESOURCE_DOWN = 20
+    REMOTE_ERROR = 21
+    JOB_DISCONNECTED = 22
+    JOB_RECONNECTED = 23
+    JOB_RECONNECT_FAILED = 24
+    GRID_RESOURCE_UP = 25
+    GRID_RESOURCE_DOWN = 26
+    GRID_SUBMIT = 27
+    JOB_AD_INFORMATION = 28
+    JOB_STATUS_UNKNOWN = 29
+    JOB_STATUS_KNOWN = 30
+    JOB_STAGE_IN = 31
+    JOB_STAGE_OUT = 32
+    ATTRIBUTE_UPDATE = 33
+    PRESKIP = 34
+    CLUSTER_SUBMIT = 35
+    CLUSTER_REMOVE = 36
+    FACTORY_PAUSED = 37
+    FACTORY_RESUMED = 38
+    NONE = 39
+    FILE_TRANSFER = 40
+    RESERVE_SPACE = 41
+    RELEASE_SPACE = 42
+    FILE_COMPLETE = 43
+    FILE_USED = 44
+    FILE_REMOVED = 45
+    DATAFLOW_JOB_SKIPPED = 46
+
+
+class DaemonTypes(enum.Enum):
+    Schedd = "Schedd"
+
+
+class JobEvent:
+    def __init__(self, type, cluster, proc, timestamp, body):
+        self.type = type
+        self.cluster = cluster
+        self.proc = proc
+        self.timestamp = timestamp
+        self._body = body
+
+    def __getitem__(self, key):
+        return self._body[key]
+
+    def get(self, key, default=None):
+        return self._body.get(key, default)
+
+
+EVENT_HEADER_RE = re.compile(r"(\d+) \((\d+)\.(\d+)\.\d+\) (\S+ \S+) (.*)")
+BODY_VALUE_RE = re.compile(r"\s*(\S+)\s+-\s+(.*)")
+
+
+class JobEventLog:
+    def __init__(self, filename):
+        self._filename = filename
+        self._file = open(filename, "r")
+        self._offset = 0
+
+    def events(self, stop_after=None):
+        return self
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        self._file.seek(self._offset)
+
+        lines = []
+        while True:
+            line = self._file.readline()
+            if not line.endswith("\n"):  # end of file, or a partial line
+                raise StopIteration
+            if line == "...\n":
+                break
+            lines.append(line)
+
+        self._offset = self._file.tell()
+
+        match = EVENT_HEADER_RE.match(lines[0])
+        if match is None:
+            raise ValueError("bad event header: {!r}".format(lines[0]))
+
+        body = {"Message": match.group(5)}
+        for line in lines[1:]:
+            value = BODY_VALUE_RE.match(line)
+            if value is not None:
+                body[value.group(2).strip()] = value.group(1)
+
+        # event types newer than these are kept as plain numbers
+        event_type = int(match.group(1))
+        if event_type in JobEventType._value2member_map_:
+            event_type = JobEventType(event_type)
+
+        return JobEvent(
+            type=event_type,
+            cluster=int(match.group(2)),
+            proc=int(match.group(3)),
+            timestamp=match.group(4),
+            body=body,
+        )
+
+    next = __next__
+
+    def close(self):
+        self._file.close()
+
+    def __getstate__(self):
+        return {"filename": self._filename, "offset": self._offset}
+
+    def __setstate__(self, state):
+        self.__init__(state["filename"])
+        self._offset = state["offset"]
+
+
+class QueryOpts(enum.IntEnum):
+    Default = 0
+    IncludeClusterAd = 0x10
+
+
+CONSTRAINT_CLAUSE_RE = re.compile(r"(\w+) == (\S+)")
+PROC_ID_RE = re.compile(r"ProcId (==|>=|>) (\d+)")
+NEWER_THAN_RE = re.compile(r"ClusterId > (\d+)")
+EXCLUDE_RE = re.compile(
+    r"!\(member\(ClusterId, \{(.*?)\}\) && member\(UserLog, \{(.*?)\}\)\)"
+)
+
+
+class Constraint:
+    """
+    One of the constraints condor_watch_q builds: "Attr == value" clauses
+    joined by ||, optionally followed by a lower bound on ClusterId, by
+    restrictions on ProcId and by an exclusion of already-seen clusters and
+    event logs.
+    """
+
+    def __init__(self, constraint):
+        selection, _, restrictions = (constraint or "").partition(") &&")
+
+        self.wanted = []
+        for clause in selection.split("||"):
+            match = CONSTRAINT_CLAUSE_RE.search(clause)
+            if match is not None:
+                attr, value = match.groups()
+                self.wanted.append((attr, value.strip('"()')))
+
+        self.cluster_ads_only = "ProcId =?= undefined" in restrictions
+
+        self.proc_id_check = None
+        match = PROC_ID_RE.search(restrictions)
+        if match is not None and not self.cluster_ads_only:
+            op, value = match.group(1), int(match.group(2))
+            self.proc_id_check = {
+                "==": lambda p: p == value,
+                ">=": lambda p: p >= value,
+                ">": lambda p: p > value,
+            }[op]
+
+        match = NEWER_THAN_RE.search(restrictions)
+        self.newer_than = int(match.group(1)) if match is not None else None
+
+        self.excluded_cluster_ids = set()
+        self.excluded_logs = set()
+        match = EXCLUDE_RE.search(restrictions)
+        if match is not None:
+            self.excluded_cluster_ids = {
+                int(c) for c in match.group(1).split(",") if c.strip()
+            }
+            self.excluded_logs = {
+                l.strip().strip('"') for l in match.group(2).split(",") if l.strip()
+            }
+
+    def selects_cluster(self, cluster_ad):
+        """Whether any ad from this cluster could match (its jobs share the attributes asked about)."""
+        if self.wanted and not any(
+            str(cluster_ad.get(attr)) == value for attr, value in self.wanted
+        ):
+            return False
+
+        if (
+            self.newer_than is not None
+            and cluster_ad.get("ClusterId") <= self.newer_than
+        ):
+            return False
+
+        # without ProcAds, the jobs all share the cluster's event log
+        return "ProcAds" in cluster_ad or not self.excludes(cluster_ad)
+
+    def excludes(self, ad):
+        """Whether the ad is one of the already-seen clusters and event logs."""
+        return (
+            ad.get("ClusterId") in self.excluded_cluster_ids
+            and ad.get("UserLog") in self.excluded_logs
+        )
+
+    def selects_proc(self, proc_id):
+        if proc_id is None:
+            return self.proc_id_check is None
+        if self.cluster_ads_only:
+            return False
+        return self.proc_id_check is None or self.proc_id_check(proc_id)
+
+
+class Schedd:
+    # the cluster ads that queries are answered from; set by install()
+    cluster_ads = []
+
+    def __init__(self, location_ad=None):
+        self.location_ad = location_ad
+
+    def _ads(self, constraint, projection, opts):
+        constraint = Constraint(constraint)
+        include_cluster_ads = opts is not None and opts & QueryOpts.IncludeClusterAd
+
+        for cluster_ad in self.cluster_ads:
+            if not constraint.selects_cluster(cluster_ad):
+                continue
+
+            # with ProcAds, only those jobs are still in the queue, and each
+            # may override some of the cluster's attributes
+            cluster_ad = dict(cluster_ad)
+            proc_ads = cluster_ad.pop("ProcAds", None)
+            if proc_ads is None:
+                proc_ads = {
+                    proc_id: {}
+                    for proc_id in range(cluster_ad.get("TotalSubmitProcs", 1))
+                }
+
+            proc_ids = sorted(proc_ads)
+            if include_cluster_ads:
+                proc_ids = itertools.chain([None], proc_ids)
+
+            for proc_id in proc_ids:
+                if not constraint.selects_proc(proc_id):
+                    continue
+
+                ad = dict(cluster_ad)
+                if proc_id is not None:
+                    ad.update(proc_ads[proc_id])
+                    ad["ProcId"] = proc_id
+                if constraint.excludes(ad):
+                    continue
+                if projection:
+                    ad = {k: v for k, v in ad.items() if k in projection}
+                yield ad
+
+    def query(self, constraint="true", projection=None, *args, **kwargs):
+        return list(self._ads(constraint, projection, kwargs.get("opts")))
+
+    def xquery(self, constraint="true", projection=None, *args, **kwargs):
+        return self._ads(constraint, projection, kwargs.get("opts"))
+
+
+class Collector:
+    def __init__(self, pool=None):
+        self.pool = pool
+
+    def locate(self, daemon_type, name=None):
+        return {"Name": name}
+
+
+def enable_debug():
+    pass
+
+
+def quote(value):
+    return '"{}"'.format(str(value).replace("\\", "\\\\").replace('"', '\\"'))
+
+
+def install(cluster_ads=(), use_real_event_log=False):
+    """
+    Put fake htcondor and classad modules into sys.modules, with a Schedd that
+    knows about the given cluster ads. If use_real_event_log is True, the real
+    bindings' JobEventLog (which must be installed) is used instead of the fake.
+    """
+    Schedd.cluster_ads = list(cluster_ads)
+
+    htcondor = types.ModuleType("htcondor")
+    htcondor.__file__ = __file__
+    for name in (
+        "JobEventType",
+        "DaemonTypes",
+        "JobEventLog",
+        "QueryOpts",
+        "Schedd",
+        "Collector",
+        "enable_debug",
+    ):
+        setattr(htcondor, name, globals()[name])
+
+    if use_real_event_log:
+        import htcondor as real_htcondor
+
+        htcondor.JobEventLog = real_htcondor.JobEventLog
+        htcondor.JobEventType = real_htcondor.JobEventType
+
+    classad = types.ModuleType("classad")
+    classad.__file__ = __file__
+    classad.quote = quote
+
+    sys.modules["htcondor"] = htcondor
+    sys.modules["classad"] = classad
+
+    return htcondor
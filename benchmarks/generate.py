@@ -0,0 +1,243 @@
+"""
+Write synthetic HTCondor job event logs.
+
+The logs use the default (text) event log format. Each job is submitted,
+and then may run, be evicted and rescheduled, be held and released, and
+finally terminate or be removed; some jobs are left idle or running.
+Events that don't change a job's state (like image size updates) are mixed
+in as well, as they are in real event logs.
+
+    python -m benchmarks.generate --jobs 100000 --clusters 100 --logs 10 out/
+"""
+
+import argparse
+import datetime
+import json
+import os
+import random
+
+EVENT_TEMPLATES = {
+    0: "Job submitted from host: <10.0.0.1:9618?addrs=10.0.0.1-9618&noUDP&sock=schedd_1234_abcd>\n",
+    1: "Job executing on host: <10.0.{host}:9618?addrs=10.0.{host}-9618&noUDP&sock=startd_5678_ef01>\n",
+    4: (
+        "Job was evicted.\n"
+        "\t(0) Job was not checkpointed.\n"
+        "\t\tUsr 0 00:00:00, Sys 0 00:00:00  -  Run Remote Usage\n"
+        "\t\tUsr 0 00:00:00, Sys 0 00:00:00  -  Run Local Usage\n"
+        "\t0  -  Run Bytes Sent By Job\n"
+        "\t0  -  Run Bytes Received By Job\n"
+    ),
+    5: (
+        "Job terminated.\n"
+        "\t(1) Normal termination (return value 0)\n"
+        "\t\tUsr 0 00:00:03, Sys 0 00:00:00  -  Run Remote Usage\n"
+        "\t\tUsr 0 00:00:00, Sys 0 00:00:00  -  Run Local Usage\n"
+        "\t\tUsr 0 00:00:03, Sys 0 00:00:00  -  Total Remote Usage\n"
+        "\t\tUsr 0 00:00:00, Sys 0 00:00:00  -  Total Local Usage\n"
+        "\t1024  -  Run Bytes Sent By Job\n"
+        "\t2048  -  Run Bytes Received By Job\n"
+        "\t1024  -  Total Bytes Sent By Job\n"
+        "\t2048  -  Total Bytes Received By Job\n"
+        "\tPartitionable Resources :    Usage  Request Allocated\n"
+        "\t   Cpus                 :                 1         1\n"
+        "\t   Disk (KB)            :       40        1    123456\n"
+        "\t   Memory (MB)          :        3      128       128\n"
+    ),
+    6: (
+        "Image size of job updated: 2500\n"
+        "\t3  -  MemoryUsage of job (MB)\n"
+        "\t2500  -  ResidentSetSize of job (KB)\n"
+    ),
+    9: "Job was aborted.\n\tvia condor_rm (by user {owner})\n",
+    12: (
+        "Job was held.\n"
+        "\tError from slot1_1@worker: Job has gone over memory limit of 128 megabytes.\n"
+        "\tCode 34 Subcode 0\n"
+    ),
+    13: "Job was released.\n\tvia condor_release (by user {owner})\n",
+}
+
+DEFAULT_MIX = {
+    # the fraction of jobs that are still idle or running at the end
+    "idle": 0.05,
+    "running": 0.10,
+    # the chance that a run is interrupted by an eviction or a hold
+    "evict": 0.05,
+    "hold": 0.03,
+    # the fraction of finished jobs that were removed instead of completing
+    "remove": 0.02,
+    # the number of image size updates per run
+    "image_size_updates": 1,
+}
+
+
+def job_history(rng, mix):
+    """Return the sequence of event type numbers for one job."""
+    events = [0]
+
+    roll = rng.random()
+    if roll < mix["idle"]:
+        return events
+    still_running = roll < mix["idle"] + mix["running"]
+
+    while True:
+        events.append(1)
+        events.extend([6] * mix["image_size_updates"])
+
+        interruption = rng.random()
+        if interruption < mix["evict"]:
+            events.append(4)
+            continue
+        elif interruption < mix["evict"] + mix["hold"]:
+            events.append(12)
+            events.append(13)
+            continue
+
+        break
+
+    if not still_running:
+        events.append(9 if rng.random() < mix["remove"] else 5)
+
+    return events
+
+
+def write_cluster(f, rng, cluster_id, num_procs, mix, owner, start):
+    """
+    Write the events for one cluster. The jobs' histories are interleaved, as
+    they would be for jobs that run at the same time.
+    """
+    histories = [job_history(rng, mix) for _ in range(num_procs)]
+
+    timestamp = start
+    step = 0
+    while True:
+        wrote_any = False
+        for proc_id, history in enumerate(histories):
+            if step >= len(history):
+                continue
+            wrote_any = True
+
+            event_type = history[step]
+            f.write(
+                "{:03d} ({}.{:03d}.000) {} {}...\n".format(
+                    event_type,
+                    cluster_id,
+                    proc_id,
+                    timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+                    EVENT_TEMPLATES[event_type].format(
+                        host="{}.{}".format(proc_id // 250 % 250, proc_id % 250 + 2),
+                        owner=owner,
+                    ),
+                )
+            )
+        if not wrote_any:
+            break
+
+        step += 1
+        timestamp += datetime.timedelta(seconds=rng.randint(1, 60))
+
+
+def generate(
+    directory,
+    num_jobs=1000,
+    num_clusters=10,
+    num_logs=1,
+    mix=None,
+    owner="bench",
+    seed=0,
+):
+    """
+    Write num_jobs jobs, split evenly over num_clusters clusters, into
+    num_logs event logs in the given directory.
+
+    Returns a list of cluster ads (as dicts) describing the clusters, in the
+    form that the schedd would return them.
+    """
+    if mix is None:
+        mix = DEFAULT_MIX
+    else:
+        mix = dict(DEFAULT_MIX, **mix)
+
+    rng = random.Random(seed)
+    start = datetime.datetime(2020, 1, 1)
+
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    log_paths = [
+        os.path.abspath(os.path.join(directory, "{}.log".format(n)))
+        for n in range(num_logs)
+    ]
+    log_files = [open(path, "w") for path in log_paths]
+
+    cluster_ads = []
+    try:
+        base, extra = divmod(num_jobs, num_clusters)
+        for index in range(num_clusters):
+            cluster_id = index + 1
+            num_procs = base + (1 if index < extra else 0)
+            if num_procs == 0:
+                continue
+
+            log_index = index % num_logs
+            write_cluster(
+                log_files[log_index], rng, cluster_id, num_procs, mix, owner, start
+            )
+
+            cluster_ads.append(
+                {
+                    "ClusterId": cluster_id,
+                    "Owner": owner,
+                    "UserLog": log_paths[log_index],
+                    "Iwd": os.path.abspath(directory),
+                    "JobBatchName": "batch-{}".format(index % max(1, num_logs * 2)),
+                    "TotalSubmitProcs": num_procs,
+                }
+            )
+    finally:
+        for f in log_files:
+            f.close()
+
+    return cluster_ads
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("directory")
+    parser.add_argument("--jobs", type=int, default=1000)
+    parser.add_argument("--clusters", type=int, default=10)
+    parser.add_argument("--logs", type=int, default=1)
+    parser.add_argument("--owner", default="bench")
+    parser.add_argument("--seed", type=int, default=0)
+    for name, default in sorted(DEFAULT_MIX.items()):
+        parser.add_argument(
+            "--{}".format(name.replace("_", "-")),
+            type=type(default),
+            default=default,
+            dest=name,
+        )
+    args = parser.parse_args()
+
+    cluster_ads = generate(
+        args.directory,
+        num_jobs=args.jobs,
+        num_clusters=args.clusters,
+        num_logs=args.logs,
+        mix={name: getattr(args, name) for name in DEFAULT_MIX},
+        owner=args.owner,
+        seed=args.seed,
+    )
+
+    # the cluster ads let benchmarks.fake_htcondor answer schedd queries
+    with open(os.path.join(args.directory, "cluster_ads.json"), "w") as f:
+        json.dump(cluster_ads, f, indent=2)
+
+    print(
+        "Wrote {} jobs in {} clusters to {}".format(
+            args.jobs, len(cluster_ads), args.directory
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
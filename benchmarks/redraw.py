@@ -0,0 +1,122 @@
+"""
+Count the bytes written to the terminal to keep a large table up to date,
+comparing the differential renderer with erasing and reprinting every frame.
+
+    python -m benchmarks.redraw --rows 1000 --frames 50 --changes 5
+"""
+
+import argparse
+import random
+
+from benchmarks import fake_htcondor
+
+
+class CountingStream:
+    """Stands in for the terminal, and only counts what is written to it."""
+
+    def __init__(self):
+        self.bytes = 0
+        self.writes = 0
+
+    def write(self, data):
+        self.bytes += len(data.encode("utf-8"))
+        self.writes += 1
+
+    def flush(self):
+        pass
+
+
+def reprint(stream, previous, frame):
+    """How frames were redrawn before the differential renderer."""
+    if previous is not None:
+        prev_lines = previous.splitlines()
+        move = "\033[{}A\r".format(len(prev_lines))
+        clear = "\n".join(" " * len(line) for line in prev_lines) + "\n"
+        stream.write(move + clear + move)
+    stream.write(frame + "\n")
+
+
+def frames(cwq, num_rows, num_frames, changes, color, seed):
+    """Yield the frames that watch_q would draw while jobs progress."""
+    rng = random.Random(seed)
+    tracker = cwq.JobStateTracker([], {}, group_by="cluster_id")
+
+    procs_per_cluster = 10
+    for cluster_id in range(1, num_rows + 1):
+        for proc_id in range(procs_per_cluster):
+            tracker.apply_transition(
+                "bench.log", cluster_id, proc_id, cwq.JobStatus.IDLE
+            )
+
+    next_status = {
+        cwq.JobStatus.IDLE: cwq.JobStatus.RUNNING,
+        cwq.JobStatus.RUNNING: cwq.JobStatus.COMPLETED,
+    }
+    row_fmt = (
+        (lambda s, r: cwq.colorize(s, cwq.determine_row_color(r))) if color else None
+    )
+
+    for _ in range(num_frames):
+        headers, rows = tracker.headers_and_rows()
+        lines = cwq.make_table(
+            headers=[cwq.CLUSTER_ID] + headers,
+            rows=rows,
+            row_fmt=row_fmt,
+            alignment=cwq.TABLE_ALIGNMENT,
+            fill="-",
+        )
+        lines += [""]
+        lines += cwq.make_progress_bar(totals=tracker.totals, width=79, color=color)
+        lines += [""]
+        lines += cwq.make_summary_with_totals(tracker.totals, width=79)
+        yield "\n".join(lines)
+
+        for _ in range(changes):
+            cluster_id = rng.randint(1, num_rows)
+            proc_id = rng.randrange(procs_per_cluster)
+            status = tracker.cluster_id_to_cluster[cluster_id][proc_id]
+            if status in next_status:
+                tracker.apply_transition(
+                    "bench.log", cluster_id, proc_id, next_status[status]
+                )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--frames", type=int, default=50)
+    parser.add_argument(
+        "--changes", type=int, default=5, help="Job state changes between frames."
+    )
+    parser.add_argument("--no-color", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    fake_htcondor.install()
+    import condor_watch_q as cwq
+
+    old = CountingStream()
+    new = CountingStream()
+    # tall enough that frames are never redrawn in full for being taller
+    renderer = cwq.TerminalRenderer(stream=new, get_size=lambda: (200, 1000000))
+
+    previous = None
+    for frame in frames(
+        cwq, args.rows, args.frames, args.changes, not args.no_color, args.seed
+    ):
+        reprint(old, previous, frame)
+        renderer.draw(frame)
+        previous = frame
+
+    print(
+        "{} rows, {} frames, {} changes per frame".format(
+            args.rows, args.frames, args.changes
+        )
+    )
+    print("reprint:      {:>12,} bytes".format(old.bytes))
+    print("differential: {:>12,} bytes".format(new.bytes))
+    print("ratio:        {:>12.1f}x".format(old.bytes / max(1, new.bytes)))
+
+
+if __name__ == "__main__":
+    main()
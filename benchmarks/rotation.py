@@ -0,0 +1,215 @@
+"""
+Rotate and truncate synthetic event logs while a tracker is reading them, and
+check that the tracked job states match what was written.
+
+    python -m benchmarks.rotation --reader scan --batch-size 7
+"""
+
+import argparse
+import io
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+
+from benchmarks import fake_htcondor, generate
+
+EVENT_HEADER_RE = re.compile(r"(\d+) \((\d+)\.(\d+)\.\d+\)")
+
+
+def cluster_events(rng, cluster_id, num_procs):
+    """The text of each of the events of one synthetic cluster."""
+    f = io.StringIO()
+    generate.write_cluster(
+        f, rng, cluster_id, num_procs, generate.DEFAULT_MIX, "bench", START
+    )
+    return [event + "...\n" for event in f.getvalue().split("...\n")[:-1]]
+
+
+START = generate.datetime.datetime(2020, 1, 1)
+
+
+class Scenario:
+    """
+    Writes an event log step by step, and keeps track of the job states that
+    a reader should end up with.
+    """
+
+    def __init__(self, cwq, path, seed):
+        self.cwq = cwq
+        self.path = path
+        self.rng = random.Random(seed)
+        self.expected = {}
+
+        # the clusters written to the current file
+        self.cluster_ids = set()
+
+    def events(self, cluster_ids, num_procs=5):
+        events = []
+        for cluster_id in cluster_ids:
+            events.extend(cluster_events(self.rng, cluster_id, num_procs))
+        return events
+
+    def append(self, events):
+        with open(self.path, "a") as f:
+            f.write("".join(events))
+        self._expect(events)
+
+    def rotate(self):
+        os.rename(self.path, self.path + ".old")
+        open(self.path, "w").close()
+        self.cluster_ids = set()
+
+    def truncate(self, events):
+        """Rewrite the event log in place with only the given events."""
+        with open(self.path, "r+") as f:
+            f.truncate(0)
+            f.write("".join(events))
+
+        self.expected = {
+            job: status
+            for job, status in self.expected.items()
+            if job[0] not in self.cluster_ids
+        }
+        self.cluster_ids = set()
+        self._expect(events)
+
+    def _expect(self, events):
+        for event in events:
+            event_type, cluster_id, proc_id = (
+                int(g) for g in EVENT_HEADER_RE.match(event).groups()
+            )
+            self.cluster_ids.add(cluster_id)
+            status = self.cwq.JOB_EVENT_STATUS_TRANSITIONS.get(event_type)
+            if status is not None:
+                self.expected[cluster_id, proc_id] = status
+
+
+def read_until_caught_up(tracker, batch_size):
+    messages = []
+    while True:
+        messages.extend(tracker.process_events(max_events=batch_size))
+        if len(tracker.behind) == 0:
+            return messages
+
+
+def check(tracker, scenario, step):
+    actual = {
+        (cluster.cluster_id, proc_id): status
+        for cluster in tracker.clusters
+        for proc_id, status in cluster
+    }
+    problems = []
+    if actual != scenario.expected:
+        missing = set(scenario.expected) - set(actual)
+        extra = set(actual) - set(scenario.expected)
+        wrong = [
+            job
+            for job in set(actual) & set(scenario.expected)
+            if actual[job] != scenario.expected[job]
+        ]
+        problems.append(
+            "{} missing, {} extra, {} in the wrong state".format(
+                len(missing), len(extra), len(wrong)
+            )
+        )
+
+    if tracker.totals["TOTAL"] != len(actual):
+        problems.append(
+            "total is {}, but {} jobs are tracked".format(
+                tracker.totals["TOTAL"], len(actual)
+            )
+        )
+    for group in tracker.groups.values():
+        if sum(group.counts.values()) != group.total:
+            problems.append("counts of group {} don't add up".format(group.key))
+
+    print(
+        "{:<40} {:>5} jobs: {}".format(
+            step, len(actual), "; ".join(problems) if problems else "OK"
+        )
+    )
+    return len(problems) == 0
+
+
+def run(cwq, reader, batch_size, seed, directory):
+    path = os.path.join(directory, "rotating.log")
+    open(path, "w").close()
+
+    scenario = Scenario(cwq, path, seed)
+    tracker = cwq.JobStateTracker([path], {}, group_by="cluster_id", reader=reader)
+
+    ok = True
+
+    def step(description):
+        messages = read_until_caught_up(tracker, batch_size)
+        for message in messages:
+            print("    " + message)
+        return check(tracker, scenario, description)
+
+    events = scenario.events([1, 2, 3])
+    half = len(events) // 2
+    scenario.append(events[:half])
+    ok &= step("first half of the first file")
+
+    # the rest of the old file hasn't been read when it is rotated
+    scenario.append(events[half:])
+    scenario.rotate()
+    scenario.append(scenario.events([4, 5]))
+    ok &= step("rotated, with the old file unfinished")
+
+    scenario.append(scenario.events([6]))
+    ok &= step("appended to the new file")
+
+    scenario.truncate(scenario.events([7]))
+    ok &= step("truncated and rewritten shorter")
+
+    if reader == "scan":
+        # the htcondor reader can only tell that the file was truncated if it
+        # is smaller than it was; the scanning reader checks where it left off
+        scenario.truncate(scenario.events([8, 9, 10]))
+        ok &= step("truncated and rewritten longer")
+
+    scenario.rotate()
+    ok &= step("rotated to an empty file")
+
+    scenario.append(scenario.events([11]))
+    ok &= step("appended after rotating")
+
+    tracker.close()
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--reader", choices=("htcondor", "scan"), default=None)
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=None,
+        help="Read at most this many events from the event log at a time.",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    fake_htcondor.install()
+    import condor_watch_q as cwq
+
+    readers = [args.reader] if args.reader else sorted(cwq.EVENT_LOG_READERS)
+
+    ok = True
+    for reader in readers:
+        print("{} reader:".format(reader))
+        directory = tempfile.mkdtemp()
+        try:
+            ok &= run(cwq, reader, args.batch_size, args.seed, directory)
+        finally:
+            shutil.rmtree(directory)
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+Time (and measure the memory used by) the main phases of condor_watch_q on
+synthetic event logs: discovering event logs through the schedd, reading
+events, building the table rows, and rendering the table.
+
+    python -m benchmarks.run --sizes 1000,100000,1000000 --output results.json
+    python -m benchmarks.run --compare results.json
+
+The event logs are written by benchmarks.generate, and the schedd and (unless
+--real-event-log is given) the event log reader are the in-process fakes from
+benchmarks.fake_htcondor.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks import fake_htcondor, generate
+
+DEFAULT_SIZES = (1000, 100000, 1000000)
+
+# the generated workload: clusters of this many jobs, this many clusters per log
+PROCS_PER_CLUSTER = 1000
+CLUSTERS_PER_LOG = 10
+
+
+def workload(num_jobs, directory):
+    num_clusters = max(1, num_jobs // PROCS_PER_CLUSTER)
+    num_logs = max(1, num_clusters // CLUSTERS_PER_LOG)
+    return generate.generate(
+        directory,
+        num_jobs=num_jobs,
+        num_clusters=num_clusters,
+        num_logs=num_logs,
+        owner="bench",
+    )
+
+
+def timed(func, repeat=1, setup=None):
+    """Run func (after setup, if given) repeat times; return the best time and the last result."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        arg = setup() if setup is not None else None
+        gc.collect()
+        start = time.perf_counter()
+        result = func(arg) if setup is not None else func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def measured_memory(func, setup=None):
+    """Run func once under tracemalloc; return (peak bytes, bytes still allocated afterwards)."""
+    arg = setup() if setup is not None else None
+    gc.collect()
+    tracemalloc.start()
+    result = func(arg) if setup is not None else func()
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return peak, retained
+
+
+def benchmark_size(cwq, num_jobs, directory, repeat, memory):
+    results = {}
+
+    def record(phase, func, setup=None):
+        seconds, result = timed(func, repeat=repeat, setup=setup)
+        results[phase] = {"seconds": seconds}
+        if memory:
+            peak, retained = measured_memory(func, setup=setup)
+            results[phase].update(peak_bytes=peak, retained_bytes=retained)
+        return result
+
+    start = time.perf_counter()
+    cluster_ads = workload(num_jobs, directory)
+    results["generate"] = {"seconds": time.perf_counter() - start}
+    fake_htcondor.Schedd.cluster_ads = cluster_ads
+
+    record("discovery", lambda: cwq.find_job_event_logs(users=["bench"]))
+    discovery_stats = {}
+    _, event_logs, batch_names = cwq.find_job_event_logs(
+        users=["bench"], stats=discovery_stats
+    )
+    results["discovery"].update(discovery_stats)
+
+    trackers = {}
+    for reader in ("htcondor", "scan"):
+
+        def new_tracker():
+            return cwq.JobStateTracker(event_logs, batch_names, reader=reader)
+
+        def process(tracker):
+            tracker.process_events()
+            return tracker
+
+        trackers[reader] = record(
+            "process_events[{}]".format(reader), process, setup=new_tracker
+        )
+
+    tracker = trackers["scan"]
+    record(
+        "aggregation[full]",
+        lambda t: t.headers_and_rows(),
+        setup=lambda: invalidate_rows(tracker),
+    )
+    record("aggregation[unchanged]", lambda: tracker.headers_and_rows())
+
+    headers, rows = tracker.headers_and_rows()
+
+    def render():
+        lines = cwq.make_table(
+            headers=[tracker.key] + headers,
+            rows=rows,
+            row_fmt=lambda s, r: cwq.colorize(s, cwq.determine_row_color(r)),
+            alignment=cwq.TABLE_ALIGNMENT,
+            fill="-",
+        )
+        lines += cwq.make_progress_bar(tracker.totals, width=79)
+        lines += cwq.make_summary_with_totals(tracker.totals, width=79)
+        return "\n".join(lines)
+
+    record("render", render)
+
+    for t in trackers.values():
+        t.close()
+
+    return results
+
+
+def invalidate_rows(tracker):
+    for group in tracker.groups.values():
+        group.row = None
+    return tracker
+
+
+def compare(old, new, tolerance):
+    """Print the change in time for every phase; return the number of regressions."""
+    regressions = 0
+    for size, phases in sorted(new["results"].items(), key=lambda kv: int(kv[0])):
+        for phase, measurement in sorted(phases.items()):
+            try:
+                before = old["results"][size][phase]["seconds"]
+            except KeyError:
+                continue
+            after = measurement["seconds"]
+            ratio = after / before if before > 0 else float("inf")
+            flag = ""
+            if ratio > 1 + tolerance and phase != "generate":
+                flag = "  <-- REGRESSION"
+                regressions += 1
+            print(
+                "{:>8} jobs  {:<26} {:>9.4f}s -> {:>9.4f}s  ({:.2f}x){}".format(
+                    size, phase, before, after, ratio, flag
+                )
+            )
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        default=",".join(str(s) for s in DEFAULT_SIZES),
+        help="Comma-separated job counts to benchmark.",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--no-memory",
+        dest="memory",
+        action="store_false",
+        help="Skip the (slow) tracemalloc pass.",
+    )
+    parser.add_argument(
+        "--real-event-log",
+        action="store_true",
+        help="Use the installed HTCondor bindings' JobEventLog instead of the fake.",
+    )
+    parser.add_argument("--workdir", help="Where to write event logs (kept).")
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    parser.add_argument("--compare", help="Compare against a previous results file.")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Slowdown (as a fraction) that counts as a regression in --compare.",
+    )
+    args = parser.parse_args()
+
+    fake_htcondor.install(use_real_event_log=args.real_event_log)
+    import condor_watch_q as cwq
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="condor_watch_q_bench_")
+
+    output = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "repeat": args.repeat,
+            "real_event_log": args.real_event_log,
+        },
+        "results": {},
+    }
+
+    try:
+        for size in (int(s) for s in args.sizes.split(",")):
+            directory = os.path.join(workdir, str(size))
+            results = benchmark_size(cwq, size, directory, args.repeat, args.memory)
+            output["results"][str(size)] = results
+            for phase, measurement in sorted(results.items()):
+                print(
+                    "{:>8} jobs  {:<26} {:>9.4f}s{}".format(
+                        size,
+                        phase,
+                        measurement["seconds"],
+                        "  peak {:>12,} B  retained {:>12,} B".format(
+                            measurement["peak_bytes"], measurement["retained_bytes"]
+                        )
+                        if "peak_bytes" in measurement
+                        else "",
+                    )
+                )
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=2, sort_keys=True)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            old = json.load(f)
+        print()
+        if compare(old, output, args.tolerance) > 0:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Measure how long it takes, and how much memory, to follow a few clusters in
+an event log shared with many others, with and without skipping the events
+of the clusters that weren't asked for.
+
+    python -m benchmarks.shared_log --clusters 5000 --tracked 3 --reader scan
+"""
+
+import argparse
+import datetime
+import gc
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks import fake_htcondor, generate
+
+
+def write_shared_log(path, num_clusters, procs_per_cluster, seed):
+    rng = random.Random(seed)
+    start = datetime.datetime(2020, 1, 1)
+    with open(path, "w") as f:
+        for cluster_id in range(1, num_clusters + 1):
+            generate.write_cluster(
+                f,
+                rng,
+                cluster_id,
+                procs_per_cluster,
+                generate.DEFAULT_MIX,
+                "bench",
+                start,
+            )
+
+
+def read(cwq, path, reader, only_cluster_ids):
+    tracker = cwq.JobStateTracker(
+        [path],
+        {},
+        group_by="cluster_id",
+        reader=reader,
+        only_cluster_ids=only_cluster_ids,
+    )
+    tracker.process_events()
+    return tracker
+
+
+def run(cwq, path, reader, only_cluster_ids):
+    """
+    Read the whole event log, and return how long that took, how much memory
+    the tracker held afterwards, and how many jobs it tracked. Memory is
+    measured on a second read, because tracing allocations slows it down.
+    """
+    start = time.perf_counter()
+    tracker = read(cwq, path, reader, only_cluster_ids)
+    elapsed = time.perf_counter() - start
+    num_jobs = tracker.totals["TOTAL"]
+    tracker.close()
+    del tracker
+
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    tracker = read(cwq, path, reader, only_cluster_ids)
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    tracker.close()
+
+    return elapsed, after - before, num_jobs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clusters", type=int, default=5000)
+    parser.add_argument("--procs-per-cluster", type=int, default=10)
+    parser.add_argument(
+        "--tracked", type=int, default=3, help="How many of the clusters to follow."
+    )
+    parser.add_argument("--reader", choices=("htcondor", "scan"), default="scan")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    fake_htcondor.install()
+    import condor_watch_q as cwq
+
+    rng = random.Random(args.seed)
+    tracked = rng.sample(range(1, args.clusters + 1), args.tracked)
+
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, "shared.log")
+        write_shared_log(path, args.clusters, args.procs_per_cluster, args.seed)
+        print(
+            "{} reader, {} of {} clusters in a {:.1f} MB event log".format(
+                args.reader,
+                args.tracked,
+                args.clusters,
+                os.path.getsize(path) / 1024.0 / 1024.0,
+            )
+        )
+
+        for name, only_cluster_ids in (
+            ("every cluster", None),
+            ("only tracked", tracked),
+        ):
+            elapsed, nbytes, num_jobs = run(cwq, path, args.reader, only_cluster_ids)
+            print(
+                "{:<14} {:6.2f}s, {:>12,} bytes held, {:>7} jobs".format(
+                    name, elapsed, nbytes, num_jobs
+                )
+            )
+    finally:
+        shutil.rmtree(directory)
+
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
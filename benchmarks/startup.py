@@ -0,0 +1,157 @@
+"""
+Time how long condor_watch_q takes to start: importing the module (as other
+programs do to use its table functions) and printing -help. Fails if either
+goes over budget, or if the HTCondor bindings get imported along the way.
+
+    python -m benchmarks.startup --repeat 10 --import-budget-ms 50
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(ROOT, "condor_watch_q.py")
+
+# none of these should be needed just to import condor_watch_q or show -help
+DEFERRED_MODULES = (
+    "htcondor",
+    "classad",
+    "json",
+    "pickle",
+    "hashlib",
+    "shutil",
+    "asyncio",
+    "cProfile",
+)
+
+CHECK_IMPORTS = """
+import sys
+import condor_watch_q
+print(",".join(m for m in {!r} if m in sys.modules))
+""".format(
+    DEFERRED_MODULES
+)
+
+
+def run_python(args, env):
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable] + args,
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    return time.perf_counter() - start, result
+
+
+def parse_importtime(stderr):
+    """
+    Return the cumulative microseconds it took to import condor_watch_q, and
+    {module: cumulative microseconds} for the modules it imported directly,
+    from -X importtime output.
+    """
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:") :].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((depth, name.strip(), int(cumulative_us)))
+
+    for index, (depth, name, cumulative_us) in enumerate(imports):
+        if name == "condor_watch_q":
+            break
+    else:
+        return None, {}
+
+    # the modules imported while importing condor_watch_q come right before it
+    direct = {}
+    for depth, name, us in reversed(imports[:index]):
+        if depth == 0:
+            break
+        if depth == 1:
+            direct[name] = us
+
+    return cumulative_us, direct
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument(
+        "--import-budget-ms",
+        type=float,
+        default=50.0,
+        help="The most that importing condor_watch_q may take.",
+    )
+    parser.add_argument(
+        "--help-budget-ms",
+        type=float,
+        default=150.0,
+        help="The most that condor_watch_q -help may take, beyond starting Python.",
+    )
+    parser.add_argument(
+        "--top", type=int, default=10, help="Show this many of the slowest imports."
+    )
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    env["PYTHONPATH"] = ROOT
+
+    ok = True
+
+    # compile to bytecode once, so that the import is timed as it is installed
+    run_python(["-c", "import condor_watch_q"], env)
+
+    best = None
+    for _ in range(args.repeat):
+        _, result = run_python(["-X", "importtime", "-c", "import condor_watch_q"], env)
+        import_us, direct = parse_importtime(result.stderr)
+        if import_us is None:
+            print(result.stderr)
+            sys.exit("importing condor_watch_q failed")
+        if best is None or import_us < best[0]:
+            best = import_us, direct
+
+    import_us, direct = best
+    import_ms = import_us / 1000.0
+    print("import condor_watch_q: {:8.1f} ms".format(import_ms))
+    for name in sorted(direct, key=direct.get, reverse=True)[: args.top]:
+        print("    {:<30} {:8.1f} ms".format(name, direct[name] / 1000.0))
+    if import_ms > args.import_budget_ms:
+        print("  over budget ({} ms)".format(args.import_budget_ms))
+        ok = False
+
+    _, result = run_python(["-c", CHECK_IMPORTS], env)
+    loaded = result.stdout.strip()
+    if loaded:
+        print("  imported modules that should be deferred: {}".format(loaded))
+        ok = False
+
+    python_times = []
+    help_times = []
+    for _ in range(args.repeat):
+        python_times.append(run_python(["-c", "pass"], env)[0])
+        elapsed, result = run_python([SCRIPT, "-help"], env)
+        if result.returncode != 0:
+            print(result.stderr)
+            sys.exit("condor_watch_q -help failed")
+        help_times.append(elapsed)
+
+    help_ms = (min(help_times) - min(python_times)) * 1000.0
+    print("condor_watch_q -help:  {:8.1f} ms beyond starting Python".format(help_ms))
+    if help_ms > args.help_budget_ms:
+        print("  over budget ({} ms)".format(args.help_budget_ms))
+        ok = False
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -19,21 +19,24 @@ from __future__ import print_function
 
 import argparse
 import collections
-import getpass
 import itertools
 import sys
 import textwrap
 import enum
-import datetime
 import os
 import time
 import operator
-import shutil
 import re
-import contextlib
+import threading
+import select
+import struct
+import mmap
+import heapq
+import stat
 
-import htcondor
-import classad
+# htcondor, classad and the slower standard library modules are imported
+# where they are needed, so that -help and argument errors don't wait for
+# them, and so that other programs can import the table functions cheaply
 
 
 def parse_args():
@@ -60,6 +63,13 @@ def parse_args():
             job is held (with exit code 1), run
 
                 condor_watch_q -exit all,done,0 -exit any,held,1
+
+            Conditions can also have thresholds, be checked for each row of the
+            table, and time out. For example, to exit with code 2 when 5% of the
+            jobs in any batch are held, or with code 124 if the jobs aren't all
+            done within an hour, run
+
+                condor_watch_q -exit any-group,held>=5%,2 -exit all,done,timeout=3600
             """
         ),
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -106,24 +116,101 @@ def parse_args():
     parser.add_argument(
         "-exit",
         action=ExitConditions,
-        metavar="GROUPER,JOB_STATUS[,EXIT_CODE]",
+        metavar="GROUPER,JOB_STATUS[,EXIT_CODE][,timeout=SECONDS]",
         help=textwrap.dedent(
             """
             Specify conditions under which condor_watch_q should exit. 
 
             GROUPER is one of {{{}}}.
+            "all", "any" and "none" look at all of the jobs together; the
+            others look at each row of the table separately.
 
             JOB_STATUS is one of {{{}}}.
 
             "active" means "in the queue".
 
+            JOB_STATUS may be followed by a threshold on the number of jobs
+            in that status, or on their percentage of the jobs, like "held>=5"
+            or "done>=90%%". A row meets the condition when its jobs meet the
+            threshold, or, without a threshold, when all of its jobs are in that
+            status. With a threshold, "all" and "any" exit when all of the jobs
+            together meet it, and "none" exits when they don't.
+
+            Add ",timeout=SECONDS" to exit with code {} if the condition
+            has not been met after that long.
+
             To specify multiple exit conditions, pass this option multiple times.
             """.format(
-                ", ".join(EXIT_GROUPERS.keys()), ", ".join(EXIT_JOB_STATUS_CHECK.keys())
+                ", ".join(EXIT_GROUPERS),
+                ", ".join(EXIT_JOB_STATUSES.keys()),
+                TIMEOUT_EXIT_CODE,
             )
         ),
     )
 
+    parser.add_argument(
+        "-format",
+        action="store",
+        default="table",
+        choices=("table", "jsonl"),
+        help=textwrap.dedent(
+            """
+            How to write the state of the jobs. "table" displays a table, a
+            progress bar and a summary. "jsonl" writes only what changed, as
+            JSON Lines: a snapshot of every group at startup, then a record for
+            each job that changes state, each group whose counts change, the new
+            totals, and finally why condor_watch_q exited. Every record has a
+            "seq" number that increases by one with each record.
+            Send SIGUSR1 to get another snapshot at the next update.
+            Defaults to %(default)s.
+            """
+        ),
+    )
+
+    parser.add_argument(
+        "-export-metrics",
+        action="store",
+        type=parse_host_port,
+        default=None,
+        metavar="HOST:PORT",
+        help=textwrap.dedent(
+            """
+            Serve the job counts, the number of events read and failed to
+            parse, and how far behind the reading of each event log is, at
+            http://HOST:PORT/metrics in the Prometheus text format. Nothing
+            is displayed in this mode, except for JSON Lines if -format jsonl
+            is also given.
+            """
+        ),
+    )
+
+    parser.add_argument(
+        "-daemon",
+        action="store",
+        default=None,
+        metavar="SOCKET",
+        help=textwrap.dedent(
+            """
+            Instead of displaying anything, read event logs on behalf of other
+            condor_watch_q processes that connect to the Unix socket at this
+            path with -connect. Each event log is read once, no matter how
+            many of them are following it.
+            """
+        ),
+    )
+    parser.add_argument(
+        "-connect",
+        action="store",
+        default=None,
+        metavar="SOCKET",
+        help=textwrap.dedent(
+            """
+            Get job states from a condor_watch_q -daemon listening on the Unix
+            socket at this path, instead of reading the event logs directly.
+            """
+        ),
+    )
+
     parser.add_argument(
         "-abbreviate",
         action="store_true",
@@ -202,7 +289,171 @@ def parse_args():
     )
 
     parser.add_argument(
-        "-debug", action="store_true", help="Turn on HTCondor debug printing."
+        "-interval",
+        action="store",
+        type=float,
+        default=1.0,
+        metavar="SECONDS",
+        help="The minimum time between updates. Defaults to %(default)s seconds.",
+    )
+    parser.add_argument(
+        "-max-interval",
+        action="store",
+        type=float,
+        default=10.0,
+        metavar="SECONDS",
+        help=textwrap.dedent(
+            """
+            The maximum time between updates. New events trigger an update as
+            soon as they are written; while nothing is happening, the time between
+            updates grows up to this limit. Defaults to %(default)s seconds.
+            """
+        ),
+    )
+
+    parser.add_argument(
+        "-engine",
+        action="store",
+        default="threads",
+        choices=("threads", "asyncio"),
+        help=textwrap.dedent(
+            """
+            Select how the work is scheduled. "threads" reads events on a
+            background thread and updates the display from a loop. "asyncio"
+            runs reading events, looking for new jobs and each kind of output
+            as separate asyncio tasks, connected by bounded queues, so that
+            slow output or a slow schedd doesn't hold up reading events
+            (Python 3 only). Defaults to %(default)s.
+            """
+        ),
+    )
+
+    parser.add_argument(
+        "-read-workers",
+        action="store",
+        type=int,
+        default=1,
+        metavar="N",
+        help=textwrap.dedent(
+            """
+            Read up to this many event logs at the same time, which helps when
+            the event logs are on a slow or remote filesystem. Defaults to
+            %(default)s (read event logs one at a time).
+            """
+        ),
+    )
+
+    parser.add_argument(
+        "-max-clusters",
+        action="store",
+        type=int,
+        default=None,
+        metavar="N",
+        help=textwrap.dedent(
+            """
+            Track at most this many clusters, by no longer displaying the
+            clusters whose jobs finished longest ago. Their jobs still count
+            towards the totals, and the summary says how many were evicted.
+            By default, every cluster is tracked until condor_watch_q exits.
+            """
+        ),
+    )
+
+    parser.add_argument(
+        "-reader",
+        action="store",
+        default="htcondor",
+        choices=("htcondor", "scan"),
+        help=textwrap.dedent(
+            """
+            Select how event logs are read. "htcondor" uses the HTCondor Python
+            bindings' event log reader. "scan" only looks at the first line of
+            each event, which is much faster for large event logs, but only
+            understands the default (text) event log format.
+            Defaults to %(default)s.
+            """
+        ),
+    )
+
+    parser.add_argument(
+        "-checkpoint",
+        action="store",
+        default=None,
+        metavar="FILE",
+        help=textwrap.dedent(
+            """
+            Periodically save the job states and how far each event log has been
+            read to this file, and resume from it at startup, so that only events
+            written since the last run have to be read. A checkpoint file that
+            is not yours, or that other users can write to, is ignored.
+            """
+        ),
+    )
+    parser.add_argument(
+        "-checkpoint-interval",
+        action="store",
+        type=float,
+        default=60,
+        metavar="SECONDS",
+        help="How often to write the checkpoint file. Defaults to %(default)s seconds.",
+    )
+
+    parser.add_argument(
+        "-rediscover-interval",
+        action="store",
+        type=float,
+        default=30,
+        metavar="SECONDS",
+        help=textwrap.dedent(
+            """
+            How often to ask the schedd about jobs submitted since startup, so
+            that they are tracked as well. Only applies when tracking jobs by
+            user or batch name. Set to 0 to only look for jobs at startup.
+            Defaults to %(default)s seconds.
+            """
+        ),
+    )
+
+    parser.add_argument(
+        "-stats",
+        action="store_true",
+        help=textwrap.dedent(
+            """
+            Report where the time went since the last update: querying the
+            schedd, reading and applying events, building the table and drawing
+            it, along with events read per second, parse errors and unread
+            bytes for each event log, and memory use. Shown below the table, or
+            written as a "stats" record with -format jsonl, or as JSON to STDERR
+            when only exporting metrics.
+            """
+        ),
+    )
+    parser.add_argument(
+        "-profile",
+        action="store",
+        default=None,
+        metavar="FILE",
+        help=textwrap.dedent(
+            """
+            Profile condor_watch_q with cProfile for the first
+            -profile-iterations updates, and write the profile to this file,
+            which can be read with the pstats module.
+            """
+        ),
+    )
+    parser.add_argument(
+        "-profile-iterations",
+        action="store",
+        type=int,
+        default=100,
+        metavar="N",
+        help="How many updates to profile with -profile. Defaults to %(default)s.",
+    )
+
+    parser.add_argument(
+        "-debug",
+        action="store_true",
+        help="Turn on HTCondor debug printing, and report how long discovery took.",
     )
 
     args, unknown = parser.parse_known_args()
@@ -283,413 +534,4621 @@ def _check_unknown_arg(arg, unknown_args):
 
 class ExitConditions(argparse.Action):
     def __call__(self, parser, args, values, option_string=None):
-        v = values.split(",")
-        if len(v) == 3:
-            grouper, status, exit_code = v
-        elif len(v) == 2:
-            grouper, status = v
-            exit_code = 0
-        else:
-            parser.error(message="invalid -exit specification")
+        try:
+            condition = parse_exit_condition(values)
+        except ValueError as e:
+            parser.error(message=str(e))
+
+        if getattr(args, self.dest, None) is None:
+            setattr(args, self.dest, [])
+
+        getattr(args, self.dest).append(condition)
 
+
+class NegateAction(argparse.Action):
+    def __call__(self, parser, args, values, option_string=None):
+        setattr(args, self.dest, option_string.rstrip("-").startswith("no"))
+
+
+def cli():
+    args = parse_args()
+
+    if args.debug:
+        import htcondor
+
+        print("Enabling HTCondor debug output...", file=sys.stderr)
+        htcondor.enable_debug()
+
+    if args.daemon is not None:
+        return run_daemon(args.daemon, reader=args.reader)
+
+    return watch_q(
+        users=args.users,
+        cluster_ids=args.clusters,
+        event_logs=args.files,
+        batches=args.batches,
+        collector=args.collector,
+        schedd=args.schedd,
+        exit_conditions=args.exit,
+        group_by=args.groupby,
+        table=args.table,
+        progress_bar=args.progress,
+        summary=args.summary,
+        summary_type=args.summary_type,
+        updated_at=args.updated_at,
+        color=args.color,
+        refresh=args.refresh,
+        abbreviate_path_components=args.abbreviate,
+        output_format=args.format,
+        export_metrics=args.export_metrics,
+        connect=args.connect,
+        min_interval=args.interval,
+        max_interval=args.max_interval,
+        engine=args.engine,
+        read_workers=args.read_workers,
+        max_clusters=args.max_clusters,
+        reader=args.reader,
+        checkpoint=args.checkpoint,
+        checkpoint_interval=args.checkpoint_interval,
+        rediscover_interval=args.rediscover_interval,
+        stats=args.stats,
+        profile=args.profile,
+        profile_iterations=args.profile_iterations,
+        debug=args.debug,
+    )
+
+
+# all/any/none look at every job, the others look at each group (row) separately
+EXIT_GROUPERS = ("all", "any", "none", "all-groups", "any-group", "no-group")
+EXIT_COMPARISONS = {
+    ">=": operator.ge,
+    ">": operator.gt,
+    "<=": operator.le,
+    "<": operator.lt,
+    "==": operator.eq,
+}
+EXIT_CONDITION_RE = re.compile(r"^([a-z]+)(?:(>=|<=|==|>|<)(\d+(?:\.\d+)?)(%?))?$")
+
+# used when an exit condition is not met before its timeout, like timeout(1)
+TIMEOUT_EXIT_CODE = 124
+
+
+def parse_exit_condition(spec):
+    """Parse GROUPER,JOB_STATUS[THRESHOLD][,EXIT_CODE][,timeout=SECONDS]."""
+    v = spec.split(",")
+
+    timeout = None
+    if len(v) > 2 and v[-1].startswith("timeout="):
+        timeout = v.pop()[len("timeout=") :]
+        try:
+            timeout = float(timeout)
+        except ValueError:
+            raise ValueError(
+                'timeout must be a number of seconds, but was "{}"'.format(timeout)
+            )
+
+    if len(v) == 3:
+        grouper, status, exit_code = v
+    elif len(v) == 2:
+        grouper, status = v
+        exit_code = 0
+    else:
+        raise ValueError("invalid -exit specification")
+
+    try:
+        exit_code = int(exit_code)
+    except ValueError:
+        raise ValueError('EXIT_CODE must be an integer, but was "{}"'.format(exit_code))
+
+    return ExitCondition(grouper, status, exit_code, timeout=timeout)
+
+
+class ExitCondition(object):
+    """
+    A condition under which condor_watch_q should exit. It is evaluated from
+    the job counts that the tracker keeps up to date, never by looking at the
+    individual jobs. Conditions on groups also listen for changes to each
+    group's counts, so that checking them doesn't visit every group.
+    """
+
+    def __init__(self, grouper, status, exit_code=0, timeout=None):
+        grouper = grouper.lower()
         if grouper not in EXIT_GROUPERS:
-            parser.error(
-                message='invalid GROUPER "{}", must be one of {{ {} }}'.format(
-                    grouper, ", ".join(EXIT_GROUPERS.keys())
+            raise ValueError(
+                'invalid GROUPER "{}", must be one of {{ {} }}'.format(
+                    grouper, ", ".join(EXIT_GROUPERS)
                 )
             )
 
-        if status not in EXIT_JOB_STATUS_CHECK:
-            parser.error(
-                message='invalid JOB_STATUS "{}", must be one of {{ {} }}'.format(
-                    status, ", ".join(EXIT_JOB_STATUS_CHECK.keys())
+        match = EXIT_CONDITION_RE.match(status.lower())
+        if match is None or match.group(1) not in EXIT_JOB_STATUSES:
+            raise ValueError(
+                'invalid JOB_STATUS "{}", must be one of {{ {} }}, optionally followed by a threshold like >=5 or <10%'.format(
+                    status, ", ".join(EXIT_JOB_STATUSES.keys())
+                )
+            )
+        status_name, comparison, threshold, percent = match.groups()
+        if percent == "%" and not 0 <= float(threshold) <= 100:
+            raise ValueError(
+                'invalid JOB_STATUS "{}", a percentage must be between 0% and 100%'.format(
+                    status
+                )
+            )
+        if timeout is not None and not timeout > 0:
+            raise ValueError(
+                'timeout must be a positive number of seconds, but was "{:g}"'.format(
+                    timeout
                 )
             )
 
-        try:
-            exit_code = int(exit_code)
-        except ValueError:
-            parser.error(
-                message='EXIT_CODE must be an integer, but was "{}"'.format(exit_code)
-            )
+        self.grouper = grouper
+        self.statuses = EXIT_JOB_STATUSES[status_name]
+        self.comparison = EXIT_COMPARISONS.get(comparison)
+        self.threshold = float(threshold) if threshold is not None else None
+        self.percent = percent == "%"
+        self.exit_code = exit_code
+        self.timeout = timeout
+
+        self.description = "{} {}".format(grouper, status)
+        self.per_group = grouper not in ("all", "any", "none")
+
+        # the keys of the groups that the condition holds for
+        self._satisfied = set()
+
+    def holds_for(self, counts, total):
+        """
+        Whether the threshold is met by the given job counts, or (without a
+        threshold) whether every job is in one of the statuses.
+        """
+        count = sum(counts[js] for js in self.statuses)
+        if self.comparison is None:
+            return count == total
+
+        if self.percent:
+            count = 100.0 * safe_divide(count, total)
+        return self.comparison(count, self.threshold)
+
+    def is_met(self, tracker):
+        if self.per_group:
+            num_satisfied = len(self._satisfied)
+            if self.grouper == "all-groups":
+                return num_satisfied == len(tracker.groups)
+            elif self.grouper == "any-group":
+                return num_satisfied > 0
+            else:
+                return num_satisfied == 0
+
+        totals = tracker.totals
+        if self.comparison is not None:
+            holds = self.holds_for(totals, totals[TOTAL])
+            return not holds if self.grouper == "none" else holds
+
+        count = sum(totals[js] for js in self.statuses)
+        if self.grouper == "all":
+            return count == totals[TOTAL]
+        elif self.grouper == "any":
+            return count > 0
+        else:
+            return count == 0
+
+    def is_timed_out(self, elapsed):
+        return self.timeout is not None and elapsed >= self.timeout
+
+    def group_changed(self, group):
+        if self.holds_for(group.counts, group.total):
+            self._satisfied.add(group.key)
+        else:
+            self._satisfied.discard(group.key)
+
+    def group_removed(self, group):
+        self._satisfied.discard(group.key)
+
+
+TOTAL = "TOTAL"
+EVICTED = "EVICTED"
+ACTIVE_JOBS = "JOB_IDS"
+EVENT_LOG = "LOG"
+CLUSTER_ID = "CLUSTER"
+BATCH_NAME = "BATCH"
+
+
+# attribute is the Python attribute name of the Cluster object
+# key is the key in the events and job rows
+GROUPBY_ATTRIBUTE_TO_AD_KEY = {
+    "event_log_path": EVENT_LOG,
+    "cluster_id": CLUSTER_ID,
+    "batch_name": BATCH_NAME,
+}
+GROUPBY_AD_KEY_TO_ATTRIBUTE = {v: k for k, v in GROUPBY_ATTRIBUTE_TO_AD_KEY.items()}
+
+
+def watch_q(
+    users=None,
+    cluster_ids=None,
+    event_logs=None,
+    batches=None,
+    collector=None,
+    schedd=None,
+    exit_conditions=None,
+    group_by="batch_name",
+    table=True,
+    progress_bar=True,
+    summary=True,
+    summary_type="totals",
+    updated_at=True,
+    color=True,
+    refresh=True,
+    abbreviate_path_components=False,
+    output_format="table",
+    export_metrics=None,
+    connect=None,
+    min_interval=1.0,
+    max_interval=10.0,
+    engine="threads",
+    read_workers=1,
+    max_clusters=None,
+    reader="htcondor",
+    checkpoint=None,
+    checkpoint_interval=60,
+    rediscover_interval=30,
+    stats=False,
+    profile=None,
+    profile_iterations=100,
+    debug=False,
+):
+    import datetime
+    import getpass
+    import signal
+
+    if users is None and cluster_ids is None and event_logs is None and batches is None:
+        users = [getpass.getuser()]
+    if exit_conditions is None:
+        exit_conditions = []
+
+    if engine == "asyncio":
+        import importlib
+
+        try:
+            importlib.import_module("condor_watch_q_asyncio")
+        except (ImportError, SyntaxError):
+            print(
+                "ERROR: -engine asyncio needs Python 3, and condor_watch_q_asyncio.py installed next to condor_watch_q",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+
+    key = GROUPBY_ATTRIBUTE_TO_AD_KEY[group_by]
+
+    discovery_stats = {}
+    discovery_started_at = time.time()
+    discovery = JobDiscovery(
+        users,
+        cluster_ids,
+        event_logs,
+        batches,
+        collector=collector,
+        schedd=schedd,
+        stats=discovery_stats,
+    )
+    cluster_ids, event_logs, batch_names = discovery.discover()
+    if debug:
+        print(
+            "Found {} clusters and {} event logs in {:.2f} seconds (fetched {} ads, about {} bytes, from the schedd)".format(
+                len(cluster_ids),
+                len(event_logs),
+                time.time() - discovery_started_at,
+                discovery_stats.get("ads", 0),
+                discovery_stats.get("bytes", 0),
+            ),
+            file=sys.stderr,
+        )
+    if cluster_ids is not None and len(cluster_ids) == 0:
+        print("No jobs found")
+        sys.exit(0)
+
+    tracker = JobStateTracker(
+        event_logs if connect is None else [],
+        batch_names,
+        group_by=group_by,
+        read_workers=read_workers,
+        reader=reader,
+        max_clusters=max_clusters,
+        only_cluster_ids=discovery.only_cluster_ids,
+    )
+    tracker.timer.add("query", time.time() - discovery_started_at)
+
+    if checkpoint is not None and connect is not None:
+        print(
+            "WARNING: the daemon reads the event logs, so -checkpoint is ignored",
+            file=sys.stderr,
+        )
+        checkpoint = None
+
+    if checkpoint is not None:
+        for m in tracker.load_checkpoint(checkpoint):
+            print(m, file=sys.stderr)
+
+    # (grouper, status, exit_code) tuples are accepted as well
+    exit_conditions = [
+        c if isinstance(c, ExitCondition) else ExitCondition(*c)
+        for c in exit_conditions
+    ]
+    for condition in exit_conditions:
+        if condition.per_group:
+            tracker.add_group_listener(condition)
+    started_at = time.time()
+
+    if connect is not None:
+        watcher = None
+        ingester = DaemonIngester(
+            tracker,
+            connect,
+            event_logs,
+            discovery=discovery if rediscover_interval > 0 else None,
+            rediscover_interval=rediscover_interval,
+        )
+    else:
+        watcher = make_event_log_watcher(
+            tracker.event_readers.keys(), sweep_interval=max_interval
+        )
+        # the asyncio engine looks for new jobs itself, so that a slow schedd
+        # doesn't hold up reading events
+        ingester = EventIngester(
+            tracker,
+            watcher,
+            discovery=(
+                discovery if rediscover_interval > 0 and engine == "threads" else None
+            ),
+            rediscover_interval=rediscover_interval,
+            checkpoint=checkpoint,
+            checkpoint_interval=checkpoint_interval,
+        )
+
+    collector = (
+        StatsCollector(tracker, started_at=discovery_started_at) if stats else None
+    )
+    profiler = None
+    if profile is not None:
+        profiler = LoopProfiler(profile, profile_iterations)
+        ingester.profiler = profiler
+
+    renderer = None
+    writer = None
+    exporter = None
+    if export_metrics is not None:
+        try:
+            exporter = MetricsExporter(tracker, *export_metrics)
+        except (OSError, IOError) as e:
+            print(
+                "ERROR: could not serve metrics at {}:{}. Reason: {}".format(
+                    export_metrics[0], export_metrics[1], e
+                ),
+                file=sys.stderr,
+            )
+            sys.exit(1)
+        exporter.update(caught_up=False)
+        exporter.start()
+        print(
+            "Serving metrics at http://{}:{}/metrics".format(*exporter.address),
+            file=sys.stderr,
+        )
+
+    if output_format == "jsonl":
+        writer = JsonLinesWriter(tracker)
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, writer.request_snapshot)
+    elif refresh and exporter is None:
+        renderer = TerminalRenderer()
+
+    frame_options = dict(
+        key=key,
+        table=table,
+        progress_bar=progress_bar,
+        summary=summary,
+        summary_type=summary_type,
+        updated_at=updated_at,
+        color=color,
+        abbreviate_path_components=abbreviate_path_components,
+    )
+
+    try:
+        if engine == "asyncio":
+            sinks = []
+            if writer is not None:
+                sinks.append(JsonLinesSink(tracker, writer))
+            if exporter is not None:
+                sinks.append(MetricsSink(tracker, exporter, dump_stats=writer is None))
+            if writer is None and exporter is None:
+                sinks.append(TerminalSink(tracker, renderer, frame_options))
+
+            async_engine = AsyncEngine(
+                tracker,
+                ingester,
+                sinks,
+                exit_conditions=exit_conditions,
+                writer=writer,
+                discovery=(
+                    discovery
+                    if rediscover_interval > 0 and watcher is not None
+                    else None
+                ),
+                rediscover_interval=rediscover_interval,
+                min_interval=min_interval,
+                max_interval=max_interval,
+                collector=collector,
+                profiler=profiler,
+            )
+            sys.exit(async_engine.run())
+
+        ingester.start()
+
+        # a JSON Lines snapshot taken before the daemon's jobs arrived would be
+        # followed by every one of them as a change
+        if writer is not None and connect is not None:
+            ingester.wait_until_subscribed()
+
+        # give the first pass a chance to finish before the first update,
+        # so that small queues don't flash a partial table
+        ingester.caught_up.wait(min_interval)
+
+        wait = min_interval
+
+        while True:
+            update_started_at = time.time()
+
+            if profiler is not None:
+                profiler.check()
+
+            if ingester.error is not None:
+                raise ingester.error
+
+            now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+            processing_messages = ingester.take_messages()
+            if len(processing_messages) > 0:
+                # the messages go where the frame was, and the next frame below them
+                if renderer is not None:
+                    renderer.clear()
+                print(
+                    "\n".join("{} | {}".format(now, m) for m in processing_messages),
+                    file=sys.stderr,
+                )
+
+            # take a consistent snapshot while the ingester is between batches
+            with tracker.lock:
+                caught_up = ingester.caught_up.is_set()
+                sample = collector.sample() if collector is not None else None
+                if writer is not None or exporter is not None:
+                    with tracker.timer.time("render"):
+                        if exporter is not None:
+                            exporter.update(caught_up)
+                        if writer is not None:
+                            writer.write_changes(stats=sample, caught_up=caught_up)
+                else:
+                    with tracker.timer.time("aggregate"):
+                        headers, rows = tracker.headers_and_rows()
+                        totals = collections.defaultdict(int, tracker.totals)
+                        progress = tracker.progress()
+
+                exit_status = check_exit_conditions(
+                    tracker, exit_conditions, caught_up, time.time() - started_at
+                )
+
+            # with metrics exported, run headless unless JSON Lines were asked for
+            if writer is None and exporter is None:
+                render_started_at = time.time()
+                frame = make_frame(
+                    headers,
+                    rows,
+                    totals,
+                    progress if not caught_up else [],
+                    now=now,
+                    stats=sample,
+                    **frame_options
+                )
+
+                if renderer is not None:
+                    renderer.draw(frame)
+                else:
+                    print(frame + "\n...")
+                tracker.timer.add("render", time.time() - render_started_at)
+            elif writer is None and sample is not None:
+                import json
+
+                print(json.dumps(sample, sort_keys=True), file=sys.stderr)
+
+            if profiler is not None and profiler.iteration_done():
+                for m in profiler.finish():
+                    print(m, file=sys.stderr)
+
+            if exit_status is not None:
+                condition, exit_code, reason = exit_status
+                report_exit(writer, condition, exit_code, reason, now)
+                sys.exit(exit_code)
+
+            # don't update more often than the minimum interval, even if events
+            # are arriving continuously
+            time.sleep(max(0, min_interval - (time.time() - update_started_at)))
+
+            # back off while nothing is happening
+            if ingester.updated.wait(wait):
+                wait = min_interval
+            else:
+                wait = min(wait * 2, max_interval)
+            ingester.updated.clear()
+    except KeyboardInterrupt:
+        sys.exit(0)
+    finally:
+        # before stopping the ingester, so that shutting down isn't profiled
+        if profiler is not None:
+            for m in profiler.finish():
+                print(m, file=sys.stderr)
+        ingester.stop()
+        if watcher is not None:
+            watcher.close()
+        tracker.close()
+        if exporter is not None:
+            exporter.close()
+
+        if checkpoint is not None and tracker.version != ingester.checkpointed_version:
+            for m in save_checkpoint(tracker, checkpoint):
+                print(m, file=sys.stderr)
+
+
+# subclassed for their docstrings, which can't be set on Python 2 classes
+
+
+class JobChange(
+    collections.namedtuple(
+        "JobChange", ["cluster_id", "proc_id", "group", "old_status", "new_status"]
+    )
+):
+    """
+    A job changed state. new_status is None if the job was forgotten (its event
+    log was truncated), and old_status is None if the job is new. group is the
+    key of the group (row) the job belongs to.
+    """
+
+    __slots__ = ()
+
+
+class GroupState(collections.namedtuple("GroupState", ["key", "total", "counts"])):
+    """
+    The jobs in one group (row of the table): how many there are, and a
+    read-only {JobStatus: count} mapping.
+    """
+
+    __slots__ = ()
+
+
+class Snapshot(
+    collections.namedtuple("Snapshot", ["version", "caught_up", "totals", "groups"])
+):
+    """
+    The state of the tracked jobs at one point. version goes up with every job
+    state change, caught_up says whether every event log had been read to the
+    end, totals is a read-only mapping with a count for every JobStatus and for
+    TOTAL and EVICTED, and groups is a tuple of GroupStates in display order.
+    """
+
+    __slots__ = ()
+
+
+class Update(collections.namedtuple("Update", ["snapshot", "changes", "messages"])):
+    """
+    What Watcher.poll() returns: a Snapshot, the JobChanges since the last poll,
+    and messages about what went wrong while reading.
+    """
+
+    __slots__ = ()
+
+
+class Watcher(object):
+    """
+    Tracks jobs for other programs, without printing or exiting.
+    Takes the same ways of picking jobs as condor_watch_q, finds their event
+    logs once, and keeps one tracker up to date for as long as it is used,
+    so each poll only reads what was written since the last one. ::
+
+        with Watcher(users=["alice"]) as watcher:
+            for update in watcher:
+                print(update.snapshot.totals[JobStatus.COMPLETED])
+
+    Iterating (or ``async for``) yields the first Update, then one whenever
+    something changes, until close() is called. Snapshots are immutable, and
+    reused while nothing changes, so they can be kept and compared cheaply.
+    Like condor_watch_q, it watches the current user's jobs if no jobs are
+    picked. Job changes are passed on once the event logs have been read to
+    the end; until then, the snapshots show how far along the backlog is.
+    """
+
+    def __init__(
+        self,
+        users=None,
+        cluster_ids=None,
+        event_logs=None,
+        batches=None,
+        collector=None,
+        schedd=None,
+        group_by="batch_name",
+        reader="htcondor",
+        read_workers=1,
+        max_clusters=None,
+        rediscover_interval=30,
+        poll_interval=1.0,
+        batch_seconds=0.25,
+    ):
+        import getpass
+
+        if (
+            users is None
+            and cluster_ids is None
+            and event_logs is None
+            and batches is None
+        ):
+            users = [getpass.getuser()]
+
+        self.discovery = JobDiscovery(
+            users, cluster_ids, event_logs, batches, collector=collector, schedd=schedd
+        )
+        _, event_log_paths, batch_names = self.discovery.discover()
+
+        self.tracker = JobStateTracker(
+            event_log_paths,
+            batch_names,
+            group_by=group_by,
+            read_workers=read_workers,
+            reader=reader,
+            max_clusters=max_clusters,
+            only_cluster_ids=self.discovery.only_cluster_ids,
+        )
+        self.poll_interval = poll_interval
+
+        self._watcher = make_event_log_watcher(self.tracker.event_readers.keys())
+        self._ingester = EventIngester(
+            self.tracker,
+            self._watcher,
+            batch_seconds=batch_seconds,
+            discovery=self.discovery if rediscover_interval > 0 else None,
+            rediscover_interval=rediscover_interval,
+        )
+        self._pending = set(self.tracker.event_readers.keys())
+
+        self._changes = []
+        self._caught_up_once = False
+        self._group_states = {}
+        self._snapshot = None
+        self._executor = None
+        self.closed = False
+
+        # held by poll, so that close waits for the poll in progress to finish
+        self._poll_lock = threading.Lock()
+
+        self.tracker.add_job_listener(self)
+        self.tracker.add_group_listener(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Stop watching; iteration ends after the update in progress."""
+        if self.closed:
+            return
+        self.closed = True
+        if self._executor is not None:
+            self._executor.shutdown()
+        with self._poll_lock:
+            self._watcher.close()
+            self.tracker.close()
+
+    def job_changed(self, cluster_id, proc_id, group, old_status, new_status):
+        self._changes.append(
+            JobChange(cluster_id, proc_id, group.key, old_status, new_status)
+        )
+
+    def group_changed(self, group):
+        self._group_states.pop(group.key, None)
+
+    def group_removed(self, group):
+        self._group_states.pop(group.key, None)
+
+    def poll(self, timeout=0):
+        """
+        Read what was written to the event logs since the last poll, waiting
+        up to timeout seconds for something to be written if nothing was.
+        A large backlog is read a little at a time, over several polls.
+        Returns an Update; once the Watcher is closed, nothing more is read.
+        """
+        with self._poll_lock:
+            deadline = time.time() + timeout
+            version = self.tracker.version
+            while not self.closed:
+                self._pending = self._ingester.step(
+                    self._pending, max(0, deadline - time.time())
+                )
+                if self.tracker.version != version or time.time() >= deadline:
+                    break
+
+            messages = tuple(self._ingester.take_messages())
+            with self.tracker.lock:
+                snapshot = self._take_snapshot()
+                # the changes read with the backlog are in the first caught
+                # up snapshot, rather than passed on as if they just happened
+                changes = tuple(self._changes) if self._caught_up_once else ()
+                self._caught_up_once = self._caught_up_once or snapshot.caught_up
+                self._changes = []
+                return Update(snapshot, changes, messages)
+
+    @property
+    def snapshot(self):
+        """The current Snapshot, without reading anything."""
+        with self.tracker.lock:
+            return self._take_snapshot()
+
+    def job_status(self, cluster_id, proc_id):
+        """The JobStatus of one job, or None if it isn't tracked."""
+        with self.tracker.lock:
+            cluster = self.tracker.cluster_id_to_cluster.get(cluster_id)
+            return cluster.get(proc_id) if cluster is not None else None
+
+    def _take_snapshot(self):
+        tracker = self.tracker
+        caught_up = len(tracker.behind) == 0 and len(self._pending) == 0
+        snapshot = self._snapshot
+        if (
+            snapshot is not None
+            and snapshot.version == tracker.version
+            and snapshot.caught_up == caught_up
+        ):
+            return snapshot
+
+        import types
+
+        # Python 2 has no read-only mapping, so snapshots there hold plain dicts
+        read_only = getattr(types, "MappingProxyType", dict)
+
+        totals = {js: tracker.totals[js] for js in JobStatus}
+        totals[TOTAL] = tracker.totals[TOTAL]
+        totals[EVICTED] = tracker.totals[EVICTED]
+
+        # only the groups that changed since the last snapshot are copied
+        groups = []
+        for group in tracker.sorted_groups:
+            state = self._group_states.get(group.key)
+            if state is None:
+                state = GroupState(
+                    group.key,
+                    group.total,
+                    read_only({js: group.counts[js] for js in JobStatus}),
+                )
+                self._group_states[group.key] = state
+            groups.append(state)
+
+        self._snapshot = Snapshot(
+            tracker.version,
+            caught_up,
+            read_only(totals),
+            tuple(groups),
+        )
+        return self._snapshot
+
+    def __iter__(self):
+        last = None
+        while not self.closed:
+            update = self.poll(0 if last is None else self.poll_interval)
+            if self.is_news(update, last):
+                last = update
+                yield update
+
+    def __aiter__(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        # async generators are a syntax error on Python 2
+        from condor_watch_q_asyncio import iterate_updates
+
+        if self._executor is None:
+            # polls happen one at a time, off the event loop
+            self._executor = ThreadPoolExecutor(1)
+        return iterate_updates(self, self._executor)
+
+    @staticmethod
+    def is_news(update, last):
+        """Whether update is worth passing on after last (None for the first update)."""
+        # snapshots are reused while nothing changes
+        return (
+            last is None
+            or update.snapshot is not last.snapshot
+            or len(update.messages) > 0
+        )
+
+
+def check_exit_conditions(tracker, exit_conditions, caught_up, elapsed):
+    """
+    Return (condition, exit code, reason) for the first exit condition that
+    is met (reason "met"; only checked once every event log has been read) or
+    that timed out (reason "timeout"), or None.
+    Call it while holding the tracker's lock.
+    """
+    if caught_up:
+        for condition in exit_conditions:
+            if condition.is_met(tracker):
+                return condition, condition.exit_code, "met"
+
+    for condition in exit_conditions:
+        if condition.is_timed_out(elapsed):
+            return condition, TIMEOUT_EXIT_CODE, "timeout"
+
+    return None
+
+
+def report_exit(writer, condition, exit_code, reason, now):
+    """Say why condor_watch_q is exiting, as a JSON Lines record if writer is given."""
+    if writer is not None:
+        writer.write_exit(condition, exit_code, reason)
+    elif reason == "met":
+        print(
+            'Exiting with code {} because of condition "{}" at {}'.format(
+                exit_code, condition.description, now
+            )
+        )
+    else:
+        print(
+            'Exiting with code {} because condition "{}" was not met within {:g} seconds at {}'.format(
+                exit_code, condition.description, condition.timeout, now
+            )
+        )
+
+
+def make_frame(
+    headers,
+    rows,
+    totals,
+    progress,
+    key,
+    now,
+    table=True,
+    progress_bar=True,
+    summary=True,
+    summary_type="totals",
+    updated_at=True,
+    color=True,
+    abbreviate_path_components=False,
+    stats=None,
+):
+    """Build the text that is displayed on each update."""
+    row_fmt = (lambda s, r: colorize(s, determine_row_color(r))) if color else None
+
+    if key == EVENT_LOG and abbreviate_path_components:
+        rows = [dict(row) for row in rows]
+        for row in rows:
+            row[key] = abbreviate_path(row[key])
+
+    width = min(get_terminal_columns() - 1, 79)
+
+    msg = []
+
+    if table:
+        msg += make_table(
+            headers=[key] + headers,
+            rows=rows,
+            row_fmt=row_fmt,
+            alignment=TABLE_ALIGNMENT,
+            fill="-",
+        )
+        msg += [""]
+
+    if progress_bar:
+        msg += make_progress_bar(totals=totals, width=width, color=color)
+        msg += [""]
+
+    if summary:
+        if summary_type == "totals":
+            msg += make_summary_with_totals(totals, width=width)
+        elif summary_type == "percentages":
+            msg += make_summary_with_percentages(totals, width=width)
+        msg += [""]
+
+    if len(progress) > 0:
+        msg += make_catch_up_progress(progress, width=width)
+        msg += [""]
+
+    if stats is not None:
+        msg += make_stats_footer(stats, width=width)
+        msg += [""]
+
+    if updated_at:
+        msg += ["Updated at {}".format(now)] + [""]
+
+    # msg[:-1] because we need to strip the last blank section delimiter line off
+    return "\n".join(msg[:-1])
+
+
+class JsonLinesWriter(object):
+    """
+    Writes what changed about the tracked jobs as JSON Lines, one record per
+    line: group and total counts that changed, jobs that changed state, and
+    why condor_watch_q exited. Every record has a sequence number that goes up
+    by one with each record. The first write is a snapshot of every group, and
+    so is the first write after request_snapshot() is called. The first
+    snapshot waits until the event logs have been read to the end: the jobs
+    and groups that change while the backlog is read are left out, rather
+    than written as if they had just changed.
+    """
+
+    def __init__(self, tracker, stream=None):
+        self.tracker = tracker
+        self.stream = sys.stdout if stream is None else stream
+        self.seq = 0
+
+        self._snapshot_requested = True
+        self._started = False
+        self._changed_groups = {}
+        self._removed_groups = set()
+        self._job_changes = []
+
+        tracker.add_group_listener(self)
+        tracker.add_job_listener(self)
+
+    def request_snapshot(self, *args):
+        # also used as a signal handler, so it only sets a flag
+        self._snapshot_requested = True
+
+    def group_changed(self, group):
+        self._changed_groups[group.key] = group
+        self._removed_groups.discard(group.key)
+
+    def group_removed(self, group):
+        self._changed_groups.pop(group.key, None)
+        self._removed_groups.add(group.key)
+
+    def job_changed(self, cluster_id, proc_id, group, old_status, new_status):
+        self._job_changes.append(
+            (cluster_id, proc_id, group.key, old_status, new_status)
+        )
+
+    def write_changes(self, stats=None, caught_up=True):
+        """
+        Write everything that changed since the last write, and the given
+        stats (see StatsCollector). Until caught_up is first True, only the
+        stats are written. Call it while holding the tracker's lock.
+        """
+        self.write_records(self.take_changes(stats, caught_up))
+
+    def take_changes(self, stats=None, caught_up=True):
+        """
+        Like write_changes, but return the records instead of writing them, so
+        that they can be written without holding the tracker's lock.
+        """
+        now = time.time()
+        records = []
+
+        if self._snapshot_requested:
+            # the first snapshot waits until the backlog has been read
+            if caught_up or self._started:
+                self._started = True
+                self._snapshot_requested = False
+                records.append(
+                    self._record(
+                        "snapshot",
+                        now,
+                        totals=self._totals(),
+                        groups=[
+                            self._group(group) for group in self.tracker.sorted_groups
+                        ],
+                    )
+                )
+        else:
+            for (
+                cluster_id,
+                proc_id,
+                group_key,
+                old_status,
+                new_status,
+            ) in self._job_changes:
+                records.append(
+                    self._record(
+                        "job",
+                        now,
+                        job="{}.{}".format(cluster_id, proc_id),
+                        group=group_key,
+                        status=new_status.name if new_status is not None else None,
+                        previous=old_status.name if old_status is not None else None,
+                    )
+                )
+            # removed groups have no clusters left to order them by, but the
+            # keys of one tracker's groups are all of one type
+            for group_key in sorted(self._removed_groups):
+                records.append(self._record("group_removed", now, group=group_key))
+            # in the order of the table's rows
+            for group in sorted(
+                self._changed_groups.values(), key=operator.attrgetter("sort_key")
+            ):
+                records.append(self._record("group", now, **self._group(group)))
+            if len(self._job_changes) > 0:
+                records.append(self._record("totals", now, totals=self._totals()))
+
+        if stats is not None:
+            records.append(self._record("stats", now, **stats))
+
+        self._changed_groups.clear()
+        self._removed_groups.clear()
+        self._job_changes = []
+
+        return records
+
+    def write_exit(self, condition, exit_code, reason):
+        self.write_records(
+            [
+                self._record(
+                    "exit",
+                    time.time(),
+                    code=exit_code,
+                    condition=condition.description,
+                    reason=reason,
+                )
+            ]
+        )
+
+    def _record(self, record_type, now, **fields):
+        record = {"seq": self.seq, "type": record_type, "time": round(now, 3)}
+        record.update(fields)
+        self.seq += 1
+        return record
+
+    def _group(self, group):
+        return {
+            "group": group.key,
+            "total": group.total,
+            "counts": self._counts(group.counts),
+        }
+
+    def _totals(self):
+        totals = self._counts(self.tracker.totals)
+        totals[TOTAL] = self.tracker.totals[TOTAL]
+        if self.tracker.totals[EVICTED] > 0:
+            totals[EVICTED] = self.tracker.totals[EVICTED]
+        return totals
+
+    def _counts(self, counts):
+        return {js.name: counts[js] for js in JobStatus if counts[js] != 0}
+
+    def write_records(self, records):
+        import json
+
+        if len(records) == 0:
+            return
+
+        self.stream.write(
+            "".join(json.dumps(record, sort_keys=True) + "\n" for record in records)
+        )
+        self.stream.flush()
+
+
+def run_daemon(socket_path, reader="htcondor"):
+    daemon = TrackingDaemon(socket_path, reader=reader)
+    try:
+        daemon.listen()
+    except (OSError, IOError) as e:
+        print(
+            "ERROR: could not listen on {}. Reason: {}".format(socket_path, e),
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+    print("Listening on {}".format(socket_path), file=sys.stderr)
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        sys.exit(0)
+    finally:
+        daemon.close()
+
+
+class TrackingDaemon(object):
+    """
+    Reads event logs on behalf of condor_watch_q processes that connect to it
+    through a Unix socket. Each event log is read by a single JobStateTracker
+    while at least one client is subscribed to it. A client that subscribes to
+    an event log is sent a snapshot of its jobs, and then each batch of job
+    state changes as it is read.
+    Messages in both directions are JSON objects, one per line. Clients send
+
+        {"type": "subscribe", "event_logs": [...], "cluster_ids": null or [...]}
+
+    and receive "snapshot", "changes", "forget", "message" and "status"
+    messages; see DaemonIngester for how they are used.
+    """
+
+    # a client that lets this much go unread is disconnected
+    MAX_OUTBOX = 64 * 1024 * 1024
+
+    # as is a client that sends a line longer than this
+    MAX_INBOX = 1024 * 1024
+
+    def __init__(
+        self, socket_path, reader="htcondor", batch_size=20000, batch_seconds=0.25
+    ):
+        self.socket_path = socket_path
+        self.reader = reader
+        self.batch_size = batch_size
+        self.batch_seconds = batch_seconds
+
+        self.trackers = {}
+        self.watcher = None
+        self.clients = []
+        self._server = None
+
+        # per event log, the job changes read since they were last sent
+        self._changes = {}
+
+    def listen(self):
+        import socket
+
+        # a socket file left behind by a daemon that is no longer running
+        if os.path.exists(self.socket_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socket_path)
+            except (OSError, IOError):
+                os.unlink(self.socket_path)
+            else:
+                raise IOError(
+                    "another daemon is already listening on {}".format(self.socket_path)
+                )
+            finally:
+                probe.close()
+
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.socket_path)
+        self._server.listen(64)
+        self._server.setblocking(False)
+
+        self.watcher = make_event_log_watcher([])
+
+    def close(self):
+        for client in list(self.clients):
+            self._disconnect(client)
+        for tracker in self.trackers.values():
+            tracker.close()
+        self.trackers.clear()
+
+        if self.watcher is not None:
+            self.watcher.close()
+        if self._server is not None:
+            self._server.close()
+            try:
+                os.unlink(self.socket_path)
+            except OSError:
+                pass
+
+    def serve_forever(self, poll_interval=0.25):
+        while True:
+            self._handle_sockets(0 if len(self._behind()) > 0 else poll_interval)
+
+            # share the time between the event logs, like process_events does;
+            # the ones just subscribed to are read before their first status
+            changed = sorted(
+                (self.watcher.wait(0) | self._behind()) & set(self.trackers)
+            )
+            deadline = time.time() + self.batch_seconds
+            for i, path in enumerate(changed):
+                tracker = self.trackers[path]
+                messages = tracker.process_events(
+                    max_events=self.batch_size,
+                    max_seconds=max(0, deadline - time.time()) / (len(changed) - i),
+                )
+                self._send_changes(path, messages)
+
+            for client in self.clients:
+                # a status before the first subscription would claim that
+                # every job had been sent
+                if client.subscribed:
+                    self._send_status(client)
+
+    def _behind(self):
+        behind = set()
+        for tracker in self.trackers.values():
+            behind |= tracker.behind
+        return behind
+
+    def _handle_sockets(self, timeout):
+        writing = [c.sock for c in self.clients if len(c.outbox) > 0]
+        readable, writable, _ = select.select(
+            [self._server] + [c.sock for c in self.clients], writing, [], timeout
+        )
+
+        by_sock = {c.sock: c for c in self.clients}
+        for sock in readable:
+            if sock is self._server:
+                self._accept()
+                continue
+
+            client = by_sock[sock]
+            if client not in self.clients:
+                continue
+            try:
+                data = sock.recv(64 * 1024)
+            except (OSError, IOError):
+                data = b""
+            if len(data) == 0:
+                self._disconnect(client)
+                continue
+
+            client.inbox += data
+            while b"\n" in client.inbox and client in self.clients:
+                line, client.inbox = client.inbox.split(b"\n", 1)
+                # whatever a client sends, the other clients keep their streams
+                try:
+                    self._handle_message(client, line)
+                except Exception:
+                    self._disconnect(client)
+            if len(client.inbox) > self.MAX_INBOX and client in self.clients:
+                self._disconnect(client)
+
+        for sock in writable:
+            client = by_sock[sock]
+            if client not in self.clients:
+                continue
+            try:
+                sent = sock.send(client.outbox)
+            except (OSError, IOError):
+                self._disconnect(client)
+                continue
+            del client.outbox[:sent]
+
+    def _accept(self):
+        try:
+            sock, _ = self._server.accept()
+        except (OSError, IOError):
+            return
+        sock.setblocking(False)
+        self.clients.append(DaemonClient(sock))
+
+    def _disconnect(self, client):
+        self.clients.remove(client)
+        client.sock.close()
+
+        # stop reading event logs that nobody is following anymore
+        followed = set()
+        for c in self.clients:
+            followed.update(c.event_logs)
+        for path in set(self.trackers) - followed:
+            self.trackers.pop(path).close()
+            self._changes.pop(path, None)
+            self.watcher.remove(path)
+
+    def _handle_message(self, client, line):
+        try:
+            event_logs, cluster_ids = parse_subscription(line)
+        except ValueError:
+            self._disconnect(client)
+            return
+
+        for path in event_logs:
+            if not peer_may_read(client.uid, path):
+                client.send(
+                    {
+                        "type": "message",
+                        "text": "WARNING: not allowed to read event log at {}, so it will be ignored".format(
+                            path
+                        ),
+                    }
+                )
+                continue
+
+            tracker = self.trackers.get(path) or self._open(client, path)
+            if tracker is None:
+                continue
+
+            client.event_logs[path] = cluster_ids
+            client.send(
+                {
+                    "type": "snapshot",
+                    "event_log": path,
+                    "clusters": [
+                        [cluster.cluster_id, list(cluster.state_codes())]
+                        for cluster in tracker.clusters
+                        if cluster_ids is None or cluster.cluster_id in cluster_ids
+                    ],
+                }
+            )
+
+        client.subscribed = True
+        client.caught_up = None
+        self._check_outbox(client)
+
+    def _open(self, client, path):
+        tracker = JobStateTracker([], {}, group_by="cluster_id", reader=self.reader)
+        try:
+            # check the file that was actually opened, without following a
+            # symlink, and without blocking if it is a FIFO
+            fd = os.open(
+                path, os.O_RDONLY | os.O_NONBLOCK | getattr(os, "O_NOFOLLOW", 0)
+            )
+            try:
+                st = os.fstat(fd)
+                if not stat.S_ISREG(st.st_mode):
+                    problem = "is not a regular file"
+                elif not peer_may_read(client.uid, path, st):
+                    problem = "is not readable by the client"
+                else:
+                    problem = None
+                    tracker.event_readers[path] = tracker.reader_class(path)
+                    # it could have been replaced since it was checked
+                    if file_id(path) != (st.st_dev, st.st_ino):
+                        tracker.close()
+                        problem = "changed while it was being opened"
+            finally:
+                os.close(fd)
+        except (OSError, IOError) as e:
+            problem = "could not be opened for reading. Reason: {}".format(e)
+
+        if problem is not None:
+            client.send(
+                {
+                    "type": "message",
+                    "text": "WARNING: event log at {} {}, so it will be ignored".format(
+                        path, problem
+                    ),
+                }
+            )
+            return None
+
+        tracker.behind.add(path)
+        self._changes[path] = changes = []
+        tracker.add_job_listener(DaemonChangeCollector(changes))
+        self.trackers[path] = tracker
+        self.watcher.add(path)
+
+        return tracker
+
+    def _send_changes(self, path, messages):
+        changes = self._changes[path]
+
+        for client in list(self.clients):
+            cluster_ids = client.event_logs.get(path, False)
+            if cluster_ids is False:
+                continue
+
+            for text in messages:
+                client.send({"type": "message", "text": text})
+
+            # changes and forgotten clusters are sent in the order they happened
+            jobs = [
+                job for job in changes if cluster_ids is None or job[0] in cluster_ids
+            ]
+            for forgotten, run in itertools.groupby(jobs, lambda job: job[1] is None):
+                if forgotten:
+                    client.send(
+                        {
+                            "type": "forget",
+                            "event_log": path,
+                            "cluster_ids": [job[0] for job in run],
+                        }
+                    )
+                else:
+                    client.send(
+                        {"type": "changes", "event_log": path, "jobs": list(run)}
+                    )
+            self._check_outbox(client)
+
+        del changes[:]
+
+    def _send_status(self, client):
+        caught_up = not any(
+            path in self.trackers[path].behind for path in client.event_logs
+        )
+        if caught_up != client.caught_up:
+            client.caught_up = caught_up
+            client.send({"type": "status", "caught_up": caught_up})
+
+    def _check_outbox(self, client):
+        if len(client.outbox) > self.MAX_OUTBOX and client in self.clients:
+            self._disconnect(client)
+
+
+def parse_subscription(line):
+    """
+    The event logs and cluster ids (None for all of them) that a client's
+    subscribe message asks for. Raises ValueError if the line is not a
+    well-formed subscribe message.
+    """
+    import json
+
+    message = json.loads(line.decode("utf-8"))
+    if not isinstance(message, dict) or message.get("type") != "subscribe":
+        raise ValueError("not a subscribe message: {!r}".format(line))
+
+    event_logs = message.get("event_logs", [])
+    if not isinstance(event_logs, list) or not all(
+        isinstance(path, type(u"")) for path in event_logs
+    ):
+        raise ValueError("event_logs is not a list of paths: {!r}".format(line))
+
+    cluster_ids = message.get("cluster_ids")
+    if cluster_ids is not None:
+        if not isinstance(cluster_ids, list) or not all(
+            isinstance(i, int) and not isinstance(i, bool) for i in cluster_ids
+        ):
+            raise ValueError(
+                "cluster_ids is not a list of cluster ids: {!r}".format(line)
+            )
+        cluster_ids = set(cluster_ids)
+
+    return event_logs, cluster_ids
+
+
+class DaemonClient(object):
+    """A connection to the daemon, as seen by the daemon."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.uid = peer_uid(sock)
+        self.inbox = b""
+        self.outbox = bytearray()
+
+        # event log path -> the cluster ids to send, or None for all of them
+        self.event_logs = {}
+        self.subscribed = False
+        self.caught_up = None
+
+    def send(self, message):
+        import json
+
+        self.outbox += json.dumps(message).encode("utf-8") + b"\n"
+
+
+class DaemonChangeCollector(object):
+    """Collects the job state changes in one event log, in the form they are sent in."""
+
+    def __init__(self, changes):
+        self.changes = changes
+
+    def job_changed(self, cluster_id, proc_id, group, old_status, new_status):
+        if new_status is not None:
+            self.changes.append((cluster_id, proc_id, JOB_STATUS_TO_CODE[new_status]))
+        # forgotten jobs are sent as a "forget" message for their clusters,
+        # so each forgotten cluster is noted once, as (cluster_id, None, None)
+        elif len(self.changes) == 0 or self.changes[-1] != (cluster_id, None, None):
+            self.changes.append((cluster_id, None, None))
+
+
+def peer_uid(sock):
+    """The uid of the process at the other end of a Unix socket, or None if it can't be found out."""
+    import socket
+
+    try:
+        creds = sock.getsockopt(
+            socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")
+        )
+    except (AttributeError, OSError, IOError):  # SO_PEERCRED is Linux-only
+        return None
+    return struct.unpack("3i", creds)[1]
+
+
+def peer_may_read(uid, path, st=None):
+    """
+    Whether a client running as uid may follow the event log at path through
+    the daemon: it must be able to search every directory above the event
+    log, and to read the event log (whose stat result may be given as st) as
+    its owner or as anyone else. Group permissions aren't taken into account.
+    A client whose uid isn't known may not, and neither may anyone if the
+    event log or a directory can't be looked at.
+    """
+    if uid is None:
+        return False
+    if uid == 0 or uid == os.getuid():
+        return True
+
+    try:
+        if st is None:
+            st = os.stat(path)
+
+        directory = os.path.dirname(os.path.abspath(path))
+        while True:
+            if not peer_has_permission(
+                uid, os.stat(directory), stat.S_IXUSR, stat.S_IXOTH
+            ):
+                return False
+            parent = os.path.dirname(directory)
+            if parent == directory:
+                break
+            directory = parent
+    except OSError:
+        return False
+
+    return peer_has_permission(uid, st, stat.S_IRUSR, stat.S_IROTH)
+
+
+def peer_has_permission(uid, st, owner_bit, other_bit):
+    """Whether the owner_bit (if uid owns the file described by st) or other_bit is set."""
+    if st.st_uid == uid:
+        return bool(st.st_mode & owner_bit)
+    return bool(st.st_mode & other_bit)
+
+
+class DaemonIngester(object):
+    """
+    Stands in for EventIngester when a daemon reads the event logs: it
+    subscribes to them and applies the job states that the daemon sends.
+    """
+
+    def __init__(
+        self,
+        tracker,
+        socket_path,
+        event_logs,
+        discovery=None,
+        rediscover_interval=30,
+    ):
+        self.tracker = tracker
+        self.socket_path = socket_path
+        self.event_logs = set(event_logs)
+
+        self.discovery = discovery
+        self.rediscover_interval = rediscover_interval
+        self.discovered_at = time.time()
+
+        # nothing is checkpointed
+        self.checkpointed_version = tracker.version
+
+        self.updated = threading.Event()
+        self.caught_up = threading.Event()
+        self.error = None
+
+        # set once the jobs the daemon had already read from the event logs
+        # subscribed to on start have been applied; the daemon sends a status
+        # after the snapshots for each subscription
+        self.subscribed = threading.Event()
+
+        # see LoopProfiler
+        self.profiler = None
+
+        self._messages = collections.deque()
+        self._stopped = threading.Event()
+        self._sock = None
+        self._thread = threading.Thread(target=self._run, name="daemon")
+        self._thread.daemon = True
+
+    def start(self):
+        import socket
+
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.connect(self.socket_path)
+        self._subscribe(self.event_logs)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        if self._sock is not None:
+            self._sock.close()
+
+    def take_messages(self):
+        messages = []
+        while len(self._messages) > 0:
+            messages.append(self._messages.popleft())
+        return messages
+
+    def wait_until_subscribed(self):
+        """Wait until subscribed is set, or until the connection to the daemon fails."""
+        while not self.subscribed.wait(0.5):
+            if self.error is not None or self._stopped.is_set():
+                return
+
+    def _subscribe(self, event_logs):
+        import json
+
+        message = {
+            "type": "subscribe",
+            "event_logs": sorted(event_logs),
+            "cluster_ids": (
+                sorted(self.tracker.only_cluster_ids)
+                if self.tracker.only_cluster_ids is not None
+                else None
+            ),
+        }
+        self._sock.sendall(json.dumps(message).encode("utf-8") + b"\n")
+
+    def _run(self):
+        try:
+            inbox = b""
+            while not self._stopped.is_set():
+                if self.profiler is not None:
+                    self.profiler.check()
+
+                readable, _, _ = select.select([self._sock], [], [], 0.5)
+                if len(readable) > 0:
+                    data = self._sock.recv(1024 * 1024)
+                    if len(data) == 0:
+                        raise IOError(
+                            "lost the connection to the daemon at {}".format(
+                                self.socket_path
+                            )
+                        )
+
+                    inbox += data
+                    lines = inbox.split(b"\n")
+                    inbox = lines.pop()
+                    self._handle_messages(lines)
+
+                if (
+                    self.discovery is not None
+                    and self.discovery.can_find_new_jobs
+                    and time.time() - self.discovered_at >= self.rediscover_interval
+                ):
+                    self._rediscover()
+        except Exception as e:
+            self.error = e
+            self.updated.set()
+        finally:
+            if self.profiler is not None:
+                self.profiler.stop_thread()
+
+    def _handle_messages(self, lines):
+        import json
+
+        with self.tracker.lock, self.tracker.timer.time("apply"):
+            for line in lines:
+                message = json.loads(line.decode("utf-8"))
+                message_type = message["type"]
+
+                if message_type == "snapshot":
+                    path = message["event_log"]
+                    for cluster_id, state_codes in message["clusters"]:
+                        for proc_id, code in state_codes:
+                            self.tracker.apply_transition(
+                                path, cluster_id, proc_id, CODE_TO_JOB_STATUS[code]
+                            )
+                elif message_type == "changes":
+                    path = message["event_log"]
+                    for cluster_id, proc_id, code in message["jobs"]:
+                        self.tracker.apply_transition(
+                            path, cluster_id, proc_id, CODE_TO_JOB_STATUS[code]
+                        )
+                elif message_type == "forget":
+                    cluster_ids = message["cluster_ids"]
+                    self.tracker.forget_event_log(
+                        message["event_log"],
+                        set(cluster_ids) if cluster_ids is not None else None,
+                    )
+                elif message_type == "message":
+                    self._messages.append(message["text"])
+                elif message_type == "status":
+                    if message["caught_up"]:
+                        self.caught_up.set()
+                    else:
+                        self.caught_up.clear()
+                    self.subscribed.set()
+
+        self.updated.set()
+
+    def _rediscover(self):
+        self.discovered_at = time.time()
+        try:
+            with self.tracker.timer.time("query"):
+                cluster_ids, event_logs, batch_names = self.discovery.discover_new()
+        except Exception as e:
+            self._messages.append(
+                "WARNING: could not look for new jobs, will try again later. Reason: {}".format(
+                    e
+                )
+            )
+            return
+
+        self.tracker.add_batch_names(batch_names)
+
+        new_event_logs = event_logs - self.event_logs
+        if len(new_event_logs) > 0:
+            self.event_logs |= new_event_logs
+            self._subscribe(new_event_logs)
+
+
+class MetricsExporter(object):
+    """
+    Serves the tracker's counters over HTTP in the Prometheus text format.
+    The page is rebuilt by update() (while holding the tracker's lock), and
+    scrapes are answered from the last page built, so they never wait on
+    event ingestion.
+    """
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self, tracker, host, port):
+        try:
+            from http.server import BaseHTTPRequestHandler, HTTPServer
+        except ImportError:  # Python 2
+            from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+        self.tracker = tracker
+        self._page = b""
+
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+
+                page = exporter._page
+                self.send_response(200)
+                self.send_header("Content-Type", exporter.CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(page)))
+                self.end_headers()
+                self.wfile.write(page)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = HTTPServer((host, port), Handler)
+        self.address = self._server.server_address[:2]
+
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="metrics"
+        )
+        self._thread.daemon = True
+
+    def start(self):
+        self._thread.start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def update(self, caught_up):
+        """Rebuild the page. Call it while holding the tracker's lock."""
+        tracker = self.tracker
+        lines = []
+
+        def metric(name, metric_type, help, samples):
+            lines.append("# HELP {} {}".format(name, help))
+            lines.append("# TYPE {} {}".format(name, metric_type))
+            for labels, value in samples:
+                if labels:
+                    labels = ",".join(
+                        '{}="{}"'.format(k, escape_label_value(v)) for k, v in labels
+                    )
+                    lines.append("{}{{{}}} {}".format(name, labels, value))
+                else:
+                    lines.append("{} {}".format(name, value))
+
+        metric(
+            "condor_watch_q_jobs",
+            "gauge",
+            "The number of tracked jobs in each state.",
+            [((("status", js.name),), tracker.totals[js]) for js in JobStatus],
+        )
+        metric(
+            "condor_watch_q_group_jobs",
+            "gauge",
+            "The number of jobs in each state, in each group (row of the table).",
+            [
+                ((("group", group.key), ("status", js.name)), group.counts[js])
+                for group in tracker.sorted_groups
+                for js in JobStatus
+            ],
+        )
+        metric(
+            "condor_watch_q_job_state_changes_total",
+            "counter",
+            "The number of job state changes that have been applied.",
+            [((), tracker.version)],
+        )
+        metric(
+            "condor_watch_q_evicted_jobs",
+            "gauge",
+            "The number of finished jobs whose clusters are no longer tracked.",
+            [((), tracker.totals[EVICTED])],
+        )
+
+        readers = sorted(tracker.event_readers.items())
+        metric(
+            "condor_watch_q_events_read_total",
+            "counter",
+            "The number of events read from the event logs.",
+            [((), sum(r.events_read for _, r in readers))],
+        )
+        metric(
+            "condor_watch_q_parse_errors_total",
+            "counter",
+            "The number of events that could not be parsed.",
+            [((), sum(r.parse_errors for _, r in readers))],
+        )
+        metric(
+            "condor_watch_q_event_log_caught_up",
+            "gauge",
+            "Whether each event log has been read to the end (1) or not (0).",
+            [
+                ((("log", path),), 0 if path in tracker.behind else 1)
+                for path, _ in readers
+            ],
+        )
+
+        metric(
+            "condor_watch_q_event_log_unread_bytes",
+            "gauge",
+            "How many bytes of each event log have not been read yet, for readers that can tell.",
+            [
+                ((("log", path),), n)
+                for path, n in sorted(tracker.unread_bytes().items())
+            ],
+        )
+        metric(
+            "condor_watch_q_phase_seconds_total",
+            "counter",
+            "The time spent in each phase of the work.",
+            [
+                ((("phase", phase),), "{:.6f}".format(tracker.timer.seconds[phase]))
+                for phase in PHASES
+                if phase in tracker.timer.seconds
+            ],
+        )
+        rss = resident_memory()
+        if rss is not None:
+            metric(
+                "condor_watch_q_resident_memory_bytes",
+                "gauge",
+                "How much memory condor_watch_q is using.",
+                [((), rss)],
+            )
+        metric(
+            "condor_watch_q_caught_up",
+            "gauge",
+            "Whether every event log has been read to the end.",
+            [((), 1 if caught_up else 0)],
+        )
+        metric(
+            "condor_watch_q_last_update_timestamp_seconds",
+            "gauge",
+            "When these metrics were last updated.",
+            [((), "{:.3f}".format(time.time()))],
+        )
+
+        self._page = ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def parse_host_port(value):
+    """Parse HOST:PORT (with IPv6 hosts in brackets) for -export-metrics."""
+    host, _, port = value.rpartition(":")
+    host = host.strip("[]")
+    try:
+        port = int(port)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            'must be HOST:PORT, but was "{}"'.format(value)
+        )
+    return host, port
+
+
+class EventIngester(object):
+    """
+    Reads events into the tracker on a background thread, so that the display
+    can keep updating while a large backlog of events is read.
+    Each pass reads at most batch_size events from each event log, for about
+    batch_seconds in all, and the tracker's lock is only held while the
+    transitions are applied. Event logs that changed are picked up between
+    passes, so they are kept current while a backlog is being read.
+    The ingester also looks for newly submitted jobs and writes checkpoints,
+    since those need the readers to be idle.
+    """
+
+    def __init__(
+        self,
+        tracker,
+        watcher,
+        batch_size=20000,
+        batch_seconds=0.25,
+        discovery=None,
+        rediscover_interval=30,
+        checkpoint=None,
+        checkpoint_interval=60,
+    ):
+        self.tracker = tracker
+        self.watcher = watcher
+        self.batch_size = batch_size
+        self.batch_seconds = batch_seconds
+
+        self.discovery = discovery
+        self.rediscover_interval = rediscover_interval
+        self.discovered_at = time.time()
+
+        self.checkpoint = checkpoint
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpointed_version = tracker.version
+        self.checkpointed_at = time.time()
+
+        # set whenever there is something new to display
+        self.updated = threading.Event()
+        # set while every event log has been read to the end
+        self.caught_up = threading.Event()
+
+        # the exception that stopped the thread, if any
+        self.error = None
+
+        # profiles the thread's loop, if set; see LoopProfiler
+        self.profiler = None
+
+        self._messages = collections.deque()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="ingest")
+        self._thread.daemon = True
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def take_messages(self):
+        messages = []
+        while len(self._messages) > 0:
+            messages.append(self._messages.popleft())
+        return messages
+
+    def _run(self):
+        try:
+            # on the first pass, read every event log
+            pending = set(self.tracker.event_readers.keys())
+
+            while not self._stopped.is_set():
+                if self.profiler is not None:
+                    self.profiler.check()
+
+                # the timeout bounds how long stopping can take
+                pending = self.step(pending, timeout=0.5)
+        except Exception as e:
+            self.error = e
+            self.updated.set()
+        finally:
+            if self.profiler is not None:
+                self.profiler.stop_thread()
+
+    def step(self, pending, timeout):
+        """
+        Make one pass: read from the pending event logs, or if there are none,
+        wait up to timeout for event logs to change, then look for new jobs
+        and write a checkpoint if those are due. Returns the event logs to
+        read on the next pass. The thread started by start() calls this in a
+        loop; call it directly to drive the ingester some other way.
+        """
+        if len(pending) > 0:
+            self._ingest(pending)
+            return set(self.tracker.behind) | self.watcher.wait(0)
+
+        if not self.caught_up.is_set():
+            self.caught_up.set()
+            self.updated.set()
+
+        pending = self.watcher.wait(timeout)
+
+        if self._rediscovery_due():
+            pending |= self._rediscover()
+
+        if self._checkpoint_due():
+            self._messages.extend(save_checkpoint(self.tracker, self.checkpoint))
+            self.checkpointed_version = self.tracker.version
+            self.checkpointed_at = time.time()
+
+        if len(pending) > 0:
+            self.caught_up.clear()
+        return pending
+
+    def _ingest(self, paths):
+        version = self.tracker.version
+        self._messages.extend(
+            self.tracker.process_events(
+                paths, max_events=self.batch_size, max_seconds=self.batch_seconds
+            )
+        )
+
+        if self.tracker.version != version or len(self._messages) > 0:
+            self.updated.set()
+
+    def _rediscovery_due(self):
+        return (
+            self.discovery is not None
+            and self.discovery.can_find_new_jobs
+            and time.time() - self.discovered_at >= self.rediscover_interval
+        )
+
+    def _rediscover(self):
+        new_event_logs, messages = rediscover(
+            self.discovery, self.tracker, self.watcher
+        )
+        self._messages.extend(messages)
+        self.discovered_at = time.time()
+        return new_event_logs
+
+    def _checkpoint_due(self):
+        return (
+            self.checkpoint is not None
+            and self.tracker.version != self.checkpointed_version
+            and time.time() - self.checkpointed_at >= self.checkpoint_interval
+        )
+
+
+class AsyncEngine(object):
+    """
+    Runs the update loop as asyncio tasks instead (-engine asyncio). Sources
+    keep the tracker up to date: one reads the event logs (or follows the
+    daemon), another asks the schedd about new jobs. A timer takes a snapshot
+    of the tracker for every update, and each sink (TerminalSink,
+    JsonLinesSink, MetricsSink) gets the snapshots through its own bounded
+    queue. Blocking work runs in executors, so a slow sink or a slow schedd
+    never holds up reading events, or each other.
+    The tasks themselves are in condor_watch_q_asyncio, because coroutines
+    are a syntax error on Python 2; this class holds the work they do.
+    """
+
+    # how many updates a sink may fall behind by; a lossy sink (which only
+    # needs the latest snapshot) drops the oldest, the others hold up the timer
+    QUEUE_SIZE = 4
+
+    def __init__(
+        self,
+        tracker,
+        ingester,
+        sinks,
+        exit_conditions=(),
+        writer=None,
+        discovery=None,
+        rediscover_interval=30,
+        min_interval=1.0,
+        max_interval=10.0,
+        collector=None,
+        profiler=None,
+    ):
+        self.tracker = tracker
+        self.ingester = ingester
+        self.sinks = sinks
+        self.exit_conditions = exit_conditions
+        # exit records go to the JSON Lines writer, if there is one
+        self.writer = writer
+
+        self.discovery = discovery
+        self.rediscover_interval = rediscover_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.collector = collector
+        self.profiler = profiler
+
+        # an ingester that reads on its own thread (like DaemonIngester) is
+        # started and followed, instead of being stepped by a task
+        self.ingester_has_thread = not isinstance(ingester, EventIngester)
+
+        self._messages = collections.deque()
+        self._started_at = None
+
+    def run(self):
+        """Run until an exit condition is met, and return its exit code."""
+        from concurrent.futures import ThreadPoolExecutor
+        import condor_watch_q_asyncio
+
+        # one thread for each kind of blocking work, so that each happens in order
+        self.ingest_executor = ThreadPoolExecutor(1)
+        self.query_executor = ThreadPoolExecutor(1)
+        self.output_executor = ThreadPoolExecutor(1)
+
+        self._started_at = time.time()
+        try:
+            return condor_watch_q_asyncio.run_engine(self)
+        finally:
+            if self.profiler is not None:
+                # only the thread being profiled can stop profiling itself
+                self.ingest_executor.submit(self.profiler.stop_thread)
+            self.ingest_executor.shutdown()
+            self.output_executor.shutdown()
+            # don't wait for the schedd
+            self.query_executor.shutdown(wait=False)
+
+    @property
+    def can_rediscover(self):
+        return self.discovery is not None and self.discovery.can_find_new_jobs
+
+    def step(self, pending):
+        """Read a batch of events; runs in the ingest executor."""
+        if self.profiler is not None:
+            self.profiler.check()
+        return self.ingester.step(pending, timeout=0.25)
+
+    def wait_for_first_pass(self):
+        """
+        Give the first pass a chance to finish before the first update, as
+        watch_q does; runs in a thread.
+        """
+        if self.writer is not None and isinstance(self.ingester, DaemonIngester):
+            self.ingester.wait_until_subscribed()
+        self.ingester.caught_up.wait(self.min_interval)
+
+    def take_updated(self):
+        """Return whether the ingester changed anything since the last call."""
+        if self.ingester.updated.is_set():
+            self.ingester.updated.clear()
+            return True
+        return False
+
+    def track(self, found):
+        """
+        Start reading the event logs of newly discovered jobs. Only called
+        between steps, so that nothing else touches the watcher meanwhile.
+        Returns the event logs to read.
+        """
+        return track_new_jobs(self.tracker, self.ingester.watcher, *found)
+
+    def discover(self):
+        """Ask the schedd about new jobs; runs in the query executor."""
+        found, messages = discover_new_jobs(self.discovery, self.tracker)
+        self._messages.extend(messages)
+        return found
+
+    def take_update(self):
+        """
+        Take a snapshot of the tracker for each sink. Returns when it was
+        taken, the messages to show, the sinks' snapshots, and the exit status
+        (see check_exit_conditions).
+        """
+        import datetime
+
+        if self.profiler is not None:
+            self.profiler.check()
+
+        ingester = self.ingester
+        tracker = self.tracker
+
+        if ingester.error is not None:
+            raise ingester.error
+
+        now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        messages = ingester.take_messages()
+        while len(self._messages) > 0:
+            messages.append(self._messages.popleft())
+
+        # take a consistent snapshot while the ingester is between batches
+        with tracker.lock:
+            caught_up = ingester.caught_up.is_set()
+            stats = self.collector.sample() if self.collector is not None else None
+            updates = [sink.snapshot(caught_up, stats) for sink in self.sinks]
+            exit_status = check_exit_conditions(
+                tracker,
+                self.exit_conditions,
+                caught_up,
+                time.time() - self._started_at,
+            )
+
+        if len(messages) > 0 and not any(s.SHOWS_MESSAGES for s in self.sinks):
+            print(
+                "\n".join("{} | {}".format(now, m) for m in messages),
+                file=sys.stderr,
+            )
+
+        return now, messages, updates, exit_status
+
+    def report_exit(self, exit_status, now):
+        condition, exit_code, reason = exit_status
+        report_exit(self.writer, condition, exit_code, reason, now)
+
+    def update_done(self):
+        """Stop profiling after the last profiled update."""
+        if self.profiler is not None and self.profiler.iteration_done():
+            self.profiler.stop_thread()
+            self.ingest_executor.submit(self.profiler.stop_thread)
+            for m in self.profiler.finish():
+                print(m, file=sys.stderr)
+
+
+class TerminalSink(object):
+    """Draws the table for AsyncEngine, or prints it if there is no renderer."""
+
+    # only the latest table matters
+    LOSSY = True
+    # messages go above the table, so they have to be printed along with it
+    SHOWS_MESSAGES = True
+
+    def __init__(self, tracker, renderer, frame_options):
+        self.tracker = tracker
+        self.renderer = renderer
+        self.frame_options = frame_options
+
+    def snapshot(self, caught_up, stats):
+        tracker = self.tracker
+        with tracker.timer.time("aggregate"):
+            headers, rows = tracker.headers_and_rows()
+            totals = collections.defaultdict(int, tracker.totals)
+            progress = tracker.progress() if not caught_up else []
+        return headers, rows, totals, progress, stats
+
+    def write(self, now, messages, update):
+        if len(messages) > 0:
+            # the messages go where the frame was, and the next frame below them
+            if self.renderer is not None:
+                self.renderer.clear()
+            print(
+                "\n".join("{} | {}".format(now, m) for m in messages),
+                file=sys.stderr,
+            )
+
+        headers, rows, totals, progress, stats = update
+        with self.tracker.timer.time("render"):
+            frame = make_frame(
+                headers,
+                rows,
+                totals,
+                progress,
+                now=now,
+                stats=stats,
+                **self.frame_options
+            )
+            if self.renderer is not None:
+                self.renderer.draw(frame)
+            else:
+                print(frame + "\n...")
+
+
+class JsonLinesSink(object):
+    """Writes JSON Lines records for AsyncEngine."""
+
+    # every record has to be written
+    LOSSY = False
+    SHOWS_MESSAGES = False
+
+    def __init__(self, tracker, writer):
+        self.tracker = tracker
+        self.writer = writer
+
+    def snapshot(self, caught_up, stats):
+        with self.tracker.timer.time("render"):
+            return self.writer.take_changes(stats, caught_up)
+
+    def write(self, now, messages, records):
+        with self.tracker.timer.time("render"):
+            self.writer.write_records(records)
+
+
+class MetricsSink(object):
+    """
+    Updates the metrics page for AsyncEngine, and writes the stats to STDERR
+    as JSON if dump_stats is True.
+    """
+
+    LOSSY = True
+    SHOWS_MESSAGES = False
+
+    def __init__(self, tracker, exporter, dump_stats=False):
+        self.tracker = tracker
+        self.exporter = exporter
+        self.dump_stats = dump_stats
+
+    def snapshot(self, caught_up, stats):
+        with self.tracker.timer.time("render"):
+            self.exporter.update(caught_up)
+        return stats if self.dump_stats else None
+
+    def write(self, now, messages, stats):
+        import json
+
+        if stats is not None:
+            print(json.dumps(stats, sort_keys=True), file=sys.stderr)
+
+
+def make_catch_up_progress(progress, width=79, max_event_logs=5):
+    """Describe how far into each event log with unread events the reader is."""
+    known = [(read, size) for _, read, size in progress if read is not None]
+    lines = []
+    if len(known) == len(progress) and len(progress) > 0:
+        read = sum(r for r, _ in known)
+        size = sum(s for _, s in known)
+        lines.append(
+            "Catching up: read {} of {} ({:.0%}) in {} event log{}".format(
+                format_bytes(read),
+                format_bytes(size),
+                safe_divide(read, size),
+                len(progress),
+                "s" if len(progress) != 1 else "",
+            )
+        )
+    else:
+        lines.append(
+            "Catching up: reading {} event log{}".format(
+                len(progress), "s" if len(progress) != 1 else ""
+            )
+        )
+
+    for path, read, size in progress[:max_event_logs]:
+        if read is None:
+            status = format_bytes(size)
+        else:
+            status = "{:>4.0%} of {}".format(
+                safe_divide(read, size), format_bytes(size)
+            )
+        lines.append("  {} {}".format(status, normalize_path(path))[:width])
+    if len(progress) > max_event_logs:
+        lines.append("  ... and {} more".format(len(progress) - max_event_logs))
+
+    return lines
+
+
+def make_stats_footer(stats, width=79, max_event_logs=5):
+    """Describe where the time went since the last update (see StatsCollector)."""
+    phases = stats["phases"]
+    rss = stats["rss_bytes"]
+    lines = [
+        "Stats for the last {:.1f}s{}:".format(
+            stats["interval"],
+            ", RSS {}".format(format_bytes(rss)) if rss is not None else "",
+        ),
+        "  {}".format(
+            ", ".join(
+                "{} {:.3f}s".format(phase, phases[phase])
+                for phase in PHASES
+                if phase in phases
+            )
+            or "idle"
+        )[:width],
+    ]
+
+    event_logs = stats["event_logs"]
+    if len(event_logs) > 0:
+        # only some readers can tell how far behind they are
+        unread = [
+            e["unread_bytes"] for e in event_logs if e["unread_bytes"] is not None
+        ]
+        lines.append(
+            "  {:.0f} events/s, {} parse errors{} in {} event log{}".format(
+                sum(e["events_per_second"] for e in event_logs),
+                sum(e["parse_errors"] for e in event_logs),
+                ", {} unread".format(format_bytes(sum(unread))) if unread else "",
+                len(event_logs),
+                "s" if len(event_logs) != 1 else "",
+            )[:width]
+        )
+
+    # the busiest event logs, and the ones furthest behind
+    busiest = sorted(
+        (e for e in event_logs if e["events_per_second"] > 0 or e["unread_bytes"]),
+        key=lambda e: (e["events_per_second"], e["unread_bytes"] or 0),
+        reverse=True,
+    )
+    for e in busiest[:max_event_logs]:
+        lines.append(
+            "  {:>9.0f}/s {:>10} {}".format(
+                e["events_per_second"],
+                format_bytes(e["unread_bytes"])
+                if e["unread_bytes"] is not None
+                else "",
+                normalize_path(e["path"]),
+            )[:width]
+        )
+
+    return lines
+
+
+def format_bytes(num_bytes):
+    for unit in ("B", "KB", "MB", "GB"):
+        if num_bytes < 1024 or unit == "GB":
+            break
+        num_bytes /= 1024.0
+    return (
+        "{:.1f} {}".format(num_bytes, unit) if unit != "B" else "{} B".format(num_bytes)
+    )
+
+
+def rediscover(discovery, tracker, watcher):
+    """
+    Start tracking any jobs submitted since the last discovery.
+    Returns the newly-watched event logs, which need to be read, and a list
+    of messages describing what went wrong.
+    """
+    found, messages = discover_new_jobs(discovery, tracker)
+    if found is None:
+        return set(), messages
+
+    return track_new_jobs(tracker, watcher, *found), messages
+
+
+def discover_new_jobs(discovery, tracker):
+    """
+    Ask the schedd about jobs submitted since the last discovery. Returns the
+    event logs and batch names it found (None if the query failed), and a
+    list of messages describing what went wrong.
+    """
+    try:
+        with tracker.timer.time("query"):
+            cluster_ids, event_logs, batch_names = discovery.discover_new()
+    except Exception as e:
+        return None, [
+            "WARNING: could not look for new jobs, will try again later. Reason: {}".format(
+                e
+            )
+        ]
+
+    return (event_logs, batch_names), []
+
+
+def track_new_jobs(tracker, watcher, event_logs, batch_names):
+    """Start tracking the jobs that discover_new_jobs found. Returns the newly-watched event logs."""
+    tracker.add_batch_names(batch_names)
+
+    new_event_logs = set(tracker.add_event_logs(event_logs))
+    for path in new_event_logs:
+        watcher.add(path)
+
+    return new_event_logs
+
+
+def save_checkpoint(tracker, path):
+    """Write a checkpoint, returning a list of messages describing what went wrong."""
+    try:
+        tracker.save_checkpoint(path)
+    except (OSError, IOError) as e:
+        return ["WARNING: could not write checkpoint {}. Reason: {}".format(path, e)]
+    return []
+
+
+class PhaseTimer(object):
+    """
+    Adds up the time spent in each phase of an update (querying the schedd,
+    reading events, applying them, building rows and rendering) and how many
+    times each phase ran.
+    """
+
+    def __init__(self):
+        self.seconds = collections.defaultdict(float)
+        self.calls = collections.defaultdict(int)
+
+    def add(self, phase, seconds):
+        self.seconds[phase] += seconds
+        self.calls[phase] += 1
+
+    def time(self, phase):
+        return TimedPhase(self, phase)
+
+
+class TimedPhase(object):
+    def __init__(self, timer, phase):
+        self.timer = timer
+        self.phase = phase
+
+    def __enter__(self):
+        self.started_at = time.time()
+
+    def __exit__(self, *exc_info):
+        self.timer.add(self.phase, time.time() - self.started_at)
+
+
+# the phases, in the order they are reported
+PHASES = ("query", "read", "apply", "aggregate", "render")
+
+
+def resident_memory():
+    """How many bytes of memory this process is using, or None if we can't tell."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * mmap.PAGESIZE
+    except (OSError, IOError, ValueError, IndexError):
+        pass
+
+    try:
+        import resource
+    except ImportError:  # not on Windows
+        return None
+
+    # the peak, not the current size; kilobytes on Linux, but bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+class StatsCollector(object):
+    """
+    Reports where the time went since the last sample: seconds spent in each
+    phase, events read per second from each event log, parse errors, how far
+    behind each event log is, and memory use.
+    """
+
+    def __init__(self, tracker, started_at=None):
+        self.tracker = tracker
+        self._sampled_at = time.time() if started_at is None else started_at
+        self._seconds = {}
+        self._events_read = {}
+
+    def sample(self):
+        """Call it while holding the tracker's lock."""
+        now = time.time()
+        elapsed = max(now - self._sampled_at, 1e-6)
+        self._sampled_at = now
+
+        tracker = self.tracker
+        phases = {}
+        for phase, seconds in list(tracker.timer.seconds.items()):
+            phases[phase] = round(seconds - self._seconds.get(phase, 0), 6)
+            self._seconds[phase] = seconds
+
+        unread = tracker.unread_bytes()
+        event_logs = []
+        for path, reader in sorted(tracker.event_readers.items()):
+            events = max(0, reader.events_read - self._events_read.get(path, 0))
+            self._events_read[path] = reader.events_read
+            event_logs.append(
+                {
+                    "path": path,
+                    "events_read": reader.events_read,
+                    "events_per_second": round(events / elapsed, 1),
+                    "parse_errors": reader.parse_errors,
+                    "unread_bytes": unread.get(path),
+                    "caught_up": path not in tracker.behind,
+                }
+            )
+
+        return {
+            "interval": round(elapsed, 3),
+            "phases": phases,
+            "event_logs": event_logs,
+            "rss_bytes": resident_memory(),
+        }
+
+
+class LoopProfiler(object):
+    """
+    Profiles the main loop, and the threads that call check() in their own
+    loops, for a number of updates, then writes the combined cProfile data to
+    a file that pstats can read.
+    """
+
+    # how long to wait for the other threads to stop profiling themselves
+    STOP_TIMEOUT = 5
+
+    def __init__(self, path, iterations):
+        self.path = path
+        self.iterations = iterations
+        self.done = False
+
+        self.updates = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # (profile, set once the profile is disabled) for each thread
+        self._profiles = []
+
+    def check(self):
+        """
+        Call at the start of each pass of a profiled loop, from the thread
+        that runs it. Starts profiling that thread, or stops once done.
+        """
+        if self.done:
+            self.stop_thread()
+            return
+
+        if getattr(self._local, "profile", None) is None:
+            import cProfile
+
+            profile = cProfile.Profile()
+            self._local.profile = profile
+            self._local.stopped = threading.Event()
+            with self._lock:
+                self._profiles.append((profile, self._local.stopped))
+            profile.enable()
+
+    def stop_thread(self):
+        """Stop profiling the calling thread, if it is being profiled."""
+        stopped = getattr(self._local, "stopped", None)
+        if stopped is not None and not stopped.is_set():
+            self._local.profile.disable()
+            stopped.set()
+
+    def iteration_done(self):
+        """Call at the end of each pass of the main loop. Returns True once it is time to finish()."""
+        self.updates += 1
+        return not self.done and self.updates >= self.iterations
+
+    def finish(self):
+        """Stop profiling and write the profile. Returns a list of messages."""
+        if self.done:
+            return []
+        self.done = True
+        self.stop_thread()
+
+        import pstats
+
+        deadline = time.time() + self.STOP_TIMEOUT
+        with self._lock:
+            profiles = list(self._profiles)
+        finished = []
+        for profile, stopped in profiles:
+            if stopped.wait(max(0, deadline - time.time())):
+                finished.append(profile)
+
+        messages = []
+        if len(finished) < len(profiles):
+            messages.append(
+                "WARNING: {} thread(s) did not stop in time, so they are left out of the profile".format(
+                    len(profiles) - len(finished)
+                )
+            )
+        if len(finished) == 0:
+            return messages
+
+        try:
+            pstats.Stats(*finished).dump_stats(self.path)
+        except (OSError, IOError) as e:
+            messages.append(
+                "WARNING: could not write profile {}. Reason: {}".format(self.path, e)
+            )
+        else:
+            messages.append(
+                "Wrote a profile of {} updates to {}".format(self.updates, self.path)
+            )
+        return messages
+
+
+class TerminalRenderer(object):
+    """
+    Redraws a multi-line frame in place, remembering the previous frame so
+    that only the lines that changed are rewritten (and, when possible, only
+    the part of each line after the first changed character).
+    Each frame is sent to the terminal in a single write.
+    get_size returns the terminal's (columns, lines).
+    """
+
+    def __init__(self, stream=None, get_size=None):
+        self.stream = sys.stdout if stream is None else stream
+        self.get_size = get_terminal_size if get_size is None else get_size
+
+        self._lines = None
+        self._columns = None
+        self._height = None
+
+    def draw(self, frame):
+        lines = frame.splitlines()
+        columns, height = self.get_size()
+
+        if self._lines is None:
+            out = [frame, "\n"]
+        elif (
+            columns != self._columns
+            or wraps(self._lines, columns)
+            or wraps(lines, columns)
+        ):
+            # line wrapping makes it impossible to tell which screen line
+            # each line of the frame is on, so start over
+            out = [self._erase(), frame, "\n"]
+        elif (
+            height != self._height or len(self._lines) >= height or len(lines) >= height
+        ):
+            # the cursor can't be moved up to lines that have scrolled off
+            # the top of the screen, so they can't be rewritten in place
+            out = [self._erase(), frame, "\n"]
+        else:
+            out = self._diff(self._lines, lines)
+
+        self.stream.write("".join(out))
+        self.stream.flush()
+
+        self._lines = lines
+        self._columns = columns
+        self._height = height
+
+    def clear(self):
+        """Erase the current frame; the next frame is drawn in full."""
+        if self._lines is not None:
+            self.stream.write(self._erase())
+            self.stream.flush()
+
+        self._lines = None
+
+    def _erase(self):
+        rows = sum(screen_rows(line, self._columns) for line in self._lines)
+        return "\033[{}A\r\033[J".format(rows) if rows > 0 else "\r\033[J"
+
+    def _diff(self, old_lines, new_lines):
+        out = []
+        if len(old_lines) > 0:
+            out.append("\033[{}A\r".format(len(old_lines)))
+
+        skipped = 0
+        for index, line in enumerate(new_lines):
+            old = old_lines[index] if index < len(old_lines) else None
+            if line == old:
+                skipped += 1
+                continue
+
+            if skipped > 0:
+                out.append("\033[{}B".format(skipped))
+                skipped = 0
+
+            start = 0
+            if old is not None:
+                start = common_prefix_length(old, line)
+                skip = "\033[{}C".format(start)
+                # the prefix may have set colors that the rest of the line relies on,
+                # and skipping a short prefix costs more than rewriting it
+                if "\033" in line[:start] or len(skip) >= start:
+                    start = 0
+                else:
+                    out.append(skip)
+
+            out.append(line[start:])
+            out.append("\033[K\r\n")
+
+        if skipped > 0:
+            out.append("\033[{}B".format(skipped))
+
+        # the new frame is shorter; erase what is left of the old one
+        if len(new_lines) < len(old_lines):
+            out.append("\033[J")
+
+        return out
+
+
+def get_terminal_size():
+    import shutil
+
+    try:
+        size = shutil.get_terminal_size((80, 20))
+    except AttributeError:  # Python 2 is missing shutil.get_terminal_size
+        return 80, 20
+    return size.columns, size.lines
+
+
+def get_terminal_columns():
+    return get_terminal_size()[0]
+
+
+def screen_rows(line, columns):
+    """The number of terminal rows that a line takes up, accounting for wrapping."""
+    length = len(strip_ansi(line))
+    return max(1, (length + columns - 1) // columns)
+
+
+def wraps(lines, columns):
+    return any(screen_rows(line, columns) > 1 for line in lines)
+
+
+def common_prefix_length(a, b):
+    n = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        n += 1
+    return n
+
+
+PROJECTION = ["ClusterId", "UserLog", "JobBatchName", "Iwd"]
+
+
+def find_job_event_logs(
+    users=None,
+    cluster_ids=None,
+    files=None,
+    batches=None,
+    collector=None,
+    schedd=None,
+    stats=None,
+):
+    return JobDiscovery(
+        users=users,
+        cluster_ids=cluster_ids,
+        files=files,
+        batches=batches,
+        collector=collector,
+        schedd=schedd,
+        stats=stats,
+    ).discover()
+
+
+class JobDiscovery(object):
+    """
+    Asks the schedd which event logs the jobs we want to track write to, and
+    can later ask again about only the clusters submitted since then.
+    The schedd is located once, and the handle is reused for every query.
+    """
+
+    def __init__(
+        self,
+        users=None,
+        cluster_ids=None,
+        files=None,
+        batches=None,
+        collector=None,
+        schedd=None,
+        stats=None,
+    ):
+        self.users = users or []
+        self.cluster_ids = cluster_ids or []
+        self.files = files or []
+        self.batches = batches or []
+
+        self.collector = collector
+        self.schedd_name = schedd
+        self._schedd = None
+
+        # counts of the ads and bytes fetched from the schedd
+        self.stats = {} if stats is None else stats
+
+        self._constraint = None
+
+        self.max_cluster_id = 0
+        self._warned_missing_log = set()
+
+    @property
+    def schedd(self):
+        if self._schedd is None:
+            self._schedd = get_schedd(collector=self.collector, schedd=self.schedd_name)
+        return self._schedd
+
+    @property
+    def constraint(self):
+        # built when the schedd is first asked, so that watching only event
+        # logs never imports the bindings
+        if self._constraint is None:
+            import classad
+
+            self._constraint = " || ".join(
+                itertools.chain(
+                    ("Owner == {}".format(classad.quote(u)) for u in self.users),
+                    ("ClusterId == {}".format(cid) for cid in self.cluster_ids),
+                    ("JobBatchName == {}".format(b) for b in self.batches),
+                )
+            )
+        return self._constraint
+
+    @property
+    def only_cluster_ids(self):
+        """
+        The clusters that were asked for, if jobs were picked out only by
+        cluster id; otherwise None, because every cluster in the event logs
+        may be wanted.
+        """
+        if len(self.cluster_ids) == 0 or self.users or self.files or self.batches:
+            return None
+        try:
+            return frozenset(int(cluster_id) for cluster_id in self.cluster_ids)
+        except ValueError:
+            return None
+
+    @property
+    def can_find_new_jobs(self):
+        # clusters picked out by id can't be newly submitted
+        return len(self.users) > 0 or len(self.batches) > 0
+
+    def discover(self):
+        # without users, clusters or batches, there is nothing to ask the schedd
+        if self.users or self.cluster_ids or self.batches:
+            ads = query_cluster_ads(self.schedd, self.constraint, stats=self.stats)
+        else:
+            ads = []
+
+        cluster_ids, event_logs, batch_names = self._collect(ads)
+
+        for file in self.files:
+            event_logs.add(os.path.abspath(file))
+
+        return cluster_ids, event_logs, batch_names
+
+    def discover_new(self):
+        """
+        Find the clusters (and their event logs) that were submitted since the
+        last discovery, i.e., that have larger cluster ids than any seen so far.
+        """
+        if not self.can_find_new_jobs:
+            return set(), set(), {}
+
+        constraint = "({}) && ClusterId > {}".format(
+            self.constraint, self.max_cluster_id
+        )
+        try:
+            return self._collect(
+                query_cluster_ads(self.schedd, constraint, stats=self.stats)
+            )
+        except Exception:
+            # the schedd may have moved; locate it again next time
+            self._schedd = None
+            raise
+
+    def _collect(self, ads):
+        cluster_ids = set()
+        event_logs = set()
+        batch_names = {}
+        clusters_with_logs = set()
+        for ad in ads:
+            cluster_id = ad["ClusterId"]
+            cluster_ids.add(cluster_id)
+            batch_names[cluster_id] = ad.get("JobBatchName")
+
+            try:
+                log_path = ad["UserLog"]
+            except KeyError:
+                continue
+
+            # if the path is not absolute, try to make it absolute using the
+            # job's initial working directory
+            if not os.path.isabs(log_path):
+                log_path = os.path.abspath(os.path.join(ad["Iwd"], log_path))
+
+            event_logs.add(log_path)
+            clusters_with_logs.add(cluster_id)
+
+        for cluster_id in sorted(cluster_ids - clusters_with_logs):
+            if cluster_id in self._warned_missing_log:
+                continue
+            print(
+                "WARNING: cluster {} does not have a job event log file (set log=<path> in the submit description)".format(
+                    cluster_id
+                ),
+                file=sys.stderr,
+            )
+            self._warned_missing_log.add(cluster_id)
+
+        if len(cluster_ids) > 0:
+            self.max_cluster_id = max(self.max_cluster_id, max(cluster_ids))
+
+        return cluster_ids, event_logs, batch_names
+
+
+def query_cluster_ads(schedd, constraint, stats=None):
+    """
+    Stream ads for the jobs that match the constraint, fetching as few ads as
+    possible while still yielding at least one ad for every cluster and for
+    every event log that any job writes to.
+
+    We first ask for one ad per cluster: the cluster ad, if the bindings can
+    ask for it, or the ad of the first job in each cluster. Then we ask only
+    for the jobs that the first query said nothing about: those in clusters
+    we haven't seen (e.g., because their first job already left the queue)
+    or with an event log we haven't seen (e.g., log = $(Process).log).
+
+    If stats is a dict, the number of ads and (approximate) bytes fetched are
+    added to its "ads" and "bytes" entries.
+    """
+    import classad
+    import htcondor
+
+    if stats is None:
+        stats = {}
+    stats.setdefault("ads", 0)
+    stats.setdefault("bytes", 0)
+
+    include_cluster_ads = getattr(
+        getattr(htcondor, "QueryOpts", None), "IncludeClusterAd", None
+    )
+    if include_cluster_ads is not None:
+        # cluster ads are the ones that don't belong to a particular job
+        first_constraint = "({}) && (ProcId =?= undefined || ProcId < 0)".format(
+            constraint
+        )
+        rest_constraint = "({}) && ProcId >= 0".format(constraint)
+    else:
+        first_constraint = "({}) && ProcId == 0".format(constraint)
+        rest_constraint = "({}) && ProcId > 0".format(constraint)
+
+    seen_cluster_ids = set()
+    seen_logs = set()
+
+    for ad in stream_query(schedd, first_constraint, opts=include_cluster_ads):
+        stats["ads"] += 1
+        stats["bytes"] += len(str(ad))
+
+        seen_cluster_ids.add(ad["ClusterId"])
+        if "UserLog" in ad:
+            seen_logs.add(ad["UserLog"])
+
+        yield ad
+
+    if len(seen_cluster_ids) > 0:
+        rest_constraint += (
+            " && !(member(ClusterId, {{{}}}) && member(UserLog, {{{}}}))".format(
+                ", ".join(str(cluster_id) for cluster_id in sorted(seen_cluster_ids)),
+                ", ".join(classad.quote(log) for log in sorted(seen_logs)),
+            )
+        )
+
+    for ad in stream_query(schedd, rest_constraint):
+        stats["ads"] += 1
+        stats["bytes"] += len(str(ad))
+
+        yield ad
+
+
+def stream_query(schedd, constraint, opts=None):
+    """Query the schedd, streaming the results if the bindings allow it."""
+    kwargs = {} if opts is None else {"opts": opts}
+
+    try:
+        query = schedd.xquery
+    except AttributeError:  # newer bindings have no xquery
+        query = schedd.query
+
+    return query(constraint, PROJECTION, **kwargs)
+
+
+def get_schedd(collector=None, schedd=None):
+    import htcondor
+
+    if collector is None and schedd is None:
+        schedd = htcondor.Schedd()
+    else:
+        coll = htcondor.Collector(collector)
+        schedd_ad = coll.locate(htcondor.DaemonTypes.Schedd, schedd)
+        schedd = htcondor.Schedd(schedd_ad)
+
+    return schedd
+
+
+def make_event_log_watcher(paths, poll_interval=0.5, sweep_interval=10.0):
+    """
+    Watch the given event logs for changes, using inotify if it is available
+    and falling back to polling the files with stat otherwise. With inotify,
+    every file is also checked with stat every sweep_interval seconds.
+    """
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(
+                paths, poll_interval=poll_interval, sweep_interval=sweep_interval
+            )
+        except (OSError, AttributeError):
+            pass
+
+    return StatPollWatcher(paths, poll_interval=poll_interval)
+
+
+class StatPollWatcher(object):
+    def __init__(self, paths, poll_interval=0.5):
+        self.poll_interval = poll_interval
+        self._stats = {}
+
+        for path in paths:
+            self.add(path)
+
+    def add(self, path):
+        self._stats[path] = self._stat(path)
+
+    def remove(self, path):
+        self._stats.pop(path, None)
+
+    def __len__(self):
+        return len(self._stats)
+
+    @staticmethod
+    def _stat(path):
+        try:
+            s = os.stat(path)
+        except OSError:
+            return None
+        return s.st_ino, s.st_size, s.st_mtime
+
+    def check(self):
+        changed = set()
+        for path, old in self._stats.items():
+            new = self._stat(path)
+            if new != old:
+                self._stats[path] = new
+                changed.add(path)
+
+        return changed
+
+    def wait(self, timeout):
+        """Wait up to timeout seconds for watched files to change, and return the ones that did."""
+        deadline = time.time() + timeout
+        while True:
+            changed = self.check()
+            remaining = deadline - time.time()
+            if len(changed) > 0 or remaining <= 0:
+                return changed
+            time.sleep(min(self.poll_interval, remaining))
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher(object):
+    """
+    Watches files with inotify. inotify misses writes made on other hosts to
+    files on network filesystems, and drops events when its queue overflows
+    (in which case every file is reported as changed), so every watched file
+    is also checked with stat every sweep_interval seconds.
+    """
+
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_IGNORED = 0x00008000
+    IN_Q_OVERFLOW = 0x00004000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_DELETE_SELF | IN_MOVE_SELF
+    GONE_MASK = IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED
+
+    EVENT_HEADER = struct.Struct("iIII")
+
+    def __init__(self, paths, poll_interval=0.5, sweep_interval=10.0):
+        import ctypes
+        import ctypes.util
+
+        self._ctypes = ctypes
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+
+        self._fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+        self._watch_descriptor_to_paths = collections.defaultdict(set)
+
+        # files that we can't watch (because they don't exist right now, or
+        # because we ran out of inotify watches) are polled instead
+        self._polled = StatPollWatcher([], poll_interval=poll_interval)
+
+        # every file, for the sweeps that catch what inotify missed
+        self._swept = StatPollWatcher([])
+        self.sweep_interval = sweep_interval
+        self._next_sweep = time.time() + sweep_interval
+
+        for path in paths:
+            self.add(path)
+
+    def add(self, path):
+        self._swept.add(path)
+        if not self._watch(path):
+            self._polled.add(path)
+
+    def _watch(self, path):
+        encoded_path = path
+        if not isinstance(encoded_path, bytes):
+            encoded_path = encoded_path.encode(sys.getfilesystemencoding())
+
+        wd = self._libc.inotify_add_watch(self._fd, encoded_path, self.WATCH_MASK)
+        if wd < 0:
+            return False
+
+        self._watch_descriptor_to_paths[wd].add(path)
+        return True
+
+    def remove(self, path):
+        self._swept.remove(path)
+        self._polled.remove(path)
+
+        for wd, paths in list(self._watch_descriptor_to_paths.items()):
+            paths.discard(path)
+            # the same file may still be watched under another path
+            if len(paths) == 0:
+                del self._watch_descriptor_to_paths[wd]
+                self._libc.inotify_rm_watch(self._fd, wd)
+
+    def _read_events(self):
+        changed = set()
+
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except OSError:  # EAGAIN, nothing to read
+            return changed
+
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, name_length = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size + name_length
+
+            # events were dropped, so any of the files may have changed
+            if mask & self.IN_Q_OVERFLOW:
+                for paths in self._watch_descriptor_to_paths.values():
+                    changed.update(paths)
+                continue
+
+            paths = self._watch_descriptor_to_paths.get(wd, ())
+            changed.update(paths)
+
+            # the file was moved or deleted, so poll its path until it comes back
+            if mask & self.GONE_MASK:
+                # the kernel only removes the watch itself once the file is
+                # deleted, and a moved file would otherwise keep its watch
+                if mask & self.IN_MOVE_SELF and wd in self._watch_descriptor_to_paths:
+                    self._libc.inotify_rm_watch(self._fd, wd)
+                for path in self._watch_descriptor_to_paths.pop(wd, ()):
+                    self._polled.add(path)
+
+        return changed
+
+    def wait(self, timeout):
+        """Wait up to timeout seconds for watched files to change, and return the ones that did."""
+        deadline = time.time() + timeout
+        while True:
+            polled_changes = self._polled.check()
+            for path in polled_changes:
+                if self._watch(path):
+                    self._polled.remove(path)
+
+            changed = polled_changes | self._read_events()
+            for path in changed:
+                self._swept.add(path)
+
+            now = time.time()
+            if now >= self._next_sweep:
+                changed |= self._swept.check()
+                self._next_sweep = now + self.sweep_interval
+
+            remaining = deadline - now
+            if len(changed) > 0 or remaining <= 0:
+                return changed
+
+            if len(self._polled) > 0:
+                remaining = min(remaining, self._polled.poll_interval)
+            remaining = min(remaining, self._next_sweep - now)
+            select.select([self._fd], [], [], remaining)
+
+    def close(self):
+        os.close(self._fd)
+
+
+class Cluster(object):
+    """
+    The jobs of a single cluster. Job states are stored as one-byte codes in a
+    bytearray indexed by proc id; proc ids far past the end of the array
+    (i.e., unusually sparse proc numbering) go into a dict instead.
+    A cluster whose jobs have all finished can be compacted into runs of
+    consecutive proc ids in the same state, which is usually a single run.
+    Changing the state of a job expands it again.
+    """
+
+    __slots__ = (
+        "cluster_id",
+        "event_log_path",
+        "_batch_name",
+        "_states",
+        "_sparse",
+        "_runs",
+        "num_active",
+    )
+
+    # matches a run of identical bytes
+    RUN_RE = re.compile(b"(.)\\1*", re.DOTALL)
+
+    def __init__(self, cluster_id, event_log_path, batch_name):
+        self.cluster_id = cluster_id
+        self.event_log_path = event_log_path
+        self._batch_name = batch_name
+
+        self._states = bytearray()
+        self._sparse = None
+
+        # (first proc id, number of jobs, code) for each run, while compacted
+        self._runs = None
+
+        # the number of jobs in ACTIVE_STATES; kept up to date by the tracker
+        self.num_active = 0
+
+    @property
+    def batch_name(self):
+        return self._batch_name or "ID: {}".format(self.cluster_id)
+
+    @property
+    def job_to_state(self):
+        return dict(self.items())
+
+    @classmethod
+    def from_runs(cls, cluster_id, event_log_path, batch_name, runs):
+        """Make a compacted cluster from the runs of another one."""
+        cluster = cls(cluster_id, event_log_path, batch_name)
+        cluster._runs = tuple(runs)
+        return cluster
+
+    @property
+    def is_compacted(self):
+        return self._runs is not None
+
+    @property
+    def runs(self):
+        """(first proc id, number of jobs, code) for each run, or None if not compacted."""
+        return self._runs
+
+    def compact(self):
+        states = self._states
+        runs = [
+            (match.start(), match.end() - match.start(), states[match.start()])
+            for match in self.RUN_RE.finditer(states)
+            if states[match.start()] != 0
+        ]
+        if self._sparse is not None:
+            runs.extend(
+                (proc_id, 1, self._sparse[proc_id]) for proc_id in sorted(self._sparse)
+            )
+
+        self._runs = tuple(runs)
+        self._states = bytearray()
+        self._sparse = None
+
+    def _expand(self):
+        runs = self._runs
+        self._runs = None
+
+        states = self._states
+        for first, length, code in runs:
+            size = len(states)
+            if first <= 2 * size + 64:
+                states.extend(bytearray(first - size))
+                states.extend(bytearray((code,)) * length)
+            else:
+                if self._sparse is None:
+                    self._sparse = {}
+                for proc_id in range(first, first + length):
+                    self._sparse[proc_id] = code
+
+    def __setitem__(self, key, value):
+        if self._runs is not None:
+            self._expand()
+
+        code = JOB_STATUS_TO_CODE[value]
+        states = self._states
+        size = len(states)
+
+        if 0 <= key < size:
+            states[key] = code
+        elif size <= key <= 2 * size + 64:
+            states.extend(bytearray(key + 1 - size))
+            if self._sparse is not None:
+                self._absorb_sparse()
+            states[key] = code
+        else:
+            if self._sparse is None:
+                self._sparse = {}
+            self._sparse[key] = code
+
+    def _absorb_sparse(self):
+        states = self._states
+        size = len(states)
+        for proc_id in [p for p in self._sparse if 0 <= p < size]:
+            states[proc_id] = self._sparse.pop(proc_id)
+        if not self._sparse:
+            self._sparse = None
+
+    def __getitem__(self, item):
+        status = self.get(item)
+        if status is None:
+            raise KeyError(item)
+        return status
+
+    def get(self, item, default=None):
+        if self._runs is not None:
+            for first, length, code in self._runs:
+                if first <= item < first + length:
+                    return CODE_TO_JOB_STATUS[code]
+            return default
+
+        if 0 <= item < len(self._states):
+            code = self._states[item]
+        elif self._sparse is not None:
+            code = self._sparse.get(item, 0)
+        else:
+            code = 0
+
+        if code == 0:
+            return default
+        return CODE_TO_JOB_STATUS[code]
+
+    def __contains__(self, item):
+        return self.get(item) is not None
+
+    def __len__(self):
+        if self._runs is not None:
+            return sum(length for _, length, _ in self._runs)
+
+        # Python 2's bytearray.count only takes bytes
+        num_jobs = len(self._states) - self._states.count(b"\0")
+        if self._sparse is not None:
+            num_jobs += len(self._sparse)
+        return num_jobs
+
+    def status_counts(self):
+        """Return a dict of the number of jobs in each state."""
+        counts = collections.defaultdict(int)
+        if self._runs is not None:
+            for _, length, code in self._runs:
+                counts[CODE_TO_JOB_STATUS[code]] += length
+            return counts
+
+        for code in range(1, len(CODE_TO_JOB_STATUS)):
+            count = self._states.count(bytearray((code,)))
+            if count > 0:
+                counts[CODE_TO_JOB_STATUS[code]] = count
+
+        if self._sparse is not None:
+            for code in self._sparse.values():
+                counts[CODE_TO_JOB_STATUS[code]] += 1
+
+        return counts
+
+    def state_codes(self):
+        """Return the (proc_id, code) pairs of the jobs in the cluster."""
+        if self._runs is not None:
+            for first, length, code in self._runs:
+                for proc_id in range(first, first + length):
+                    yield proc_id, code
+            return
+
+        for proc_id, code in enumerate(self._states):
+            if code != 0:
+                yield proc_id, code
+
+        if self._sparse is not None:
+            for proc_id, code in self._sparse.items():
+                yield proc_id, code
+
+    def items(self):
+        if self._runs is not None:
+            for proc_id, code in self.state_codes():
+                yield proc_id, CODE_TO_JOB_STATUS[code]
+            return
+
+        for proc_id, code in enumerate(self._states):
+            if code != 0:
+                yield proc_id, CODE_TO_JOB_STATUS[code]
+
+        if self._sparse is not None:
+            for proc_id in sorted(self._sparse):
+                yield proc_id, CODE_TO_JOB_STATUS[self._sparse[proc_id]]
+
+    def __iter__(self):
+        return iter(self.items())
+
+
+class Group(object):
+    """
+    The clusters that share a value of the tracker's group-by attribute,
+    with per-state job counts that the tracker keeps up to date.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.clusters = {}
+        self.counts = {js: 0 for js in JobStatus}
+        self.total = 0
+
+        # groups are displayed in order of the smallest cluster id they contain
+        self.sort_key = None
+
+        # the cached row for this group; reset whenever the counts change
+        self.row = None
+
+        # heaps of the (cluster_id, proc_id) of jobs that became active, with
+        # the ids negated in the second one so that its top is the largest;
+        # jobs that are no longer active are only dropped when they reach the top
+        self._lowest_active = []
+        self._highest_active = []
+
+    def add_cluster(self, cluster):
+        self.clusters[cluster.cluster_id] = cluster
+        self.row = None
+
+        if self.sort_key is None or cluster.cluster_id < self.sort_key:
+            self.sort_key = cluster.cluster_id
+            return True
+
+        return False
+
+    def remove_cluster(self, cluster):
+        del self.clusters[cluster.cluster_id]
+        self.row = None
+
+        old_sort_key = self.sort_key
+        self.sort_key = min(self.clusters) if len(self.clusters) > 0 else None
+        return self.sort_key != old_sort_key
+
+    @property
+    def num_active(self):
+        return sum(self.counts[js] for js in ACTIVE_STATES)
+
+    def activate(self, cluster_id, proc_id):
+        """Note that a job in this group has just become active."""
+        heapq.heappush(self._lowest_active, (cluster_id, proc_id))
+        heapq.heappush(self._highest_active, (-cluster_id, -proc_id))
+
+        # don't let jobs that finished long ago pile up in the heaps
+        if len(self._lowest_active) > 2 * self.num_active + 64:
+            active = [job for job in set(self._lowest_active) if self._is_active(*job)]
+            self._lowest_active = active
+            self._highest_active = [(-c, -p) for c, p in active]
+            heapq.heapify(self._lowest_active)
+            heapq.heapify(self._highest_active)
+
+    def _is_active(self, cluster_id, proc_id):
+        cluster = self.clusters.get(cluster_id)
+        return cluster is not None and cluster.get(proc_id) in ACTIVE_STATES
+
+    def active_job_range(self):
+        """
+        Return the numerically smallest and largest (cluster_id, proc_id) of
+        the active jobs in this group, or None if none of them are active.
+        """
+        lowest = self._lowest_active
+        while len(lowest) > 0 and not self._is_active(*lowest[0]):
+            heapq.heappop(lowest)
+
+        highest = self._highest_active
+        while len(highest) > 0 and not self._is_active(-highest[0][0], -highest[0][1]):
+            heapq.heappop(highest)
+
+        if len(lowest) == 0:
+            return None
+
+        return lowest[0], (-highest[0][0], -highest[0][1])
+
+
+def share_of(deadline, num_shares):
+    """Split the time left until deadline into equal shares, and return when the first one ends."""
+    now = time.time()
+    return now + max(0, deadline - now) / num_shares
+
+
+def file_id(path):
+    """The (device, inode) of the file at the given path, or None if there isn't one."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_dev, st.st_ino
+
+
+def note_cluster_ids(cluster_ids, transitions, first):
+    """Add the cluster ids of transitions[first:] to cluster_ids, unless it is None."""
+    if cluster_ids is not None:
+        cluster_ids.update(transitions[i][0] for i in range(first, len(transitions)))
+
+
+def note_truncation(reader, messages, num_transitions):
+    """
+    Record that a reader found its event log truncated after the first
+    num_transitions of the transitions it is about to return, which were read
+    from the file as it was before.
+    """
+    messages.append(
+        "WARNING: event log {} was truncated, so it will be read again from the beginning".format(
+            reader.path
+        )
+    )
+    reader.truncations.append((num_transitions, reader.cluster_ids))
+    reader.cluster_ids = set()
+
+
+class EventLogReader(object):
+    """
+    Reads the job state transitions described by the events in one event log.
+    When the end of the event log is reached, the reader checks whether the
+    path now names a different file (the event log was rotated), in which
+    case it carries on from the start of the new file, or whether the file
+    got smaller (it was truncated), in which case it starts over.
+    Given only_cluster_ids, the events of other clusters are skipped, so that
+    an event log shared with many other clusters costs little to follow.
+    """
+
+    # how many events are read between looking at the clock
+    DEADLINE_CHECK_INTERVAL = 64
+
+    def __init__(self, path, state=None, only_cluster_ids=None):
+        import htcondor
 
-        if getattr(args, self.dest, None) is None:
-            setattr(args, self.dest, [])
+        self.path = path
 
-        getattr(args, self.dest).append((grouper, status, exit_code))
+        # if not None, the events of any other clusters are skipped
+        self.only_cluster_ids = only_cluster_ids
 
+        if state is None:
+            self._event_log = htcondor.JobEventLog(path)
+        else:
+            self._event_log = load_event_log_state(state)
+        self._events = self._event_log.events(0)
+
+        # the file being read, and how big it was when we last reached its end
+        self._file_id = file_id(path)
+        self._size = 0
+
+        # whether the last read reached the end of the event log
+        self.caught_up = False
+
+        # a (number of transitions, cluster ids) pair for each time the last
+        # read found that the event log had been truncated: the jobs in those
+        # clusters (or all of the jobs from the event log, if it is None)
+        # should be forgotten after applying that many of the transitions
+        self.truncations = []
+
+        # the clusters read from the current file, or None if that isn't known
+        # because reading resumed from a saved state
+        self.cluster_ids = set() if state is None else None
+
+        # running counts for metrics; events that couldn't be parsed count as read
+        self.events_read = 0
+        self.parse_errors = 0
+
+    def position(self):
+        """The number of bytes read so far, or None if it isn't known."""
+        return None
+
+    def get_state(self):
+        """
+        Return an opaque description of how far into the event log this reader
+        has read, which can be passed back in to resume reading from there, or
+        None if the reader can't be resumed. It is text, so that it can be
+        saved as JSON.
+        """
+        import base64
+        import pickle
 
-class NegateAction(argparse.Action):
-    def __call__(self, parser, args, values, option_string=None):
-        setattr(args, self.dest, option_string.rstrip("-").startswith("no"))
+        try:
+            state = pickle.dumps(self._event_log, protocol=2)
+        except Exception:
+            return None
+        return base64.b64encode(state).decode("ascii")
+
+    def read(self, max_events=None, deadline=None):
+        """
+        Read all of the events that have been written since the last read,
+        or only the next max_events of them, stopping early once the time
+        is past deadline (if given).
+        Returns a list of (cluster_id, proc_id, new_status) transitions, in the
+        order they appear in the event log, and a list of error messages.
+        """
+        transitions = []
+        messages = []
 
+        num_events = 0
+        self.caught_up = False
+        self.truncations = []
 
-def cli():
-    args = parse_args()
+        only_cluster_ids = self.only_cluster_ids
 
-    if args.debug:
-        print("Enabling HTCondor debug output...", file=sys.stderr)
-        htcondor.enable_debug()
+        # the index of the first transition read from the current file
+        first = 0
+        while True:
+            if num_events == max_events:
+                break
+            if (
+                deadline is not None
+                and num_events % self.DEADLINE_CHECK_INTERVAL == 0
+                and num_events > 0
+                and time.time() >= deadline
+            ):
+                break
+            num_events += 1
 
-    return watch_q(
-        users=args.users,
-        cluster_ids=args.clusters,
-        event_logs=args.files,
-        batches=args.batches,
-        collector=args.collector,
-        schedd=args.schedd,
-        exit_conditions=args.exit,
-        group_by=args.groupby,
-        table=args.table,
-        progress_bar=args.progress,
-        summary=args.summary,
-        summary_type=args.summary_type,
-        updated_at=args.updated_at,
-        color=args.color,
-        refresh=args.refresh,
-        abbreviate_path_components=args.abbreviate,
-    )
+            try:
+                event = next(self._events)
+            except StopIteration:
+                note_cluster_ids(self.cluster_ids, transitions, first)
+                first = len(transitions)
+                if self._reopen_if_replaced(messages, len(transitions)):
+                    continue
+                self.caught_up = True
+                break
+            except Exception as e:
+                self.events_read += 1
+                self.parse_errors += 1
+                messages.append(
+                    "ERROR: failed to parse event from {}. Reason: {}".format(
+                        self.path, e
+                    )
+                )
+                continue
 
+            self.events_read += 1
+            # event types are an int enum, so they look up their numbers
+            new_status = JOB_EVENT_STATUS_TRANSITIONS.get(event.type, None)
+            if new_status is None:
+                continue
+            if only_cluster_ids is not None and event.cluster not in only_cluster_ids:
+                continue
 
-EXIT_GROUPERS = {"all": all, "any": any, "none": lambda _: not any(_)}
-EXIT_JOB_STATUS_CHECK = {
-    "active": lambda s: s in ACTIVE_STATES,
-    "done": lambda s: s is JobStatus.COMPLETED,
-    "idle": lambda s: s is JobStatus.IDLE,
-    "held": lambda s: s is JobStatus.HELD,
-}
+            transitions.append((event.cluster, event.proc, new_status))
 
+        note_cluster_ids(self.cluster_ids, transitions, first)
 
-TOTAL = "TOTAL"
-ACTIVE_JOBS = "JOB_IDS"
-EVENT_LOG = "LOG"
-CLUSTER_ID = "CLUSTER"
-BATCH_NAME = "BATCH"
+        return transitions, messages
 
+    def _reopen_if_replaced(self, messages, num_transitions):
+        """
+        Called at the end of the file being read, after num_transitions
+        transitions were read. If the event log was rotated or truncated,
+        start reading it again from the beginning and return True.
+        """
+        import htcondor
 
-# attribute is the Python attribute name of the Cluster object
-# key is the key in the events and job rows
-GROUPBY_ATTRIBUTE_TO_AD_KEY = {
-    "event_log_path": EVENT_LOG,
-    "cluster_id": CLUSTER_ID,
-    "batch_name": BATCH_NAME,
-}
-GROUPBY_AD_KEY_TO_ATTRIBUTE = {v: k for k, v in GROUPBY_ATTRIBUTE_TO_AD_KEY.items()}
+        try:
+            st = os.stat(self.path)
+        except OSError:  # rotated, but the new file isn't there yet
+            return False
+
+        # opening anything else (like a FIFO) could block
+        if not stat.S_ISREG(st.st_mode):
+            return False
+
+        rotated = (st.st_dev, st.st_ino) != self._file_id
+        if not rotated and st.st_size >= self._size:
+            self._size = st.st_size
+            return False
+
+        if not rotated:
+            note_truncation(self, messages, num_transitions)
+
+        self._event_log.close()
+        self._event_log = htcondor.JobEventLog(self.path)
+        self._events = self._event_log.events(0)
+        self._file_id = (st.st_dev, st.st_ino)
+        self._size = 0
+        self.cluster_ids = set()
+
+        return True
+
+    def close(self):
+        self._event_log.close()
+
+
+def load_event_log_state(state):
+    """
+    Make the htcondor.JobEventLog saved by EventLogReader.get_state. Only the
+    HTCondor bindings' own classes may be named in the saved pickle, so that
+    a checkpoint can't be made to run anything else.
+    """
+    import base64
+    import io
+    import pickle
+
+    class Unpickler(pickle.Unpickler):
+        def find_class(self, module, name):
+            if module.split(".")[0] not in ("htcondor", "classad"):
+                raise pickle.UnpicklingError(
+                    "{}.{} is not part of the HTCondor bindings".format(module, name)
+                )
+            return pickle.Unpickler.find_class(self, module, name)
 
+    return Unpickler(io.BytesIO(base64.b64decode(state))).load()
 
-def watch_q(
-    users=None,
-    cluster_ids=None,
-    event_logs=None,
-    batches=None,
-    collector=None,
-    schedd=None,
-    exit_conditions=None,
-    group_by="batch_name",
-    table=True,
-    progress_bar=True,
-    summary=True,
-    summary_type="totals",
-    updated_at=True,
-    color=True,
-    refresh=True,
-    abbreviate_path_components=False,
-):
-    if users is None and cluster_ids is None and event_logs is None and batches is None:
-        users = [getpass.getuser()]
-    if exit_conditions is None:
-        exit_conditions = []
 
-    key = GROUPBY_ATTRIBUTE_TO_AD_KEY[group_by]
+class ScanningEventLogReader(object):
+    """
+    Reads the job state transitions described by the events in one event log,
+    like EventLogReader, but without the HTCondor bindings' full event parser.
+    It memory-maps the event log, parses only the header line of each event
+    (which holds the event type and job id), and skips to the "..." line that
+    ends the event. Only the default (text) event log format is supported.
+    """
 
-    row_fmt = (lambda s, r: colorize(s, determine_row_color(r))) if color else None
+    EVENT_SEPARATOR = b"\n...\n"
+    EVENT_HEADER_RE = re.compile(b"(\\d+) \\((\\d+)\\.(\\d+)\\.\\d+\\)")
 
-    cluster_ids, event_logs, batch_names = find_job_event_logs(
-        users, cluster_ids, event_logs, batches, collector=collector, schedd=schedd
-    )
-    if cluster_ids is not None and len(cluster_ids) == 0:
-        print("No jobs found")
-        sys.exit(0)
+    # how much of the start of the file is remembered to recognize it later
+    HEAD_SIZE = 256
 
-    tracker = JobStateTracker(event_logs, batch_names)
+    # as for EventLogReader; scanning an event is much quicker than parsing it
+    DEADLINE_CHECK_INTERVAL = 4096
 
-    exit_checks = []
-    for grouper, checker, exit_code in exit_conditions:
-        disp = "{} {}".format(grouper, checker)
-        exit_grouper = EXIT_GROUPERS[grouper.lower()]
-        exit_check = EXIT_JOB_STATUS_CHECK[checker.lower()]
-        exit_checks.append((exit_grouper, exit_check, exit_code, disp))
+    def __init__(self, path, state=None, only_cluster_ids=None):
+        self.path = path
+        self.only_cluster_ids = only_cluster_ids
+        # unbuffered, so that checking for truncation never sees stale data
+        self._file = open(path, "rb", 0)
 
-    try:
-        msg = None
+        # the byte offset of the start of the next unread event
+        self.offset = state or 0
+        self._head = None
 
-        while True:
-            with display_temporary_message("Reading new events...", enabled=refresh):
-                processing_messages = tracker.process_events()
+        self.caught_up = False
 
-            if msg is not None and refresh:
-                prev_lines = list(msg.splitlines())
-                prev_len_lines = [len(line) for line in prev_lines]
+        # as for EventLogReader
+        self.truncations = []
+        self.cluster_ids = set() if state is None else None
 
-                move = "\033[{}A\r".format(len(prev_len_lines))
-                clear = "\n".join(" " * len(line) for line in prev_lines) + "\n"
-                sys.stdout.write(move + clear + move)
-                sys.stdout.flush()
+        self.events_read = 0
+        self.parse_errors = 0
 
-            now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    def position(self):
+        return self.offset
 
-            if len(processing_messages) > 0:
-                print(
-                    "\n".join("{} | {}".format(now, m) for m in processing_messages),
-                    file=sys.stderr,
-                )
+    def get_state(self):
+        return self.offset
 
-            groups_by_key = group_clusters_by_key(tracker.clusters, key)
-            rows_by_key, totals = make_rows_from_groups(groups_by_key, key)
+    def read(self, max_events=None, deadline=None):
+        """
+        Like EventLogReader.read. The open file keeps being read after the
+        event log is rotated, until its last event; then the new file at the
+        event log's path is opened and read from the beginning. If the file
+        got smaller, or the bytes before the next unread event aren't the end
+        of an event anymore, the file was truncated (and maybe rewritten), so
+        it is read again from the beginning.
+        """
+        transitions = []
+        messages = []
 
-            headers, rows_by_key = strip_empty_columns(rows_by_key)
+        self.truncations = []
+        if self._is_truncated():
+            note_truncation(self, messages, 0)
+            self.offset = 0
+            self._head = None
+
+        num_events = self._scan(transitions, messages, max_events, deadline)
+        while self.caught_up and self._reopen_if_rotated():
+            if (max_events is not None and num_events == max_events) or (
+                deadline is not None and time.time() >= deadline
+            ):
+                self.caught_up = False
+                break
+            remaining = None if max_events is None else max_events - num_events
+            num_events += self._scan(transitions, messages, remaining, deadline)
 
-            # strip out 0 values
-            rows_by_key = {
-                key: {k: v for k, v in row.items() if v != 0}
-                for key, row in rows_by_key.items()
-            }
+        return transitions, messages
 
-            if key == EVENT_LOG and abbreviate_path_components:
-                for row in rows_by_key.values():
-                    row[key] = abbreviate_path(row[key])
+    def _is_truncated(self):
+        if self.offset == 0:
+            return False
 
-            rows_by_key = sorted(
-                rows_by_key.items(),
-                key=lambda key_row: min(
-                    cluster.cluster_id for cluster in groups_by_key[key_row[0]]
-                ),
-            )
+        if os.fstat(self._file.fileno()).st_size < self.offset:
+            return True
 
-            try:
-                width = shutil.get_terminal_size((80, 20)).columns - 1
-            except AttributeError:  # Python 2 is missing shutil.get_terminal_size
-                width = 79
-            width = min(width, 79)
-
-            msg = []
-
-            if table:
-                msg += make_table(
-                    headers=[key] + headers,
-                    rows=[row for _, row in rows_by_key],
-                    row_fmt=row_fmt,
-                    alignment=TABLE_ALIGNMENT,
-                    fill="-",
-                )
-                msg += [""]
+        separator = self.EVENT_SEPARATOR
+        self._file.seek(self.offset - len(separator))
+        if self._file.read(len(separator)) != separator:
+            return True
 
-            if progress_bar:
-                msg += make_progress_bar(totals=totals, width=width, color=color)
-                msg += [""]
+        # a rewritten file is very unlikely to start with the same event
+        self._file.seek(0)
+        if self._head is None:
+            self._head = self._file.read(min(self.offset, self.HEAD_SIZE))
+            return False
+        return self._file.read(len(self._head)) != self._head
 
-            if summary:
-                if summary_type == "totals":
-                    msg += make_summary_with_totals(totals, width=width)
-                elif summary_type == "percentages":
-                    msg += make_summary_with_percentages(totals, width=width)
-                msg += [""]
+    def _reopen_if_rotated(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:  # rotated, but the new file isn't there yet
+            return False
 
-            if updated_at:
-                msg += ["Updated at {}".format(now)] + [""]
+        if not stat.S_ISREG(st.st_mode):  # as for EventLogReader
+            return False
 
-            # msg[:-1] because we need to strip the last blank section delimiter line off
-            msg = "\n".join(msg[:-1])
+        old_st = os.fstat(self._file.fileno())
+        if (st.st_dev, st.st_ino) == (old_st.st_dev, old_st.st_ino):
+            return False
 
-            if not refresh:
-                msg += "\n..."
+        try:
+            new_file = open(self.path, "rb", 0)
+        except (OSError, IOError):
+            return False
+
+        self._file.close()
+        self._file = new_file
+        self.offset = 0
+        self._head = None
+        self.cluster_ids = set()
+        return True
+
+    def _scan(self, transitions, messages, max_events, deadline=None):
+        """Read events from the open file into transitions, and return how many were read."""
+        size = os.fstat(self._file.fileno()).st_size
+        if size <= self.offset:
+            self.caught_up = True
+            return 0
+
+        self.caught_up = False
+        num_events = 0
+        first = len(transitions)
+
+        separator = self.EVENT_SEPARATOR
+        match_header = self.EVENT_HEADER_RE.match
+        status_transitions = JOB_EVENT_STATUS_TRANSITIONS
+        only_cluster_ids = self.only_cluster_ids
+        check_interval = self.DEADLINE_CHECK_INTERVAL
+
+        contents = mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ)
+        try:
+            position = self.offset
+            while num_events != max_events:
+                if (
+                    deadline is not None
+                    and num_events % check_interval == 0
+                    and num_events > 0
+                    and time.time() >= deadline
+                ):
+                    break
 
-            print(msg)
+                end = contents.find(separator, position)
+                if end < 0:  # the next event hasn't been completely written yet
+                    self.caught_up = True
+                    break
+                num_events += 1
 
-            for grouper, checker, exit_code, disp in exit_checks:
-                if grouper((checker(s) for s in tracker.job_states)):
-                    print(
-                        'Exiting with code {} because of condition "{}" at {}'.format(
-                            exit_code, disp, now
+                header = match_header(contents, position, end)
+                if header is None:
+                    self.parse_errors += 1
+                    messages.append(
+                        "ERROR: failed to parse event from {} at byte {}".format(
+                            self.path, position
                         )
                     )
-                    sys.exit(exit_code)
+                else:
+                    new_status = status_transitions.get(int(header.group(1)))
+                    if new_status is not None:
+                        cluster_id = int(header.group(2))
+                        if only_cluster_ids is None or cluster_id in only_cluster_ids:
+                            transitions.append(
+                                (cluster_id, int(header.group(3)), new_status)
+                            )
 
-            time.sleep(2)
-    except KeyboardInterrupt:
-        sys.exit(0)
+                position = end + len(separator)
 
+            if self.offset == 0 and position > 0:
+                self._head = contents[: min(position, self.HEAD_SIZE)]
+        finally:
+            contents.close()
 
-@contextlib.contextmanager
-def display_temporary_message(msg, enabled=True):
-    """Display a single-line message until the context ends."""
-    if enabled:
-        print(msg, end="")
-        sys.stdout.flush()
+        self.events_read += num_events
+        self.offset = position
+        note_cluster_ids(self.cluster_ids, transitions, first)
 
-        yield
+        return num_events
 
-        print("\r{}\r".format(" " * len(msg)), end="")
-        sys.stdout.flush()
-    else:
-        yield
+    def close(self):
+        self._file.close()
 
 
-PROJECTION = ["ClusterId", "Owner", "UserLog", "JobBatchName", "Iwd"]
+EVENT_LOG_READERS = {"htcondor": EventLogReader, "scan": ScanningEventLogReader}
 
 
-def find_job_event_logs(
-    users=None, cluster_ids=None, files=None, batches=None, collector=None, schedd=None
-):
-    if users is None:
-        users = []
-    if cluster_ids is None:
-        cluster_ids = []
-    if files is None:
-        files = []
-    if batches is None:
-        batches = []
-
-    constraint = " || ".join(
-        itertools.chain(
-            ("Owner == {}".format(classad.quote(u)) for u in users),
-            ("ClusterId == {}".format(cid) for cid in cluster_ids),
-            ("JobBatchName == {}".format(b) for b in batches),
-        )
-    )
-    if constraint != "":
-        ads = get_schedd(collector=collector, schedd=schedd).query(
-            constraint, PROJECTION
+class JobStateTracker:
+    # finished clusters with fewer jobs than this are smaller as they are
+    COMPACT_MIN_JOBS = 64
+
+    def __init__(
+        self,
+        event_log_paths,
+        batch_names,
+        group_by="batch_name",
+        read_workers=1,
+        reader="htcondor",
+        max_clusters=None,
+        only_cluster_ids=None,
+    ):
+        self.reader = reader
+        self.reader_class = EVENT_LOG_READERS[reader]
+
+        # if not None, only these clusters are tracked; the readers skip the
+        # events of any others in the event logs
+        self.only_cluster_ids = (
+            frozenset(only_cluster_ids) if only_cluster_ids is not None else None
         )
-    else:
-        ads = []
 
-    cluster_ids = set()
-    event_logs = set()
-    batch_names = {}
-    already_warned_missing_log = set()
-    for ad in ads:
-        cluster_id = ad["ClusterId"]
-        cluster_ids.add(cluster_id)
-        batch_names[cluster_id] = ad.get("JobBatchName")
+        # held while changing the job states, so that another thread can take
+        # a consistent look at them
+        self.lock = threading.Lock()
 
-        try:
-            log_path = ad["UserLog"]
-        except KeyError:
-            if cluster_id not in already_warned_missing_log:
+        # the event logs that had more events to read after the last pass
+        self.behind = set()
+        # which event log goes first on the next time-limited pass
+        self._turn = 0
+
+        self.event_readers = {}
+        self.add_event_logs(event_log_paths)
+
+        # with more than one worker, event logs are read concurrently
+        self.read_workers = read_workers
+        self._executor = None
+
+        self.batch_names = batch_names
+
+        self.cluster_id_to_cluster = {}
+
+        self.group_by = group_by
+        self.key = GROUPBY_ATTRIBUTE_TO_AD_KEY[group_by]
+        self._group_getter = operator.attrgetter(group_by)
+        self.groups = {}
+        self.cluster_id_to_group = {}
+        self._sorted_groups = None
+
+        self.totals = collections.defaultdict(int)
+
+        # clusters whose jobs have all finished, least recently finished first;
+        # with max_clusters, these are evicted to stay under that many clusters
+        self.max_clusters = max_clusters
+        self._finished = collections.OrderedDict()
+        # clusters that became active again after finishing, which are left
+        # expanded (until they are evicted), since their jobs tend to keep
+        # finishing one at a time, and compacting each time would be quadratic
+        self._reactivated = set()
+        # cluster id -> (event log path, runs) for each evicted cluster, so that
+        # it can be tracked again if one of its jobs shows up after all
+        self._evicted = {}
+
+        # the number of groups that have at least one job in each state,
+        # which tells us which columns need to be displayed
+        self.column_counts = collections.defaultdict(int)
+
+        # incremented every time a job changes state
+        self.version = 0
+
+        # how long reading and applying events takes, among other things
+        self.timer = PhaseTimer()
+
+        # told whenever the counts of a group change; see add_group_listener
+        self.group_listeners = []
+        # told whenever a job changes state; see add_job_listener
+        self.job_listeners = []
+
+    def add_event_logs(self, event_log_paths):
+        """Start reading more event logs. Returns the ones that were not already being read."""
+        added = []
+        for event_log_path in event_log_paths:
+            if event_log_path in self.event_readers:
+                continue
+
+            try:
+                reader = self.reader_class(
+                    event_log_path, only_cluster_ids=self.only_cluster_ids
+                )
+            except (OSError, IOError) as e:
                 print(
-                    "WARNING: cluster {} does not have a job event log file (set log=<path> in the submit description)".format(
-                        cluster_id
+                    "WARNING: Could not open event log at {} for reading, so it will be ignored. Reason: {}".format(
+                        event_log_path, e
                     ),
                     file=sys.stderr,
                 )
-                already_warned_missing_log.add(cluster_id)
-            continue
+                continue
 
-        # if the path is not absolute, try to make it absolute using the
-        # job's initial working directory
-        if not os.path.isabs(log_path):
-            log_path = os.path.abspath(os.path.join(ad["Iwd"], log_path))
+            with self.lock:
+                self.event_readers[event_log_path] = reader
+            added.append(event_log_path)
 
-        event_logs.add(log_path)
+        return added
 
-    for file in files:
-        event_logs.add(os.path.abspath(file))
+    def add_batch_names(self, batch_names):
+        """
+        Learn the batch names of more clusters. Clusters that were already
+        being tracked under a different batch name are regrouped.
+        """
+        with self.lock:
+            for cluster_id, batch_name in batch_names.items():
+                self.batch_names[cluster_id] = batch_name
 
-    return cluster_ids, event_logs, batch_names
+                cluster = self.cluster_id_to_cluster.get(cluster_id)
+                if cluster is None or cluster._batch_name == batch_name:
+                    continue
 
+                self._ungroup_cluster(cluster)
+                cluster._batch_name = batch_name
+                self._group_cluster(cluster)
+
+    def add_group_listener(self, listener):
+        """
+        Call listener.group_changed(group) whenever the counts of a group
+        change (and right away for every existing group), and
+        listener.group_removed(group) when a group goes away.
+        """
+        with self.lock:
+            self.group_listeners.append(listener)
+            for group in self.groups.values():
+                listener.group_changed(group)
+
+    def add_job_listener(self, listener):
+        """
+        Call listener.job_changed(cluster_id, proc_id, group, old_status, new_status)
+        whenever a job changes state (new_status is None if the job was forgotten).
+        """
+        with self.lock:
+            self.job_listeners.append(listener)
+
+    def process_events(self, event_log_paths=None, max_events=None, max_seconds=None):
+        """
+        Read new events from the given event logs (by default, all of them)
+        and apply the job state transitions they describe. If max_events is
+        given, read at most that many events from each event log. If
+        max_seconds is given, stop reading after about that long, sharing the
+        time between the event logs: each gets an equal share of what is
+        left when its turn comes, and each pass starts with a different
+        event log, so a large backlog in one of them doesn't hold up the
+        others. The event logs that have more to read are left in the behind
+        set, to be read on the next pass.
+        """
+        messages = []
 
-def get_schedd(collector=None, schedd=None):
-    if collector is None and schedd is None:
-        schedd = htcondor.Schedd()
-    else:
-        coll = htcondor.Collector(collector)
-        schedd_ad = coll.locate(htcondor.DaemonTypes.Schedd, schedd)
-        schedd = htcondor.Schedd(schedd_ad)
+        if event_log_paths is None:
+            event_log_paths = self.event_readers.keys()
+
+        readers = [
+            self.event_readers[path]
+            for path in sorted(event_log_paths)
+            if path in self.event_readers
+        ]
+
+        deadline = None
+        if max_seconds is not None and len(readers) > 0:
+            deadline = time.time() + max_seconds
+            turn = self._turn % len(readers)
+            readers = readers[turn:] + readers[:turn]
+            self._turn += 1
+
+        # the logs may be read in any order, but the transitions from each log
+        # are always applied in the order they were written
+        results = iter(self._read_all(readers, max_events, deadline))
+        for reader in readers:
+            read_at = time.time()
+            transitions, read_messages = next(results)
+            self.timer.add("read", time.time() - read_at)
+
+            messages.extend(read_messages)
+            with self.lock:
+                applied_at = time.time()
+
+                # the transitions read before a truncation was found are
+                # applied before their jobs are forgotten
+                start = 0
+                for end, cluster_ids in reader.truncations:
+                    self._apply_transitions(reader.path, transitions[start:end])
+                    self.forget_event_log(reader.path, cluster_ids)
+                    start = end
+                if start > 0:
+                    transitions = transitions[start:]
+                self._apply_transitions(reader.path, transitions)
+
+                if reader.caught_up:
+                    self.behind.discard(reader.path)
+                else:
+                    self.behind.add(reader.path)
+
+                self.timer.add("apply", time.time() - applied_at)
 
-    return schedd
+        return messages
 
+    def _apply_transitions(self, event_log_path, transitions):
+        for cluster_id, proc_id, new_status in transitions:
+            self.apply_transition(event_log_path, cluster_id, proc_id, new_status)
 
-class Cluster:
-    def __init__(self, cluster_id, event_log_path, batch_name):
-        self.cluster_id = cluster_id
-        self.event_log_path = event_log_path
-        self._batch_name = batch_name
+    def _read_all(self, readers, max_events=None, deadline=None):
+        kwargs = {}
+        if max_events is not None:
+            kwargs["max_events"] = max_events
 
-        self.job_to_state = {}
+        if self.read_workers <= 1 or len(readers) <= 1:
+            if deadline is None:
+                return (reader.read(**kwargs) for reader in readers)
 
-    @property
-    def batch_name(self):
-        return self._batch_name or "ID: {}".format(self.cluster_id)
+            # one after another, each gets its share of the time that's left
+            return (
+                reader.read(deadline=share_of(deadline, len(readers) - i), **kwargs)
+                for i, reader in enumerate(readers)
+            )
 
-    def __setitem__(self, key, value):
-        self.job_to_state[key] = value
+        if self._executor is None:
+            try:
+                from concurrent.futures import ThreadPoolExecutor
+            except ImportError:  # Python 2 without the futures backport
+                self.read_workers = 1
+                return self._read_all(readers, max_events, deadline)
+
+            self._executor = ThreadPoolExecutor(max_workers=self.read_workers)
+
+        # read at the same time, they all get the whole time
+        if deadline is not None:
+            kwargs["deadline"] = deadline
+        return self._executor.map(operator.methodcaller("read", **kwargs), readers)
+
+    def progress(self):
+        """
+        For each event log that has more events to read, return its path, how
+        many bytes of it have been read (None if the reader can't tell), and
+        its size.
+        """
+        progress = []
+        for path in sorted(self.behind):
+            try:
+                size = os.stat(path).st_size
+            except OSError:
+                continue
+            progress.append((path, self.event_readers[path].position(), size))
+
+        return progress
+
+    def unread_bytes(self):
+        """
+        Return {path: bytes not read yet} for the event logs whose readers can
+        tell how far into the event log they are.
+        """
+        unread = {}
+        for path, reader in self.event_readers.items():
+            position = reader.position()
+            if position is None:
+                continue
+            try:
+                size = os.stat(path).st_size
+            except OSError:
+                continue
+            unread[path] = max(0, size - position)
 
-    def __getitem__(self, item):
-        return self.job_to_state[item]
+        return unread
 
-    def items(self):
-        return self.job_to_state.items()
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
 
-    def __iter__(self):
-        return iter(self.items())
+        for reader in self.event_readers.values():
+            reader.close()
 
+    def save_checkpoint(self, path):
+        """
+        Atomically write the job states and the reading position in each event
+        log to a checkpoint file, so that a later tracker can resume from it.
+        The checkpoint is JSON, and only readable and writable by its owner.
+        """
+        import json
 
-class JobStateTracker:
-    def __init__(self, event_log_paths, batch_names):
-        event_readers = {}
-        for event_log_path in event_log_paths:
+        clusters_by_event_log = collections.defaultdict(list)
+        for cluster in self.clusters:
+            clusters_by_event_log[cluster.event_log_path].append(cluster)
+        evicted_by_event_log = collections.defaultdict(list)
+        for cluster_id, (event_log_path, runs) in self._evicted.items():
+            evicted_by_event_log[event_log_path].append((cluster_id, list(runs)))
+
+        event_logs = {}
+        for event_log_path, reader in self.event_readers.items():
+            reader_state = reader.get_state()
+            identity = event_log_identity(event_log_path)
+            if reader_state is None or identity is None:
+                continue
+
+            event_logs[event_log_path] = {
+                "identity": identity,
+                "reader_state": reader_state,
+                "clusters": [
+                    (cluster.cluster_id, list(cluster.state_codes()))
+                    for cluster in clusters_by_event_log[event_log_path]
+                ],
+                "evicted": evicted_by_event_log[event_log_path],
+            }
+
+        checkpoint = {
+            "version": CHECKPOINT_VERSION,
+            "reader": self.reader,
+            "only_cluster_ids": (
+                sorted(self.only_cluster_ids)
+                if self.only_cluster_ids is not None
+                else None
+            ),
+            "event_logs": event_logs,
+        }
+
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        fd = os.open(
+            tmp_path,
+            os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_NOFOLLOW", 0),
+            0o600,
+        )
+        # a file left behind at the same path keeps its mode
+        os.fchmod(fd, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(checkpoint, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp_path, path)
+
+    def load_checkpoint(self, path):
+        """
+        Resume reading each event log from the position recorded in the
+        checkpoint file, and restore the job states that had been read from it.
+        Event logs that were replaced or truncated since the checkpoint was
+        written are read from the beginning instead. A checkpoint that someone
+        else could have written is ignored.
+        Returns a list of messages describing what happened.
+        """
+        import json
+
+        try:
+            with open(path, "r") as f:
+                st = os.fstat(f.fileno())
+                if st.st_uid != os.getuid():
+                    problem = "is not owned by you"
+                elif st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+                    problem = "can be written by other users"
+                else:
+                    problem = None
+                    checkpoint = json.load(f)
+        except (OSError, IOError):
+            return []
+        except ValueError as e:
+            problem = "could not be read. Reason: {}".format(e)
+
+        if problem is None:
             try:
-                reader = htcondor.JobEventLog(event_log_path).events(0)
-                event_readers[event_log_path] = reader
-            except (OSError, IOError) as e:
-                print(
-                    "WARNING: Could not open event log at {} for reading, so it will be ignored. Reason: {}".format(
-                        event_log_path, e
-                    ),
-                    file=sys.stderr,
+                checkpoint = parse_checkpoint(checkpoint)
+            except (KeyError, IndexError, TypeError, ValueError) as e:
+                problem = "is malformed. Reason: {!r}".format(e)
+
+        if problem is not None:
+            return [
+                "WARNING: checkpoint {} {}, so it will be ignored".format(path, problem)
+            ]
+
+        if checkpoint.get("version") != CHECKPOINT_VERSION:
+            return [
+                "WARNING: checkpoint {} was written by an incompatible version of condor_watch_q, so it will be ignored".format(
+                    path
                 )
+            ]
 
-        self.event_readers = event_readers
-        self.state = collections.defaultdict(lambda: collections.defaultdict(dict))
+        if checkpoint["reader"] != self.reader:
+            return [
+                "Checkpoint {} was written with a different event log reader, so it will be ignored".format(
+                    path
+                )
+            ]
+
+        # the events of clusters that weren't tracked then were skipped
+        saved_cluster_ids = checkpoint["only_cluster_ids"]
+        if saved_cluster_ids is not None and (
+            self.only_cluster_ids is None
+            or not self.only_cluster_ids <= set(saved_cluster_ids)
+        ):
+            return [
+                "Checkpoint {} was written while tracking other clusters, so it will be ignored".format(
+                    path
+                )
+            ]
 
-        self.batch_names = batch_names
+        only_cluster_ids = self.only_cluster_ids
+        messages = []
+        for event_log_path, saved in checkpoint["event_logs"].items():
+            if event_log_path not in self.event_readers:
+                continue
 
-        self.cluster_id_to_cluster = {}
+            if not is_same_event_log(event_log_path, saved["identity"]):
+                messages.append(
+                    "Event log {} has changed since checkpoint {} was written, so it will be read from the beginning".format(
+                        event_log_path, path
+                    )
+                )
+                continue
 
-    def process_events(self):
-        messages = []
+            try:
+                reader = self.reader_class(
+                    event_log_path,
+                    state=saved["reader_state"],
+                    only_cluster_ids=only_cluster_ids,
+                )
+            except Exception as e:
+                messages.append(
+                    "WARNING: could not resume reading event log {} from checkpoint {}, so it will be read from the beginning. Reason: {}".format(
+                        event_log_path, path, e
+                    )
+                )
+                continue
 
-        for event_log_path, events in self.event_readers.items():
-            while True:
-                try:
-                    event = next(events)
-                except StopIteration:
-                    break
-                except Exception as e:
-                    messages.append(
-                        "ERROR: failed to parse event from {}. Reason: {}".format(
-                            event_log_path, e
-                        )
+            # the reader it replaces hasn't read anything yet, but has the file open
+            self.event_readers[event_log_path].close()
+            self.event_readers[event_log_path] = reader
+            for cluster_id, state_codes in saved["clusters"]:
+                if only_cluster_ids is not None and cluster_id not in only_cluster_ids:
+                    continue
+                for proc_id, code in state_codes:
+                    self.apply_transition(
+                        event_log_path, cluster_id, proc_id, CODE_TO_JOB_STATUS[code]
                     )
+            for cluster_id, runs in saved["evicted"]:
+                if only_cluster_ids is not None and cluster_id not in only_cluster_ids:
                     continue
+                self._load_evicted_cluster(event_log_path, cluster_id, runs)
 
-                new_status = JOB_EVENT_STATUS_TRANSITIONS.get(event.type, None)
-                if new_status is None:
-                    continue
+        return messages
 
-                cluster = self.cluster_id_to_cluster.setdefault(
-                    event.cluster,
-                    Cluster(
-                        cluster_id=event.cluster,
-                        event_log_path=event_log_path,
-                        batch_name=self.batch_names.get(event.cluster),
-                    ),
-                )
+    def apply_transition(self, event_log_path, cluster_id, proc_id, new_status):
+        """Move a job into a new state, keeping the group and global counters in sync."""
+        cluster = self.cluster_id_to_cluster.get(cluster_id)
+        if cluster is None:
+            if cluster_id in self._evicted:
+                cluster = self._restore_cluster(cluster_id)
+            else:
+                cluster = self._add_cluster(cluster_id, event_log_path)
 
-                cluster[event.proc] = new_status
+        old_status = cluster.get(proc_id)
+        if old_status is new_status:
+            return
 
-        return messages
+        cluster[proc_id] = new_status
+        self.version += 1
+
+        group = self.cluster_id_to_group[cluster_id]
+        group.row = None
+
+        if old_status is None:
+            group.total += 1
+            self.totals[TOTAL] += 1
+        else:
+            self._count(group, old_status, -1)
+        self._count(group, new_status, 1)
+
+        is_active = new_status in ACTIVE_STATES
+        if is_active != (old_status in ACTIVE_STATES):
+            if is_active:
+                group.activate(cluster_id, proc_id)
+                cluster.num_active += 1
+                if self._finished.pop(cluster_id, None) is not None:
+                    self._reactivated.add(cluster_id)
+            else:
+                cluster.num_active -= 1
+
+        for listener in self.group_listeners:
+            listener.group_changed(group)
+        for listener in self.job_listeners:
+            listener.job_changed(cluster_id, proc_id, group, old_status, new_status)
+
+        if not is_active and cluster.num_active == 0:
+            self._cluster_finished(cluster)
+
+    def _cluster_finished(self, cluster):
+        """Called when none of a cluster's jobs are active anymore."""
+        # late changes to the jobs of a finished cluster leave it expanded,
+        # so that a burst of them doesn't compact it over and over
+        if cluster.cluster_id in self._finished:
+            self._finished.pop(cluster.cluster_id)
+        elif (
+            cluster.cluster_id not in self._reactivated
+            and len(cluster) >= self.COMPACT_MIN_JOBS
+        ):
+            cluster.compact()
+
+        # finished clusters are evicted in the order they finished
+        self._finished[cluster.cluster_id] = cluster
+
+        if self.max_clusters is not None:
+            while (
+                len(self.cluster_id_to_cluster) > self.max_clusters
+                and len(self._finished) > 0
+            ):
+                self._evict_cluster(self._finished.popitem(last=False)[1])
+
+    def _evict_cluster(self, cluster):
+        """
+        Stop tracking a finished cluster, keeping only its runs. Its jobs
+        still count towards the totals, and towards the number of evicted jobs.
+        """
+        if not cluster.is_compacted:
+            cluster.compact()
+        counts = cluster.status_counts()
+        self._ungroup_cluster(cluster)
+        del self.cluster_id_to_cluster[cluster.cluster_id]
+        self._reactivated.discard(cluster.cluster_id)
+        self._evicted[cluster.cluster_id] = (cluster.event_log_path, cluster.runs)
+
+        for status, count in counts.items():
+            self.totals[status] += count
+        self.totals[EVICTED] += len(cluster)
+
+    def _restore_cluster(self, cluster_id):
+        """Track an evicted cluster again, and return it."""
+        event_log_path, runs = self._evicted.pop(cluster_id)
+        cluster = Cluster.from_runs(
+            cluster_id, event_log_path, self.batch_names.get(cluster_id), runs
+        )
+
+        # its jobs are counted in its group again, instead of as evicted
+        for status, count in cluster.status_counts().items():
+            self.totals[status] -= count
+        self.totals[EVICTED] -= len(cluster)
+
+        self.cluster_id_to_cluster[cluster_id] = cluster
+        self._group_cluster(cluster)
+        self._finished[cluster_id] = cluster
+
+        return cluster
+
+    def _load_evicted_cluster(self, event_log_path, cluster_id, runs):
+        """Count the jobs of a cluster that was evicted when a checkpoint was written."""
+        self._evicted[cluster_id] = (event_log_path, tuple(runs))
+        for _, length, code in runs:
+            self.totals[CODE_TO_JOB_STATUS[code]] += length
+            self.totals[EVICTED] += length
+            self.totals[TOTAL] += length
+        self.version += 1
+
+    def forget_event_log(self, event_log_path, cluster_ids=None):
+        """
+        Forget the jobs that were read from an event log (only the ones in the
+        given clusters, if cluster_ids isn't None), as if they had never been
+        seen. Job listeners are told that their new status is None.
+        Call it while holding the lock.
+        """
+        # evicted clusters are tracked again, so that they are forgotten like the rest
+        for cluster_id, (path, _) in list(self._evicted.items()):
+            if path == event_log_path and (
+                cluster_ids is None or cluster_id in cluster_ids
+            ):
+                self._restore_cluster(cluster_id)
+
+        forgotten = [
+            cluster
+            for cluster in self.clusters
+            if cluster.event_log_path == event_log_path
+            and (cluster_ids is None or cluster.cluster_id in cluster_ids)
+        ]
+
+        for cluster in forgotten:
+            group = self.cluster_id_to_group[cluster.cluster_id]
+            for proc_id, status in cluster:
+                self.version += 1
+                for listener in self.job_listeners:
+                    listener.job_changed(
+                        cluster.cluster_id, proc_id, group, status, None
+                    )
+
+            self.totals[TOTAL] -= len(cluster)
+            self._ungroup_cluster(cluster)
+            del self.cluster_id_to_cluster[cluster.cluster_id]
+            self._finished.pop(cluster.cluster_id, None)
+            self._reactivated.discard(cluster.cluster_id)
+
+    def _count(self, group, status, delta):
+        before = group.counts[status]
+        after = before + delta
+        group.counts[status] = after
+        self.totals[status] += delta
+
+        if before == 0 and after != 0:
+            self.column_counts[status] += 1
+        elif before != 0 and after == 0:
+            self.column_counts[status] -= 1
+
+    def _add_cluster(self, cluster_id, event_log_path):
+        cluster = Cluster(
+            cluster_id=cluster_id,
+            event_log_path=event_log_path,
+            batch_name=self.batch_names.get(cluster_id),
+        )
+        self.cluster_id_to_cluster[cluster_id] = cluster
+        self._group_cluster(cluster)
+
+        return cluster
+
+    def _group_cluster(self, cluster):
+        group_key = self._group_getter(cluster)
+        group = self.groups.get(group_key)
+        if group is None:
+            group = self.groups[group_key] = Group(group_key)
+        if group.add_cluster(cluster):
+            self._sorted_groups = None
+        self.cluster_id_to_group[cluster.cluster_id] = group
+
+        for status, count in cluster.status_counts().items():
+            group.total += count
+            self._count(group, status, count)
+
+        if cluster.num_active > 0:
+            for proc_id, status in cluster:
+                if status in ACTIVE_STATES:
+                    group.activate(cluster.cluster_id, proc_id)
+
+        for listener in self.group_listeners:
+            listener.group_changed(group)
+
+    def _ungroup_cluster(self, cluster):
+        group = self.cluster_id_to_group.pop(cluster.cluster_id)
+
+        for status, count in cluster.status_counts().items():
+            group.total -= count
+            self._count(group, status, -count)
+
+        if group.remove_cluster(cluster):
+            self._sorted_groups = None
+
+        if len(group.clusters) == 0:
+            del self.groups[group.key]
+            for listener in self.group_listeners:
+                listener.group_removed(group)
+        else:
+            for listener in self.group_listeners:
+                listener.group_changed(group)
 
     @property
     def clusters(self):
@@ -701,26 +5160,166 @@ class JobStateTracker:
             for job, state in cluster:
                 yield state
 
+    @property
+    def sorted_groups(self):
+        """The groups, ordered by the smallest cluster id in each."""
+        if self._sorted_groups is None:
+            self._sorted_groups = sorted(
+                self.groups.values(), key=operator.attrgetter("sort_key")
+            )
+        return self._sorted_groups
+
+    def headers_and_rows(self):
+        """
+        Return the headers that have something to display and one row per group.
+        Only the rows of groups that changed since the last call are rebuilt.
+        """
+        headers = [
+            h
+            for h in HEADERS
+            if h in ALWAYS_INCLUDE
+            or not isinstance(h, JobStatus)
+            or self.column_counts[h] > 0
+        ]
+
+        rows = []
+        for group in self.sorted_groups:
+            if group.row is None:
+                group.row = row_data_from_group(group, self.key)
+            rows.append(group.row)
+
+        return headers, rows
+
+
+CHECKPOINT_VERSION = 2
+
+# how much of the start of an event log is hashed to recognize it later
+EVENT_LOG_HEADER_SIZE = 4096
+
+
+def parse_checkpoint(checkpoint):
+    """
+    Check the structure of a checkpoint loaded from JSON, returning it with
+    its lists turned back into tuples where they were saved as tuples.
+    Raises KeyError, IndexError, TypeError or ValueError if it is malformed.
+    Checkpoints of other versions are returned as they are.
+    """
+    if not isinstance(checkpoint, dict):
+        raise TypeError("a checkpoint is a JSON object")
+    if checkpoint.get("version") != CHECKPOINT_VERSION:
+        return checkpoint
+
+    reader = checkpoint["reader"]
+    if reader not in EVENT_LOG_READERS:
+        raise ValueError("unknown event log reader {!r}".format(reader))
+
+    only_cluster_ids = checkpoint["only_cluster_ids"]
+    if only_cluster_ids is not None:
+        only_cluster_ids = [checked_int(i) for i in only_cluster_ids]
+
+    event_logs = {}
+    for path, saved in checkpoint["event_logs"].items():
+        identity = tuple(saved["identity"])
+        if len(identity) != 5 or not isinstance(identity[4], type(u"")):
+            raise ValueError("malformed identity {!r}".format(identity))
+        identity = tuple(checked_int(i) for i in identity[:4]) + identity[4:]
+
+        # see each reader's get_state
+        reader_state = saved["reader_state"]
+        if reader == "scan":
+            checked_int(reader_state)
+        elif not isinstance(reader_state, type(u"")):
+            raise TypeError("malformed reader state {!r}".format(reader_state))
+
+        event_logs[path] = {
+            "identity": identity,
+            "reader_state": reader_state,
+            "clusters": [
+                (
+                    checked_int(cluster_id),
+                    [
+                        (checked_int(proc_id), checked_code(code))
+                        for proc_id, code in state_codes
+                    ],
+                )
+                for cluster_id, state_codes in saved["clusters"]
+            ],
+            "evicted": [
+                (
+                    checked_int(cluster_id),
+                    tuple(
+                        (checked_int(first), checked_int(length), checked_code(code))
+                        for first, length, code in runs
+                    ),
+                )
+                for cluster_id, runs in saved["evicted"]
+            ],
+        }
+
+    return {
+        "version": CHECKPOINT_VERSION,
+        "reader": reader,
+        "only_cluster_ids": only_cluster_ids,
+        "event_logs": event_logs,
+    }
 
-def make_rows_from_groups(groups, key):
-    totals = collections.defaultdict(int)
-    rows = {}
 
-    for attribute_value, clusters in groups.items():
-        row_data = row_data_from_job_state(clusters)
+def checked_int(value):
+    """Return value if it is a non-negative integer, or raise TypeError or ValueError."""
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise TypeError("{!r} is not an integer".format(value))
+    if value < 0:
+        raise ValueError("{!r} is negative".format(value))
+    return value
 
-        totals[TOTAL] += row_data[TOTAL]
-        for status in JobStatus:
-            totals[status] += row_data[status]
 
-        if key == EVENT_LOG:
-            row_data[key] = normalize_path(attribute_value)
-        else:
-            row_data[key] = attribute_value
+def checked_code(value):
+    """Return value if it is the code of a JobStatus, or raise TypeError or ValueError."""
+    if not 0 < checked_int(value) < len(CODE_TO_JOB_STATUS):
+        raise ValueError("{!r} is not a job status code".format(value))
+    return value
+
+
+def event_log_identity(path, header_size=EVENT_LOG_HEADER_SIZE):
+    """
+    Return (device, inode, size, header size, header hash) for the event log at
+    the given path, or None if it can't be read.
+    """
+    import hashlib
+
+    try:
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            header = f.read(header_size)
+    except (OSError, IOError):
+        return None
+
+    return (
+        stat.st_dev,
+        stat.st_ino,
+        stat.st_size,
+        len(header),
+        hashlib.sha1(header).hexdigest(),
+    )
+
 
-        rows[attribute_value] = row_data
+def is_same_event_log(path, saved_identity):
+    """
+    Whether the event log at the given path is the same file, with (possibly)
+    more events appended, as it was when its identity was saved.
+    """
+    saved_dev, saved_ino, saved_size, saved_header_size, saved_hash = saved_identity
+    current_identity = event_log_identity(path, header_size=saved_header_size)
+    if current_identity is None:
+        return False
 
-    return rows, totals
+    dev, ino, size, header_size, hash = current_identity
+
+    return (
+        (dev, ino) == (saved_dev, saved_ino)
+        and size >= saved_size
+        and hash == saved_hash
+    )
 
 
 class Color(str, enum.Enum):
@@ -759,94 +5358,179 @@ def determine_row_color(row):
         return Color.BRIGHT_WHITE
 
 
-def group_clusters_by_key(clusters, key):
-    getter = operator.attrgetter(GROUPBY_AD_KEY_TO_ATTRIBUTE[key])
-
-    groups = collections.defaultdict(list)
-    for cluster in clusters:
-        groups[getter(cluster)].append(cluster)
-
-    return groups
-
-
-def strip_empty_columns(rows_by_key):
-    dont_include = set()
-    for h in HEADERS:
-        if all((row[h] == 0 for row in rows_by_key.values())):
-            dont_include.add(h)
-    dont_include -= ALWAYS_INCLUDE
-    headers = [h for h in HEADERS if h not in dont_include]
-    for row_data in dont_include:
-        for row in rows_by_key.values():
-            row.pop(row_data)
-
-    return headers, rows_by_key
+def row_data_from_group(group, key):
+    row_data = {js: count for js, count in group.counts.items() if count != 0}
+    row_data[TOTAL] = group.total
+    row_data[ACTIVE_JOBS] = format_active_job_ids(group)
 
+    if key == EVENT_LOG:
+        row_data[key] = normalize_path(group.key)
+    else:
+        row_data[key] = group.key
 
-def row_data_from_job_state(clusters):
-    row_data = {js: 0 for js in JobStatus}
-    active_job_ids = []
+    return row_data
 
-    for cluster in clusters:
-        for proc_id, job_state in cluster:
-            row_data[job_state] += 1
 
-            if job_state in ACTIVE_STATES:
-                active_job_ids.append("{}.{}".format(cluster.cluster_id, proc_id))
+def format_active_job_ids(group):
+    job_range = group.active_job_range()
+    if job_range is None:
+        return ""
 
-    row_data[TOTAL] = sum(row_data.values())
-    active_job_ids.sort(key=lambda jobid: jobid.split("."))
+    lowest, highest = ("{}.{}".format(*job_id) for job_id in job_range)
 
-    if len(active_job_ids) > 2:
-        active_job_ids = [active_job_ids[0], active_job_ids[-1]]
-        row_data[ACTIVE_JOBS] = " ... ".join(active_job_ids)
+    num_active = group.num_active
+    if num_active == 1:
+        return lowest
+    elif num_active == 2:
+        return ", ".join((lowest, highest))
     else:
-        row_data[ACTIVE_JOBS] = ", ".join(active_job_ids)
-
-    return row_data
+        return " ... ".join((lowest, highest))
 
 
 def normalize_path(path):
-    possibilities = []
+    return PATH_DISPLAY_CACHE.normalize(path)
 
-    abs = os.path.abspath(path)
-    home_dir = os.path.expanduser("~")
-    cwd = os.getcwd()
 
-    possibilities.append(abs)
+def abbreviate_path(path):
+    return PATH_DISPLAY_CACHE.abbreviate(path)
+
+
+class PathDisplayCache(object):
+    """
+    Remembers how event log paths are displayed, so that they aren't worked
+    out from scratch on every update.
+    Normalized paths are recomputed only when the working directory or home
+    directory changes. Abbreviations are recomputed only when the modification
+    time of one of the directories they were computed from changes, which is
+    checked at most once every recheck_interval seconds per directory.
+    """
+
+    def __init__(self, recheck_interval=1.0):
+        self.recheck_interval = recheck_interval
+
+        # path -> ((home_dir, cwd), normalized path)
+        self._normalized = {}
+        # path -> (abbreviated path, ((directory, mtime), ...))
+        self._abbreviated = {}
+        # directory -> (mtime, {entry name: shortest unique prefix})
+        self._prefixes = {}
+        # directory -> (mtime, when it was checked)
+        self._mtimes = {}
+
+    def normalize(self, path):
+        home_dir = os.path.expanduser("~")
+        cwd = os.getcwd()
+
+        cached = self._normalized.get(path)
+        if cached is not None and cached[0] == (home_dir, cwd):
+            return cached[1]
+
+        possibilities = []
+
+        abs = os.path.abspath(path)
+
+        possibilities.append(abs)
+
+        relative_to_user_home = os.path.relpath(path, home_dir)
+        possibilities.append(os.path.join("~", relative_to_user_home))
+
+        relative_to_cwd = os.path.relpath(path, cwd)
+        if not relative_to_cwd.startswith("../"):  # i.e, it is not *above* the cwd
+            possibilities.append(os.path.join(".", relative_to_cwd))
+
+        normalized = min(possibilities, key=len)
+        self._normalized[path] = ((home_dir, cwd), normalized)
+        return normalized
+
+    def abbreviate(self, path):
+        cached = self._abbreviated.get(path)
+        if cached is not None and all(
+            self._mtime(directory) == mtime for directory, mtime in cached[1]
+        ):
+            return cached[0]
+
+        abbreviated_components = []
+        dependencies = []
+        path_to_here = ""
+        components = split_all(path)
+        for component in components[:-1]:
+            path_to_here = os.path.expanduser(os.path.join(path_to_here, component))
+
+            if component in ("~", "."):
+                abbreviated_components.append(component)
+                continue
 
-    relative_to_user_home = os.path.relpath(path, home_dir)
-    possibilities.append(os.path.join("~", relative_to_user_home))
+            directory = os.path.dirname(path_to_here)
+            mtime = self._mtime(directory)
+            prefixes = self._prefixes_in(directory, mtime)
+            abbreviated_components.append(prefixes.get(component, component))
+            dependencies.append((directory, mtime))
 
-    relative_to_cwd = os.path.relpath(path, cwd)
-    if not relative_to_cwd.startswith("../"):  # i.e, it is not *above* the cwd
-        possibilities.append(os.path.join(".", relative_to_cwd))
+        abbreviated_components.append(components[-1])
 
-    return min(possibilities, key=len)
+        abbreviated = os.path.join(*abbreviated_components)
+        self._abbreviated[path] = (abbreviated, tuple(dependencies))
+        return abbreviated
 
+    def _mtime(self, directory):
+        now = time.time()
+        cached = self._mtimes.get(directory)
+        if cached is not None and now - cached[1] < self.recheck_interval:
+            return cached[0]
 
-def abbreviate_path(path):
-    abbreviated_components = []
-    path_to_here = ""
-    components = split_all(path)
-    for component in components[:-1]:
-        path_to_here = os.path.expanduser(os.path.join(path_to_here, component))
-
-        if component in ("~", "."):
-            abbreviated_components.append(component)
-            continue
+        try:
+            mtime = os.stat(directory).st_mtime
+        except OSError:
+            mtime = None
 
-        contents = os.listdir(os.path.dirname(path_to_here))
-        if len(contents) == 1:
-            longest_common = ""
-        else:
-            longest_common = os.path.commonprefix(contents)
+        self._mtimes[directory] = (mtime, now)
+        return mtime
 
-        abbreviated_components.append(component[: len(longest_common) + 1])
+    def _prefixes_in(self, directory, mtime):
+        cached = self._prefixes.get(directory)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
 
-    abbreviated_components.append(components[-1])
+        try:
+            prefixes = shortest_unique_prefixes(os.listdir(directory))
+        except OSError:
+            prefixes = {}
+
+        self._prefixes[directory] = (mtime, prefixes)
+        return prefixes
+
+
+PATH_DISPLAY_CACHE = PathDisplayCache()
+
+
+def shortest_unique_prefixes(names):
+    """
+    Map each name to the shortest prefix of it that no other name starts with
+    (or the whole name, if it is a prefix of another name).
+    """
+    # each trie node maps a character to [number of names below it, child node]
+    trie = {}
+    for name in names:
+        node = trie
+        for char in name:
+            entry = node.get(char)
+            if entry is None:
+                entry = node[char] = [0, {}]
+            entry[0] += 1
+            node = entry[1]
+
+    prefixes = {}
+    for name in names:
+        node = trie
+        for index, char in enumerate(name):
+            count, node = node[char]
+            if count == 1:
+                prefixes[name] = name[: index + 1]
+                break
+        else:
+            prefixes[name] = name
 
-    return os.path.join(*abbreviated_components)
+    return prefixes
 
 
 def split_all(path):
@@ -890,6 +5574,11 @@ class JobStatus(enum.Enum):
         )
 
 
+# job states are stored in clusters as these small integer codes;
+# code 0 means that there is no such job
+CODE_TO_JOB_STATUS = (None,) + tuple(JobStatus)
+JOB_STATUS_TO_CODE = {status: code for code, status in enumerate(JobStatus, start=1)}
+
 ACTIVE_STATES = {
     JobStatus.IDLE,
     JobStatus.RUNNING,
@@ -898,6 +5587,13 @@ ACTIVE_STATES = {
     JobStatus.SUSPENDED,
 }
 
+EXIT_JOB_STATUSES = {
+    "active": ACTIVE_STATES,
+    "done": {JobStatus.COMPLETED},
+    "idle": {JobStatus.IDLE},
+    "held": {JobStatus.HELD},
+}
+
 ALWAYS_INCLUDE = {
     JobStatus.IDLE,
     JobStatus.RUNNING,
@@ -918,18 +5614,20 @@ for k in JobStatus:
 
 HEADERS = list(JobStatus.ordered()) + [TOTAL, ACTIVE_JOBS]
 
+# keyed by event type number (the values of htcondor.JobEventType), so that
+# building this doesn't need the HTCondor bindings
 JOB_EVENT_STATUS_TRANSITIONS = {
-    htcondor.JobEventType.SUBMIT: JobStatus.IDLE,
-    htcondor.JobEventType.JOB_EVICTED: JobStatus.IDLE,
-    htcondor.JobEventType.JOB_UNSUSPENDED: JobStatus.IDLE,
-    htcondor.JobEventType.JOB_RELEASED: JobStatus.IDLE,
-    htcondor.JobEventType.SHADOW_EXCEPTION: JobStatus.IDLE,
-    htcondor.JobEventType.JOB_RECONNECT_FAILED: JobStatus.IDLE,
-    htcondor.JobEventType.JOB_TERMINATED: JobStatus.COMPLETED,
-    htcondor.JobEventType.EXECUTE: JobStatus.RUNNING,
-    htcondor.JobEventType.JOB_HELD: JobStatus.HELD,
-    htcondor.JobEventType.JOB_SUSPENDED: JobStatus.SUSPENDED,
-    htcondor.JobEventType.JOB_ABORTED: JobStatus.REMOVED,
+    0: JobStatus.IDLE,  # SUBMIT
+    4: JobStatus.IDLE,  # JOB_EVICTED
+    11: JobStatus.IDLE,  # JOB_UNSUSPENDED
+    13: JobStatus.IDLE,  # JOB_RELEASED
+    7: JobStatus.IDLE,  # SHADOW_EXCEPTION
+    24: JobStatus.IDLE,  # JOB_RECONNECT_FAILED
+    5: JobStatus.COMPLETED,  # JOB_TERMINATED
+    1: JobStatus.RUNNING,  # EXECUTE
+    12: JobStatus.HELD,  # JOB_HELD
+    10: JobStatus.SUSPENDED,  # JOB_SUSPENDED
+    9: JobStatus.REMOVED,  # JOB_ABORTED
 }
 
 
@@ -1045,6 +5743,9 @@ def make_summary_with_totals(totals, width=None):
                 if totals[status] > 0
             ),
         )
+        num_evicted = totals.get(EVICTED, 0)
+        if num_evicted > 0:
+            summary += "; {} {}".format(num_evicted, "evicted"[:strip])
 
         if width is None or len(summary) <= width or strip <= 2:
             break
@@ -1074,6 +5775,10 @@ def make_summary_with_percentages(totals, width=None):
             ),
         )
 
+    num_evicted = totals.get(EVICTED, 0)
+    if num_evicted > 0:
+        summary += "; {} evicted".format(num_evicted)
+
     return [summary]
 
 
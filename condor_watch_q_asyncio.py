@@ -0,0 +1,183 @@
+# Copyright 2019 HTCondor Team, Computer Sciences Department,
+# University of Wisconsin-Madison, WI.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+The coroutines behind condor_watch_q's asyncio engine (-engine asyncio) and
+Watcher's async iteration. condor_watch_q.py has to stay importable on
+Python 2, where they are a syntax error, so it only imports this module when
+they are used. The work they schedule is done by condor_watch_q.AsyncEngine
+and condor_watch_q.Watcher; nothing here imports condor_watch_q, so that it
+works the same whether condor_watch_q was imported or run as a script.
+"""
+
+import asyncio
+
+
+def run_engine(engine):
+    """Run an AsyncEngine's tasks until an exit condition is met, and return its exit code."""
+    loop = asyncio.new_event_loop()
+    main = loop.create_task(EngineTasks(engine, loop).main())
+    try:
+        return loop.run_until_complete(main)
+    finally:
+        if not main.done():  # interrupted
+            main.cancel()
+            try:
+                loop.run_until_complete(main)
+            except asyncio.CancelledError:
+                pass
+        loop.close()
+
+
+class EngineTasks(object):
+    """The tasks of one run of an AsyncEngine, and the queues between them."""
+
+    def __init__(self, engine, loop):
+        self.engine = engine
+        self.loop = loop
+
+    def run_in(self, executor, func, *args):
+        return self.loop.run_in_executor(executor, func, *args)
+
+    async def main(self):
+        engine = self.engine
+        loop = self.loop
+
+        self.updated = asyncio.Event()
+        self.discovered = asyncio.Queue(engine.QUEUE_SIZE)
+        queues = [asyncio.Queue(engine.QUEUE_SIZE) for _ in engine.sinks]
+
+        tasks = [loop.create_task(self.follow_event_logs())]
+        if engine.can_rediscover:
+            tasks.append(loop.create_task(self.rediscover()))
+        for sink, queue in zip(engine.sinks, queues):
+            tasks.append(loop.create_task(self.drain(sink, queue)))
+        tasks.append(loop.create_task(self.timer(queues)))
+
+        try:
+            # the timer returns when an exit condition is met; the others only
+            # finish if they fail
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            return done.pop().result()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def follow_event_logs(self):
+        engine = self.engine
+        ingester = engine.ingester
+
+        if engine.ingester_has_thread:
+            # pass on its updates
+            ingester.start()
+            while True:
+                await self.run_in(engine.ingest_executor, ingester.updated.wait, 0.5)
+                self.pass_on_update()
+
+        # on the first pass, read every event log
+        pending = set(engine.tracker.event_readers.keys())
+        while True:
+            # the ingester's thread isn't running, so this is the only place
+            # that touches the watcher
+            while not self.discovered.empty():
+                pending |= engine.track(self.discovered.get_nowait())
+
+            pending = await self.run_in(engine.ingest_executor, engine.step, pending)
+            self.pass_on_update()
+
+    def pass_on_update(self):
+        if self.engine.take_updated():
+            self.updated.set()
+
+    async def rediscover(self):
+        engine = self.engine
+        while True:
+            await asyncio.sleep(engine.rediscover_interval)
+            found = await self.run_in(engine.query_executor, engine.discover)
+            if found is not None:
+                await self.discovered.put(found)
+
+    async def drain(self, sink, queue):
+        while True:
+            now, messages, update = await queue.get()
+            try:
+                await self.run_in(
+                    self.engine.output_executor, sink.write, now, messages, update
+                )
+            finally:
+                queue.task_done()
+
+    async def put(self, queue, now, messages, update, lossy):
+        if lossy and queue.full():
+            # the messages that went with the dropped update still need showing
+            _, dropped_messages, _ = queue.get_nowait()
+            queue.task_done()
+            messages = dropped_messages + messages
+        await queue.put((now, messages, update))
+
+    async def timer(self, queues):
+        engine = self.engine
+        loop = self.loop
+
+        # give the first pass a chance to finish before the first update,
+        # so that small queues don't flash a partial table
+        await self.run_in(None, engine.wait_for_first_pass)
+
+        wait = engine.min_interval
+
+        while True:
+            update_started_at = loop.time()
+
+            now, messages, updates, exit_status = engine.take_update()
+            for sink, queue, update in zip(engine.sinks, queues, updates):
+                await self.put(queue, now, messages, update, sink.LOSSY)
+
+            if exit_status is not None:
+                for queue in queues:
+                    await queue.join()
+                await self.run_in(
+                    engine.output_executor, engine.report_exit, exit_status, now
+                )
+                return exit_status[1]
+
+            engine.update_done()
+
+            # don't update more often than the minimum interval, even if events
+            # are arriving continuously
+            await asyncio.sleep(
+                max(0, engine.min_interval - (loop.time() - update_started_at))
+            )
+
+            # back off while nothing is happening
+            try:
+                await asyncio.wait_for(self.updated.wait(), wait)
+                wait = engine.min_interval
+            except asyncio.TimeoutError:
+                wait = min(wait * 2, engine.max_interval)
+            self.updated.clear()
+
+
+async def iterate_updates(watcher, executor):
+    """Iterate over a Watcher's updates, like iterating over it, but with each poll run in executor."""
+    loop = asyncio.get_event_loop()
+    last = None
+    while not watcher.closed:
+        update = await loop.run_in_executor(
+            executor, watcher.poll, 0 if last is None else watcher.poll_interval
+        )
+        if watcher.is_news(update, last):
+            last = update
+            yield update
@@ -16,7 +16,7 @@ setup(
         "Operating System :: Microsoft :: Windows",
         "Operating System :: POSIX",
     ],
-    py_modules=["condor_watch_q"],
+    py_modules=["condor_watch_q", "condor_watch_q_asyncio"],
     entry_points={"console_scripts": ["condor_watch_q = condor_watch_q:cli"]},
     install_requires=["htcondor"],
 )
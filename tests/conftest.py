@@ -0,0 +1,5 @@
+import os
+import sys
+
+# condor_watch_q is a single module at the root of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,21 @@
+"""Event logs written by the tests."""
+
+
+def write_events(path, events, mode="a"):
+    with open(path, mode) as f:
+        for event_type, cluster_id, proc_id in events:
+            f.write(
+                "{:03d} ({}.{:03d}.000) 2020-01-01 00:00:00 x\n...\n".format(
+                    event_type, cluster_id, proc_id
+                )
+            )
+
+
+def finished_clusters(cluster_ids, num_procs):
+    """The events of clusters whose jobs were submitted and completed."""
+    return [
+        (event_type, cluster_id, proc_id)
+        for cluster_id in cluster_ids
+        for proc_id in range(num_procs)
+        for event_type in (0, 5)
+    ]
@@ -0,0 +1,74 @@
+import io
+import json
+import sys
+
+import pytest
+
+import condor_watch_q as cwq
+from helpers import finished_clusters, write_events
+
+pytestmark = pytest.mark.skipif(
+    sys.version_info < (3, 5), reason="the asyncio engine needs Python 3"
+)
+
+
+@pytest.mark.parametrize(
+    "spec, code, reason",
+    [("all,done,3", 3, "met"), ("any,held,3,timeout=0.2", 124, "timeout")],
+)
+def test_engine_exits_with_the_code_of_its_exit_condition(
+    tmp_path, spec, code, reason
+):
+    event_log = str(tmp_path / "events.log")
+    write_events(event_log, finished_clusters([1, 2], 3))
+    tracker = cwq.JobStateTracker([event_log], {}, group_by="cluster_id", reader="scan")
+    watcher = cwq.StatPollWatcher([event_log])
+    stream = io.StringIO()
+    writer = cwq.JsonLinesWriter(tracker, stream=stream)
+
+    engine = cwq.AsyncEngine(
+        tracker,
+        cwq.EventIngester(tracker, watcher),
+        [cwq.JsonLinesSink(tracker, writer)],
+        exit_conditions=[cwq.parse_exit_condition(spec)],
+        writer=writer,
+        min_interval=0.05,
+        max_interval=0.1,
+    )
+    try:
+        assert engine.run() == code
+    finally:
+        watcher.close()
+        tracker.close()
+
+    records = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [r["type"] for r in records] == ["snapshot", "exit"]
+    assert records[0]["totals"] == {"COMPLETED": 6, "TOTAL": 6}
+    assert records[1]["code"] == code
+    assert records[1]["reason"] == reason
+
+
+def test_full_lossy_queue_keeps_the_dropped_updates_messages():
+    import asyncio
+
+    import condor_watch_q_asyncio
+
+    loop = asyncio.new_event_loop()
+    tasks = condor_watch_q_asyncio.EngineTasks(None, loop)
+
+    async def put_three():
+        queue = asyncio.Queue(2)
+        await tasks.put(queue, "t1", ["first"], "update 1", lossy=True)
+        await tasks.put(queue, "t2", ["second"], "update 2", lossy=True)
+        await tasks.put(queue, "t3", ["third"], "update 3", lossy=True)
+        return [queue.get_nowait() for _ in range(queue.qsize())]
+
+    try:
+        queued = loop.run_until_complete(put_three())
+    finally:
+        loop.close()
+
+    assert queued == [
+        ("t2", ["second"], "update 2"),
+        ("t3", ["first", "third"], "update 3"),
+    ]
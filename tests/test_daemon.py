@@ -0,0 +1,211 @@
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+
+import pytest
+
+import condor_watch_q as cwq
+from helpers import finished_clusters, write_events
+
+OTHER_UID = os.getuid() + 12345
+
+
+class FakeClient(object):
+    def __init__(self, uid):
+        self.uid = uid
+        self.messages = []
+        self.event_logs = {}
+        self.outbox = b""
+
+    def send(self, message):
+        self.messages.append(message)
+
+
+@pytest.fixture
+def event_log():
+    # pytest's own temporary directories can't be searched by anyone else
+    directory = tempfile.mkdtemp()
+    os.chmod(directory, 0o755)
+    path = os.path.join(directory, "events.log")
+    open(path, "w").close()
+    os.chmod(path, 0o644)
+    yield path
+    shutil.rmtree(directory)
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    daemon = cwq.TrackingDaemon(str(tmp_path / "daemon.sock"), reader="scan")
+    daemon.watcher = cwq.StatPollWatcher([])
+    yield daemon
+    daemon.close()
+
+
+def test_peer_may_read_world_readable(event_log):
+    assert cwq.peer_may_read(OTHER_UID, event_log)
+
+
+def test_peer_may_not_read_without_credentials(event_log):
+    assert not cwq.peer_may_read(None, event_log)
+
+
+def test_peer_may_not_read_private_file(event_log):
+    os.chmod(event_log, 0o600)
+    assert not cwq.peer_may_read(OTHER_UID, event_log)
+
+
+def test_peer_may_not_read_in_unsearchable_directory(event_log):
+    os.chmod(os.path.dirname(event_log), 0o700)
+    assert not cwq.peer_may_read(OTHER_UID, event_log)
+
+
+def test_peer_may_not_read_missing_file(tmp_path):
+    assert not cwq.peer_may_read(OTHER_UID, str(tmp_path / "missing.log"))
+
+
+def test_open_follows_regular_file(daemon, event_log):
+    client = FakeClient(OTHER_UID)
+    assert daemon._open(client, event_log) is not None
+    assert client.messages == []
+
+
+def test_open_rejects_fifo_without_blocking(daemon, tmp_path):
+    path = str(tmp_path / "fifo.log")
+    os.mkfifo(path)
+    client = FakeClient(os.getuid())
+
+    assert daemon._open(client, path) is None
+    assert "not a regular file" in client.messages[0]["text"]
+
+
+def test_open_rejects_symlink(daemon, event_log, tmp_path):
+    path = str(tmp_path / "link.log")
+    os.symlink(event_log, path)
+    client = FakeClient(os.getuid())
+
+    assert daemon._open(client, path) is None
+    assert path not in daemon.trackers
+
+
+def test_changes_and_forgets_are_sent_in_order(daemon, event_log):
+    client = FakeClient(os.getuid())
+    tracker = daemon._open(client, event_log)
+    client.event_logs[event_log] = None
+    daemon.clients.append(client)
+
+    with tracker.lock:
+        tracker.apply_transition(event_log, 1, 0, cwq.JobStatus.IDLE)
+        tracker.forget_event_log(event_log, {1})
+        tracker.apply_transition(event_log, 2, 0, cwq.JobStatus.RUNNING)
+    daemon._send_changes(event_log, [])
+
+    idle = cwq.JOB_STATUS_TO_CODE[cwq.JobStatus.IDLE]
+    running = cwq.JOB_STATUS_TO_CODE[cwq.JobStatus.RUNNING]
+    assert client.messages == [
+        {"type": "changes", "event_log": event_log, "jobs": [(1, 0, idle)]},
+        {"type": "forget", "event_log": event_log, "cluster_ids": [1]},
+        {"type": "changes", "event_log": event_log, "jobs": [(2, 0, running)]},
+    ]
+    daemon.clients.remove(client)
+
+
+def test_client_sending_endless_line_is_disconnected(daemon):
+    ours, theirs = socket.socketpair()
+    try:
+        ours.setblocking(False)
+        client = cwq.DaemonClient(ours)
+        daemon.clients.append(client)
+        daemon._server = socket.socket()  # never readable
+
+        chunk = b"x" * (64 * 1024)
+        while client in daemon.clients:
+            theirs.sendall(chunk)
+            daemon._handle_sockets(1)
+        assert len(client.inbox) <= daemon.MAX_INBOX + len(chunk)
+    finally:
+        theirs.close()
+
+
+def test_subscribed_once_the_daemons_jobs_are_applied(event_log, tmp_path):
+    write_events(event_log, finished_clusters([1, 2], 3))
+    socket_path = str(tmp_path / "daemon.sock")
+    daemon = cwq.TrackingDaemon(socket_path, reader="scan")
+    daemon.listen()
+    # left running; it only ever waits on its sockets once this test is over
+    serving = threading.Thread(target=daemon.serve_forever)
+    serving.daemon = True
+    serving.start()
+
+    tracker = cwq.JobStateTracker([], {}, group_by="cluster_id")
+    ingester = cwq.DaemonIngester(tracker, socket_path, [event_log])
+    ingester.start()
+    try:
+        ingester.wait_until_subscribed()
+        with tracker.lock:
+            assert tracker.totals[cwq.TOTAL] == 6
+    finally:
+        ingester.stop()
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        b"[1,2]",
+        b"not json",
+        b'{"type": "subscribe", "event_logs": "/etc/hostname"}',
+        b'{"type": "subscribe", "event_logs": [1]}',
+        b'{"type": "subscribe", "event_logs": [], "cluster_ids": [[1]]}',
+        b'{"type": "subscribe", "event_logs": [], "cluster_ids": 1}',
+    ],
+)
+def test_client_sending_malformed_message_is_disconnected(daemon, event_log, line):
+    bad_ours, bad_theirs = socket.socketpair()
+    good_ours, good_theirs = socket.socketpair()
+    try:
+        bad = cwq.DaemonClient(bad_ours)
+        good = cwq.DaemonClient(good_ours)
+        daemon.clients.extend([bad, good])
+        daemon._server = socket.socket()  # never readable
+
+        bad_theirs.sendall(line + b"\n")
+        good_theirs.sendall(
+            b'{"type": "subscribe", "event_logs": ["' + event_log.encode() + b'"]}\n'
+        )
+        daemon._handle_sockets(1)
+        daemon._handle_sockets(0)
+
+        assert bad not in daemon.clients
+        assert good in daemon.clients
+        assert event_log in good.event_logs
+    finally:
+        bad_theirs.close()
+        good_theirs.close()
+
+
+@pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="inotify is Linux only"
+)
+def test_disconnect_unwatches_event_logs_nobody_follows(daemon, event_log):
+    daemon.watcher = cwq.InotifyWatcher([])
+    ours, theirs = socket.socketpair()
+    try:
+        client = cwq.DaemonClient(ours)
+        daemon.clients.append(client)
+        daemon._handle_message(
+            client,
+            b'{"type": "subscribe", "event_logs": ["' + event_log.encode() + b'"]}',
+        )
+        assert len(daemon.watcher._watch_descriptor_to_paths) == 1
+
+        daemon._disconnect(client)
+
+        assert daemon.trackers == {}
+        assert len(daemon.watcher._watch_descriptor_to_paths) == 0
+        assert len(daemon.watcher._swept) == 0
+        with open("/proc/self/fdinfo/{}".format(daemon.watcher._fd)) as f:
+            assert not any(line.startswith("inotify wd:") for line in f)
+    finally:
+        theirs.close()
@@ -0,0 +1,107 @@
+import sys
+
+import pytest
+
+import condor_watch_q as cwq
+from benchmarks import fake_htcondor
+
+
+def cluster_ad(cluster_id, num_procs, log, owner="alice", proc_ads=None):
+    ad = {
+        "ClusterId": cluster_id,
+        "Owner": owner,
+        "UserLog": log,
+        "Iwd": "/",
+        "JobBatchName": "batch-{}".format(cluster_id),
+        "TotalSubmitProcs": num_procs,
+    }
+    if proc_ads is not None:
+        ad["ProcAds"] = proc_ads
+    return ad
+
+
+@pytest.fixture(params=[True, False], ids=["cluster ads", "first job ads"])
+def schedd(request, monkeypatch):
+    # put back whatever was (or wasn't) imported before
+    monkeypatch.setitem(sys.modules, "htcondor", None)
+    monkeypatch.setitem(sys.modules, "classad", None)
+    htcondor = fake_htcondor.install()
+    # bindings too old to ask for cluster ads
+    if not request.param:
+        monkeypatch.delattr(htcondor, "QueryOpts")
+    monkeypatch.setattr(fake_htcondor.Schedd, "cluster_ads", [])
+    return fake_htcondor.Schedd
+
+
+def test_one_ad_per_cluster_is_fetched(schedd):
+    schedd.cluster_ads = [
+        cluster_ad(1, 100, "/logs/1.log"),
+        cluster_ad(2, 50, "/logs/2.log"),
+    ]
+    stats = {}
+    discovery = cwq.JobDiscovery(users=["alice"], stats=stats)
+
+    cluster_ids, event_logs, batch_names = discovery.discover()
+
+    assert cluster_ids == {1, 2}
+    assert event_logs == {"/logs/1.log", "/logs/2.log"}
+    assert batch_names == {1: "batch-1", 2: "batch-2"}
+    assert stats["ads"] == 2
+
+
+def test_cluster_whose_first_job_left_the_queue_is_found(schedd):
+    schedd.cluster_ads = [
+        cluster_ad(1, 5, "/logs/1.log"),
+        cluster_ad(2, 5, "/logs/2.log", proc_ads={3: {}, 4: {}}),
+    ]
+    discovery = cwq.JobDiscovery(users=["alice"])
+
+    cluster_ids, event_logs, _ = discovery.discover()
+
+    assert cluster_ids == {1, 2}
+    assert event_logs == {"/logs/1.log", "/logs/2.log"}
+
+
+def test_every_event_log_of_a_cluster_is_found(schedd):
+    schedd.cluster_ads = [
+        cluster_ad(
+            3,
+            4,
+            "/logs/0.log",
+            proc_ads={p: {"UserLog": "/logs/{}.log".format(p)} for p in range(4)},
+        )
+    ]
+    discovery = cwq.JobDiscovery(users=["alice"])
+
+    cluster_ids, event_logs, _ = discovery.discover()
+
+    assert cluster_ids == {3}
+    assert event_logs == {"/logs/{}.log".format(p) for p in range(4)}
+
+
+def test_rediscovery_only_finds_new_clusters(schedd):
+    schedd.cluster_ads = [
+        cluster_ad(1, 5, "/logs/1.log"),
+        cluster_ad(2, 5, "/logs/2.log", owner="bob"),
+    ]
+    discovery = cwq.JobDiscovery(users=["alice"])
+    assert discovery.discover()[0] == {1}
+
+    schedd.cluster_ads.append(cluster_ad(3, 5, "/logs/3.log"))
+    schedd.cluster_ads.append(cluster_ad(4, 5, "/logs/4.log", owner="bob"))
+    cluster_ids, event_logs, batch_names = discovery.discover_new()
+
+    assert cluster_ids == {3}
+    assert event_logs == {"/logs/3.log"}
+    assert batch_names == {3: "batch-3"}
+    assert discovery.discover_new() == (set(), set(), {})
+
+
+def test_clusters_picked_by_id_are_not_rediscovered(schedd):
+    schedd.cluster_ads = [cluster_ad(1, 5, "/logs/1.log")]
+    discovery = cwq.JobDiscovery(cluster_ids=[1])
+    assert discovery.discover()[0] == {1}
+
+    schedd.cluster_ads.append(cluster_ad(2, 5, "/logs/2.log"))
+    assert not discovery.can_find_new_jobs
+    assert discovery.discover_new() == (set(), set(), {})
@@ -0,0 +1,171 @@
+import sys
+
+import pytest
+
+import condor_watch_q as cwq
+from condor_watch_q import JobStatus
+
+
+def parse_exit_args(monkeypatch, *specs):
+    argv = ["condor_watch_q"]
+    for spec in specs:
+        argv += ["-exit", spec]
+    monkeypatch.setattr(sys, "argv", argv)
+    return cwq.parse_args().exit
+
+
+@pytest.mark.parametrize(
+    "spec, grouper, statuses, exit_code, timeout",
+    [
+        ("all,done", "all", {JobStatus.COMPLETED}, 0, None),
+        ("any,held,1", "any", {JobStatus.HELD}, 1, None),
+        ("NONE,Idle,3", "none", {JobStatus.IDLE}, 3, None),
+        ("all-groups,done", "all-groups", {JobStatus.COMPLETED}, 0, None),
+        ("any-group,held>=5%,2", "any-group", {JobStatus.HELD}, 2, None),
+        ("no-group,active", "no-group", cwq.ACTIVE_STATES, 0, None),
+        ("all,done,timeout=3600", "all", {JobStatus.COMPLETED}, 0, 3600),
+        ("any,held>=5,4,timeout=0.5", "any", {JobStatus.HELD}, 4, 0.5),
+    ],
+)
+def test_parse_exit_condition(monkeypatch, spec, grouper, statuses, exit_code, timeout):
+    (condition,) = parse_exit_args(monkeypatch, spec)
+
+    assert condition.grouper == grouper
+    assert condition.statuses == statuses
+    assert condition.exit_code == exit_code
+    assert condition.timeout == timeout
+    assert condition.per_group == (grouper not in ("all", "any", "none"))
+
+
+def test_parse_exit_condition_threshold():
+    condition = cwq.parse_exit_condition("any-group,held>=5%,2")
+    assert condition.comparison is cwq.operator.ge
+    assert condition.threshold == 5
+    assert condition.percent
+
+    condition = cwq.parse_exit_condition("all,done<10")
+    assert condition.comparison is cwq.operator.lt
+    assert condition.threshold == 10
+    assert not condition.percent
+
+
+@pytest.mark.parametrize(
+    "spec, error",
+    [
+        ("all", "invalid -exit specification"),
+        ("all,done,0,1", "invalid -exit specification"),
+        ("every,done", 'invalid GROUPER "every"'),
+        ("all,finished", 'invalid JOB_STATUS "finished"'),
+        ("all,done>=x", 'invalid JOB_STATUS "done>=x"'),
+        ("all,done>=-5%", 'invalid JOB_STATUS "done>=-5%"'),
+        ("all,done>=101%", "a percentage must be between 0% and 100%"),
+        ("all,done,x", 'EXIT_CODE must be an integer, but was "x"'),
+        ("all,done,timeout=soon", 'timeout must be a number of seconds, but was "soon"'),
+        ("all,done,timeout=0", "timeout must be a positive number of seconds"),
+        ("all,done,1,timeout=-5", "timeout must be a positive number of seconds"),
+    ],
+)
+def test_invalid_exit_condition_is_an_argument_error(monkeypatch, capsys, spec, error):
+    with pytest.raises(SystemExit) as e:
+        parse_exit_args(monkeypatch, spec)
+
+    assert e.value.code == 2
+    assert error in capsys.readouterr().err
+
+
+def test_exit_condition_from_tuple():
+    condition = cwq.ExitCondition(*("all", "done", 1))
+    assert condition.grouper == "all"
+    assert condition.statuses == {JobStatus.COMPLETED}
+    assert condition.exit_code == 1
+    assert condition.timeout is None
+
+
+@pytest.fixture
+def tracker():
+    tracker = cwq.JobStateTracker([], {}, group_by="cluster_id")
+    yield tracker
+    tracker.close()
+
+
+def make_conditions(tracker, *specs):
+    conditions = [cwq.parse_exit_condition(spec) for spec in specs]
+    for condition in conditions:
+        if condition.per_group:
+            tracker.add_group_listener(condition)
+    return conditions
+
+
+def set_jobs(tracker, cluster_id, statuses):
+    for proc_id, status in enumerate(statuses):
+        tracker.apply_transition("events.log", cluster_id, proc_id, status)
+
+
+def met(tracker, conditions):
+    return [condition.is_met(tracker) for condition in conditions]
+
+
+def test_whole_queue_conditions(tracker):
+    conditions = make_conditions(
+        tracker, "all,done", "any,held", "none,idle", "all,done>=50%", "none,held>=2"
+    )
+    set_jobs(tracker, 1, [JobStatus.IDLE, JobStatus.RUNNING])
+    assert met(tracker, conditions) == [False, False, False, False, True]
+
+    set_jobs(tracker, 1, [JobStatus.COMPLETED, JobStatus.HELD])
+    assert met(tracker, conditions) == [False, True, True, True, True]
+
+    set_jobs(tracker, 2, [JobStatus.HELD])
+    assert met(tracker, conditions) == [False, True, True, False, False]
+
+    set_jobs(tracker, 1, [JobStatus.COMPLETED, JobStatus.COMPLETED])
+    set_jobs(tracker, 2, [JobStatus.COMPLETED])
+    assert met(tracker, conditions) == [True, False, True, True, True]
+
+
+def test_group_conditions(tracker):
+    conditions = make_conditions(
+        tracker, "all-groups,done", "any-group,held>=50%", "no-group,idle"
+    )
+    set_jobs(tracker, 1, [JobStatus.IDLE, JobStatus.IDLE])
+    set_jobs(tracker, 2, [JobStatus.COMPLETED])
+    assert met(tracker, conditions) == [False, False, False]
+
+    set_jobs(tracker, 1, [JobStatus.IDLE, JobStatus.HELD])
+    assert met(tracker, conditions) == [False, True, True]
+
+    set_jobs(tracker, 1, [JobStatus.COMPLETED, JobStatus.RUNNING])
+    assert met(tracker, conditions) == [False, False, True]
+
+    set_jobs(tracker, 1, [JobStatus.COMPLETED, JobStatus.COMPLETED])
+    assert met(tracker, conditions) == [True, False, True]
+
+    # forgotten groups no longer count
+    set_jobs(tracker, 3, [JobStatus.HELD])
+    assert met(tracker, conditions) == [False, True, True]
+    tracker.forget_event_log("events.log", {3})
+    assert met(tracker, conditions) == [True, False, True]
+
+
+def test_conditions_are_only_met_once_caught_up(tracker):
+    conditions = make_conditions(tracker, "all,done,3")
+    set_jobs(tracker, 1, [JobStatus.COMPLETED])
+
+    assert cwq.check_exit_conditions(tracker, conditions, False, 0) is None
+    assert cwq.check_exit_conditions(tracker, conditions, True, 0) == (
+        conditions[0],
+        3,
+        "met",
+    )
+
+
+def test_conditions_time_out_with_code_124(tracker):
+    conditions = make_conditions(tracker, "all,done,3,timeout=10")
+    set_jobs(tracker, 1, [JobStatus.RUNNING])
+
+    assert cwq.check_exit_conditions(tracker, conditions, True, 9.9) is None
+    assert cwq.check_exit_conditions(tracker, conditions, False, 10) == (
+        conditions[0],
+        124,
+        "timeout",
+    )
@@ -0,0 +1,83 @@
+import io
+
+import condor_watch_q as cwq
+from helpers import finished_clusters, write_events
+
+
+def replay(tmp_path, events, batch_size):
+    event_log = str(tmp_path / "events.log")
+    write_events(event_log, events)
+    tracker = cwq.JobStateTracker([event_log], {}, group_by="cluster_id", reader="scan")
+    watcher = cwq.StatPollWatcher([event_log])
+    ingester = cwq.EventIngester(tracker, watcher, batch_size=batch_size)
+    writer = cwq.JsonLinesWriter(tracker, stream=io.StringIO())
+    return event_log, tracker, watcher, ingester, writer
+
+
+def test_first_snapshot_waits_for_the_backlog(tmp_path):
+    event_log, tracker, watcher, ingester, writer = replay(
+        tmp_path, finished_clusters(range(1, 11), 10), batch_size=15
+    )
+    records = []
+    try:
+        pending = set(tracker.event_readers)
+        for _ in range(100):
+            pending = ingester.step(pending, timeout=0)
+            with tracker.lock:
+                records += writer.take_changes(caught_up=ingester.caught_up.is_set())
+            if ingester.caught_up.is_set():
+                break
+    finally:
+        watcher.close()
+        tracker.close()
+
+    assert [r["type"] for r in records] == ["snapshot"]
+    assert records[0]["totals"] == {"COMPLETED": 100, "TOTAL": 100}
+    assert len(records[0]["groups"]) == 10
+    assert records[0]["seq"] == 0
+
+
+def test_changes_after_the_first_snapshot_are_written(tmp_path):
+    event_log, tracker, watcher, ingester, writer = replay(
+        tmp_path, [(0, 1, 0)], batch_size=15
+    )
+    try:
+        ingester.step(set(tracker.event_readers), timeout=0)
+        with tracker.lock:
+            assert [r["type"] for r in writer.take_changes()] == ["snapshot"]
+
+        write_events(event_log, [(1, 1, 0)])
+        ingester.step(set(tracker.event_readers), timeout=0)
+        # changes once the first snapshot is out are live, even while behind
+        with tracker.lock:
+            records = writer.take_changes(caught_up=False)
+    finally:
+        watcher.close()
+        tracker.close()
+
+    assert [r["type"] for r in records] == ["job", "group", "totals"]
+    assert records[0]["job"] == "1.0"
+    assert records[0]["status"] == "RUNNING"
+
+
+def test_groups_are_written_in_numeric_order(tmp_path):
+    event_log, tracker, watcher, ingester, writer = replay(
+        tmp_path, [(0, 9, 0), (0, 10, 0)], batch_size=15
+    )
+    try:
+        ingester.step(set(tracker.event_readers), timeout=0)
+        with tracker.lock:
+            writer.take_changes()
+
+        write_events(event_log, [(1, 10, 0), (1, 9, 0)])
+        ingester.step(set(tracker.event_readers), timeout=0)
+        with tracker.lock:
+            changed = writer.take_changes()
+            tracker.forget_event_log(event_log)
+            removed = writer.take_changes()
+    finally:
+        watcher.close()
+        tracker.close()
+
+    assert [r["group"] for r in changed if r["type"] == "group"] == [9, 10]
+    assert [r["group"] for r in removed if r["type"] == "group_removed"] == [9, 10]
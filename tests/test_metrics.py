@@ -0,0 +1,98 @@
+import urllib.error
+import urllib.request
+
+import pytest
+
+import condor_watch_q as cwq
+from helpers import finished_clusters, write_events
+
+
+@pytest.fixture
+def tracker(tmp_path):
+    event_log = str(tmp_path / "events.log")
+    # two clusters of five finished jobs, and one of three idle jobs
+    write_events(
+        event_log, finished_clusters([1, 2], 5) + [(0, 3, p) for p in range(3)]
+    )
+    tracker = cwq.JobStateTracker([event_log], {}, group_by="cluster_id", reader="scan")
+    tracker.process_events()
+    yield tracker
+    tracker.close()
+
+
+@pytest.fixture
+def exporter(tracker):
+    exporter = cwq.MetricsExporter(tracker, "127.0.0.1", 0)
+    with tracker.lock:
+        exporter.update(caught_up=True)
+    exporter.start()
+    yield exporter
+    exporter.close()
+
+
+def url(exporter, path="/metrics"):
+    return "http://{}:{}{}".format(exporter.address[0], exporter.address[1], path)
+
+
+def scrape(exporter, path="/metrics"):
+    response = urllib.request.urlopen(url(exporter, path), timeout=5)
+    assert response.headers["Content-Type"] == cwq.MetricsExporter.CONTENT_TYPE
+    samples = {}
+    for line in response.read().decode("utf-8").splitlines():
+        if not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+def test_job_counts(exporter):
+    samples = scrape(exporter)
+
+    assert samples['condor_watch_q_jobs{status="COMPLETED"}'] == 10
+    assert samples['condor_watch_q_jobs{status="IDLE"}'] == 3
+    assert samples['condor_watch_q_jobs{status="RUNNING"}'] == 0
+    assert samples["condor_watch_q_evicted_jobs"] == 0
+    assert samples["condor_watch_q_events_read_total"] == 23
+    assert samples["condor_watch_q_parse_errors_total"] == 0
+    assert samples["condor_watch_q_caught_up"] == 1
+
+    group_samples = [
+        value
+        for name, value in samples.items()
+        if name.startswith("condor_watch_q_group_jobs{")
+    ]
+    assert len(group_samples) == 3 * len(cwq.JobStatus)
+    assert sum(group_samples) == 13
+
+
+def test_root_path_serves_metrics(exporter):
+    assert "condor_watch_q_caught_up" in scrape(exporter, "/")
+
+
+def test_unknown_path_is_not_found(exporter):
+    with pytest.raises(urllib.error.HTTPError) as e:
+        urllib.request.urlopen(url(exporter, "/nope"), timeout=5)
+    assert e.value.code == 404
+
+
+def test_scrape_does_not_wait_for_the_tracker(exporter, tracker):
+    with tracker.lock:
+        assert scrape(exporter)["condor_watch_q_caught_up"] == 1
+
+
+def test_scrapes_see_the_last_update(exporter, tracker):
+    before = scrape(exporter)
+
+    write_events(list(tracker.event_readers)[0], [(1, 3, 0)])
+    tracker.process_events()
+    assert scrape(exporter) == before
+
+    with tracker.lock:
+        exporter.update(caught_up=True)
+    after = scrape(exporter)
+    assert after['condor_watch_q_jobs{status="RUNNING"}'] == 1
+    assert after['condor_watch_q_jobs{status="IDLE"}'] == 2
+    assert (
+        after["condor_watch_q_job_state_changes_total"]
+        > before["condor_watch_q_job_state_changes_total"]
+    )
@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+import condor_watch_q as cwq
+
+
+def test_shortest_unique_prefixes_of_siblings():
+    assert cwq.shortest_unique_prefixes(["alpha", "alps", "beta"]) == {
+        "alpha": "alph",
+        "alps": "alps",
+        "beta": "b",
+    }
+
+
+def test_name_that_is_a_prefix_of_a_sibling_is_kept_whole():
+    assert cwq.shortest_unique_prefixes(["run", "run2", "other"]) == {
+        "run": "run",
+        "run2": "run2",
+        "other": "o",
+    }
+
+
+def test_only_name_is_abbreviated_to_one_character():
+    assert cwq.shortest_unique_prefixes(["results"]) == {"results": "r"}
+
+
+@pytest.fixture
+def base(tmp_path):
+    for name in ("alpha", "alps", "beta"):
+        os.mkdir(str(tmp_path / name))
+    return tmp_path
+
+
+def abbreviated_tail(cache, path):
+    return cwq.split_all(cache.abbreviate(path))[-2:]
+
+
+def test_abbreviate_uses_shortest_unique_prefixes(base):
+    cache = cwq.PathDisplayCache()
+    assert abbreviated_tail(cache, str(base / "alpha" / "x.log")) == ["alph", "x.log"]
+    assert abbreviated_tail(cache, str(base / "beta" / "x.log")) == ["b", "x.log"]
+
+
+def test_abbreviation_is_recomputed_when_the_directory_changes(base):
+    cache = cwq.PathDisplayCache(recheck_interval=0)
+    path = str(base / "alpha" / "x.log")
+    assert abbreviated_tail(cache, path) == ["alph", "x.log"]
+
+    os.mkdir(str(base / "alphabet"))
+    # make sure the change is visible even with coarse timestamps
+    mtime = os.stat(str(base)).st_mtime + 10
+    os.utime(str(base), (mtime, mtime))
+
+    assert abbreviated_tail(cache, path) == ["alpha", "x.log"]
+
+
+def test_directory_is_not_rechecked_within_the_interval(base):
+    cache = cwq.PathDisplayCache(recheck_interval=60)
+    path = str(base / "alpha" / "x.log")
+    assert abbreviated_tail(cache, path) == ["alph", "x.log"]
+
+    os.mkdir(str(base / "alphabet"))
+    mtime = os.stat(str(base)).st_mtime + 10
+    os.utime(str(base), (mtime, mtime))
+
+    assert abbreviated_tail(cache, path) == ["alph", "x.log"]
@@ -0,0 +1,61 @@
+import glob
+import os
+
+import pytest
+
+import condor_watch_q as cwq
+from condor_watch_q import JobStatus
+
+EVENT_LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "event_logs")
+EVENT_LOGS = sorted(
+    os.path.basename(path) for path in glob.glob(os.path.join(EVENT_LOG_DIR, "*.log"))
+)
+
+EXPECTED_JOB_STATES = {
+    "single_cluster.log": {
+        (4721, 0): JobStatus.COMPLETED,
+        (4721, 1): JobStatus.COMPLETED,
+        (4721, 2): JobStatus.IDLE,
+        (4721, 3): JobStatus.IDLE,
+        (4721, 4): JobStatus.REMOVED,
+    },
+    "shared.log": {
+        (310, 0): JobStatus.IDLE,
+        (310, 1): JobStatus.COMPLETED,
+        (311, 0): JobStatus.RUNNING,
+        (312, 0): JobStatus.REMOVED,
+    },
+}
+
+
+def read_job_states(reader, name):
+    tracker = cwq.JobStateTracker(
+        [os.path.join(EVENT_LOG_DIR, name)], {}, group_by="cluster_id", reader=reader
+    )
+    try:
+        messages = tracker.process_events()
+    finally:
+        tracker.close()
+
+    assert messages == []
+    return {
+        (cluster.cluster_id, proc_id): status
+        for cluster in tracker.clusters
+        for proc_id, status in cluster
+    }
+
+
+def test_every_sample_event_log_has_expected_job_states():
+    assert sorted(EXPECTED_JOB_STATES) == EVENT_LOGS
+
+
+@pytest.mark.parametrize("name", EVENT_LOGS)
+def test_scan_reader_reads_expected_job_states(name):
+    assert read_job_states("scan", name) == EXPECTED_JOB_STATES[name]
+
+
+@pytest.mark.parametrize("name", EVENT_LOGS)
+def test_scan_reader_matches_htcondor_reader(name):
+    pytest.importorskip("htcondor")
+
+    assert read_job_states("scan", name) == read_job_states("htcondor", name)
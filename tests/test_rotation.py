@@ -0,0 +1,95 @@
+import pytest
+
+import condor_watch_q as cwq
+from benchmarks.rotation import Scenario, read_until_caught_up
+
+
+@pytest.fixture(params=["scan", "htcondor"])
+def reader(request):
+    if request.param == "htcondor":
+        pytest.importorskip("htcondor")
+    return request.param
+
+
+@pytest.fixture(params=[None, 7], ids=["all", "batches"])
+def batch_size(request):
+    return request.param
+
+
+@pytest.fixture
+def follow(reader, batch_size, tmp_path):
+    """Yields a function that writes with the scenario, reads, and checks the job states."""
+    path = str(tmp_path / "rotating.log")
+    open(path, "w").close()
+
+    scenario = Scenario(cwq, path, seed=0)
+    tracker = cwq.JobStateTracker([path], {}, group_by="cluster_id", reader=reader)
+
+    def step():
+        read_until_caught_up(tracker, batch_size)
+        actual = {
+            (cluster.cluster_id, proc_id): status
+            for cluster in tracker.clusters
+            for proc_id, status in cluster
+        }
+        assert actual == scenario.expected
+        assert tracker.totals["TOTAL"] == len(actual)
+        for group in tracker.groups.values():
+            assert sum(group.counts.values()) == group.total
+
+    yield scenario, step
+    tracker.close()
+
+
+def test_rotation_with_the_old_file_unfinished(follow):
+    scenario, step = follow
+
+    events = scenario.events([1, 2, 3])
+    half = len(events) // 2
+    scenario.append(events[:half])
+    step()
+
+    scenario.append(events[half:])
+    scenario.rotate()
+    scenario.append(scenario.events([4, 5]))
+    step()
+
+    scenario.append(scenario.events([6]))
+    step()
+
+
+def test_truncated_and_rewritten_shorter(follow):
+    scenario, step = follow
+
+    scenario.append(scenario.events([1, 2, 3]))
+    step()
+
+    scenario.truncate(scenario.events([7]))
+    step()
+
+
+def test_truncated_and_rewritten_longer(follow, reader):
+    if reader != "scan":
+        # the htcondor reader can only tell that the file was truncated if it
+        # is smaller than it was; the scanning reader checks where it left off
+        pytest.skip("only the scanning reader notices a longer rewrite")
+    scenario, step = follow
+
+    scenario.append(scenario.events([1]))
+    step()
+
+    scenario.truncate(scenario.events([8, 9, 10]))
+    step()
+
+
+def test_rotated_to_an_empty_file(follow):
+    scenario, step = follow
+
+    scenario.append(scenario.events([1, 2]))
+    step()
+
+    scenario.rotate()
+    step()
+
+    scenario.append(scenario.events([11]))
+    step()
@@ -0,0 +1,38 @@
+import pytest
+
+import condor_watch_q as cwq
+from condor_watch_q import EVICTED, TOTAL, JobStatus
+
+TOTALS = {
+    TOTAL: 3,
+    JobStatus.COMPLETED: 2,
+    JobStatus.REMOVED: 0,
+    JobStatus.IDLE: 1,
+    JobStatus.RUNNING: 0,
+    JobStatus.HELD: 0,
+    JobStatus.SUSPENDED: 0,
+}
+
+
+@pytest.mark.parametrize(
+    "make_summary",
+    [cwq.make_summary_with_totals, cwq.make_summary_with_percentages],
+)
+def test_summary_of_plain_totals_without_evicted(make_summary):
+    (summary,) = make_summary(TOTALS)
+
+    assert summary.startswith("Total: 3 jobs; ")
+    assert "evicted" not in summary
+
+
+@pytest.mark.parametrize(
+    "make_summary",
+    [cwq.make_summary_with_totals, cwq.make_summary_with_percentages],
+)
+def test_summary_shows_evicted(make_summary):
+    totals = dict(TOTALS)
+    totals[EVICTED] = 2
+
+    (summary,) = make_summary(totals)
+
+    assert summary.endswith("; 2 evicted")
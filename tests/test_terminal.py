@@ -0,0 +1,56 @@
+import io
+
+import condor_watch_q as cwq
+
+ERASE = "\033[J"
+
+
+def draw(renderer, stream, lines):
+    stream.seek(0)
+    stream.truncate()
+    renderer.draw("\n".join(lines))
+    return stream.getvalue()
+
+
+def make_renderer(size):
+    stream = io.StringIO()
+    return cwq.TerminalRenderer(stream=stream, get_size=lambda: size[0]), stream
+
+
+def test_short_frames_are_diffed():
+    size = [(80, 24)]
+    renderer, stream = make_renderer(size)
+    draw(renderer, stream, ["a", "b", "c"])
+
+    out = draw(renderer, stream, ["a", "x", "c"])
+    assert ERASE not in out
+    assert "a" not in out and "c" not in out
+
+
+def test_frames_as_tall_as_the_screen_are_redrawn():
+    size = [(80, 3)]
+    renderer, stream = make_renderer(size)
+    draw(renderer, stream, ["a", "b", "c"])
+
+    out = draw(renderer, stream, ["a", "x", "c"])
+    assert out.endswith(ERASE + "a\nx\nc\n")
+
+    # and the first short frame after a tall one
+    out = draw(renderer, stream, ["a", "y"])
+    assert out.endswith(ERASE + "a\ny\n")
+
+
+def test_height_change_redraws():
+    size = [(80, 24)]
+    renderer, stream = make_renderer(size)
+    draw(renderer, stream, ["a", "b"])
+
+    size[0] = (80, 30)
+    out = draw(renderer, stream, ["a", "x"])
+    assert out.endswith(ERASE + "a\nx\n")
+
+
+def test_screen_rows_ignores_colors():
+    line = "\033[1;31m" + "x" * 80 + "\033[0m"
+    assert cwq.screen_rows(line, 80) == 1
+    assert cwq.screen_rows(line + "y", 80) == 2
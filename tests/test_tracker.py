@@ -0,0 +1,390 @@
+import os
+
+import pytest
+
+import condor_watch_q as cwq
+from condor_watch_q import EVICTED, TOTAL, JobStatus
+from helpers import finished_clusters, write_events
+
+
+def assert_counts_add_up(tracker):
+    tracked = sum(len(cluster) for cluster in tracker.clusters)
+    assert tracker.totals[TOTAL] == tracked + tracker.totals[EVICTED]
+    assert tracker.totals[TOTAL] == sum(tracker.totals[status] for status in JobStatus)
+    assert sum(group.total for group in tracker.groups.values()) == tracked
+
+
+@pytest.fixture
+def event_log(tmp_path):
+    return str(tmp_path / "events.log")
+
+
+def test_finished_clusters_are_evicted_past_max_clusters(event_log):
+    write_events(event_log, finished_clusters(range(1, 21), 10))
+    tracker = cwq.JobStateTracker(
+        [event_log], {}, group_by="cluster_id", reader="scan", max_clusters=5
+    )
+    tracker.process_events()
+
+    assert len(tracker.cluster_id_to_cluster) == 5
+    assert tracker.totals[TOTAL] == 200
+    assert tracker.totals[EVICTED] == 150
+    assert tracker.totals[JobStatus.COMPLETED] == 200
+    assert_counts_add_up(tracker)
+
+
+def test_late_event_for_evicted_cluster_is_not_counted_twice(event_log):
+    write_events(event_log, finished_clusters(range(1, 21), 10))
+    tracker = cwq.JobStateTracker(
+        [event_log], {}, group_by="cluster_id", reader="scan", max_clusters=5
+    )
+    tracker.process_events()
+
+    # released after it completed, which makes it idle
+    write_events(event_log, [(13, 3, 7)])
+    tracker.process_events()
+
+    assert tracker.totals[TOTAL] == 200
+    assert tracker.totals[JobStatus.IDLE] == 1
+    assert tracker.totals[JobStatus.COMPLETED] == 199
+    assert tracker.cluster_id_to_cluster[3][7] is JobStatus.IDLE
+    assert len(tracker.cluster_id_to_cluster[3]) == 10
+    assert_counts_add_up(tracker)
+
+
+def test_truncation_forgets_evicted_clusters(event_log):
+    write_events(event_log, finished_clusters(range(1, 51), 50))
+    tracker = cwq.JobStateTracker(
+        [event_log], {}, group_by="cluster_id", reader="scan", max_clusters=5
+    )
+    tracker.process_events()
+    assert tracker.totals[TOTAL] == 2500
+
+    write_events(event_log, finished_clusters(range(1, 21), 50), mode="w")
+    tracker.process_events()
+
+    assert tracker.totals[TOTAL] == 1000
+    assert tracker.totals[JobStatus.COMPLETED] == 1000
+    assert_counts_add_up(tracker)
+
+
+def test_evicted_clusters_are_checkpointed(event_log, tmp_path):
+    checkpoint = str(tmp_path / "checkpoint")
+    write_events(event_log, finished_clusters(range(1, 21), 10))
+    tracker = cwq.JobStateTracker(
+        [event_log], {}, group_by="cluster_id", reader="scan", max_clusters=5
+    )
+    tracker.process_events()
+    tracker.save_checkpoint(checkpoint)
+    tracker.close()
+
+    resumed = cwq.JobStateTracker(
+        [event_log], {}, group_by="cluster_id", reader="scan", max_clusters=5
+    )
+    assert resumed.load_checkpoint(checkpoint) == []
+    assert resumed.totals[TOTAL] == 200
+    assert resumed.totals[EVICTED] == 150
+    assert_counts_add_up(resumed)
+
+    # evicted clusters can still come back after resuming
+    write_events(event_log, [(13, 3, 7)])
+    resumed.process_events()
+    assert resumed.totals[TOTAL] == 200
+    assert resumed.cluster_id_to_cluster[3][7] is JobStatus.IDLE
+    assert_counts_add_up(resumed)
+    resumed.close()
+
+
+class TruncatedReader(object):
+    """A reader whose next read finds the event log truncated partway through."""
+
+    def __init__(self, path, transitions, truncations):
+        self.path = path
+        self.transitions = transitions
+        self.truncations = truncations
+        self.caught_up = True
+
+    def read(self, **kwargs):
+        transitions, self.transitions = self.transitions, []
+        return transitions, []
+
+    def close(self):
+        pass
+
+
+def test_transitions_read_before_a_truncation_are_forgotten(event_log):
+    tracker = cwq.JobStateTracker([], {}, group_by="cluster_id")
+    tracker.event_readers[event_log] = TruncatedReader(
+        event_log,
+        [
+            (1, 0, JobStatus.IDLE),
+            (1, 1, JobStatus.IDLE),
+            (2, 0, JobStatus.IDLE),
+            (2, 0, JobStatus.RUNNING),
+        ],
+        [(2, {1})],
+    )
+    tracker.process_events()
+
+    assert 1 not in tracker.cluster_id_to_cluster
+    assert tracker.cluster_id_to_cluster[2][0] is JobStatus.RUNNING
+    assert tracker.totals[TOTAL] == 1
+    assert_counts_add_up(tracker)
+
+
+def test_loading_a_checkpoint_closes_the_replaced_readers(event_log, tmp_path):
+    checkpoint = str(tmp_path / "checkpoint")
+    write_events(event_log, finished_clusters([1], 3))
+    tracker = cwq.JobStateTracker([event_log], {}, reader="scan")
+    tracker.process_events()
+    tracker.save_checkpoint(checkpoint)
+    tracker.close()
+
+    resumed = cwq.JobStateTracker([event_log], {}, reader="scan")
+    replaced = resumed.event_readers[event_log]
+    resumed.load_checkpoint(checkpoint)
+
+    assert resumed.event_readers[event_log] is not replaced
+    assert replaced._file.closed
+    resumed.close()
+
+
+def test_cluster_whose_jobs_finish_one_at_a_time_is_not_compacted_each_time(
+    event_log, monkeypatch
+):
+    compacted = []
+    compact = cwq.Cluster.compact
+
+    def counting_compact(cluster):
+        compacted.append(cluster.cluster_id)
+        compact(cluster)
+
+    monkeypatch.setattr(cwq.Cluster, "compact", counting_compact)
+
+    write_events(
+        event_log,
+        [
+            (event_type, 1, proc_id)
+            for proc_id in range(500)
+            for event_type in (0, 1, 5)
+        ],
+    )
+    tracker = cwq.JobStateTracker([event_log], {}, group_by="cluster_id", reader="scan")
+    tracker.process_events()
+
+    assert len(compacted) <= 1
+    assert tracker.totals[JobStatus.COMPLETED] == 500
+    assert_counts_add_up(tracker)
+    tracker.close()
+
+
+@pytest.fixture
+def checkpoint(event_log, tmp_path):
+    path = str(tmp_path / "checkpoint")
+    write_events(event_log, finished_clusters([1], 3))
+    tracker = cwq.JobStateTracker([event_log], {}, reader="scan")
+    tracker.process_events()
+    tracker.save_checkpoint(path)
+    tracker.close()
+    return path
+
+
+def load_checkpoint(event_log, checkpoint):
+    tracker = cwq.JobStateTracker([event_log], {}, reader="scan")
+    try:
+        return tracker.load_checkpoint(checkpoint), tracker.totals[TOTAL]
+    finally:
+        tracker.close()
+
+
+def test_checkpoint_is_private(checkpoint, event_log):
+    assert os.stat(checkpoint).st_mode & 0o777 == 0o600
+    assert load_checkpoint(event_log, checkpoint) == ([], 3)
+
+
+def test_checkpoint_owned_by_someone_else_is_ignored(
+    checkpoint, event_log, monkeypatch
+):
+    uid = os.getuid()
+    monkeypatch.setattr(os, "getuid", lambda: uid + 1)
+    messages, total = load_checkpoint(event_log, checkpoint)
+    assert total == 0
+    assert "not owned by you" in messages[0]
+
+
+def test_checkpoint_writable_by_others_is_ignored(checkpoint, event_log):
+    os.chmod(checkpoint, 0o620)
+    messages, total = load_checkpoint(event_log, checkpoint)
+    assert total == 0
+    assert "can be written by other users" in messages[0]
+
+
+@pytest.mark.parametrize(
+    "tamper",
+    [
+        lambda c: "not json",
+        lambda c: c.replace('"clusters": [[1, [[0, 5]', '"clusters": [[1, [[0, 99]'),
+        lambda c: c.replace('"reader_state": ', '"reader_state": "x", "": '),
+        lambda c: c.replace('"evicted"', '"unexpected"'),
+    ],
+)
+def test_tampered_checkpoint_is_ignored(checkpoint, event_log, tamper):
+    with open(checkpoint) as f:
+        contents = f.read()
+    tampered = tamper(contents)
+    assert tampered != contents
+    with open(checkpoint, "w") as f:
+        f.write(tampered)
+
+    messages, total = load_checkpoint(event_log, checkpoint)
+    assert total == 0
+    assert messages[0].startswith("WARNING: checkpoint")
+
+
+def test_event_log_state_may_only_name_htcondor_classes():
+    import base64
+    import pickle
+
+    state = base64.b64encode(pickle.dumps(os.getcwd)).decode("ascii")
+    with pytest.raises(pickle.UnpicklingError):
+        cwq.load_event_log_state(state)
+
+
+@pytest.fixture
+def batch():
+    tracker = cwq.JobStateTracker([], {9: "b", 10: "b"}, group_by="batch_name")
+    yield tracker
+    tracker.close()
+
+
+def set_status(tracker, cluster_id, proc_ids, status):
+    for proc_id in proc_ids:
+        tracker.apply_transition("events.log", cluster_id, proc_id, status)
+
+
+def test_active_job_ids_are_ordered_numerically(batch):
+    set_status(batch, 10, range(12), JobStatus.IDLE)
+    set_status(batch, 9, range(3), JobStatus.IDLE)
+
+    assert cwq.format_active_job_ids(batch.groups["b"]) == "9.0 ... 10.11"
+
+
+def test_jobs_that_are_no_longer_active_are_skipped(batch):
+    set_status(batch, 9, range(3), JobStatus.IDLE)
+    set_status(batch, 10, range(12), JobStatus.IDLE)
+    group = batch.groups["b"]
+
+    set_status(batch, 9, [0], JobStatus.COMPLETED)
+    set_status(batch, 10, [11, 10], JobStatus.COMPLETED)
+    assert cwq.format_active_job_ids(group) == "9.1 ... 10.9"
+    # the stale tops were dropped on the way
+    assert group._lowest_active[0] == (9, 1)
+    assert group._highest_active[0] == (-10, -9)
+
+    set_status(batch, 9, [1, 2], JobStatus.RUNNING)
+    set_status(batch, 10, range(1, 10), JobStatus.COMPLETED)
+    assert cwq.format_active_job_ids(group) == "9.1 ... 10.0"
+
+    set_status(batch, 10, [0], JobStatus.REMOVED)
+    assert cwq.format_active_job_ids(group) == "9.1, 9.2"
+
+    set_status(batch, 9, [1], JobStatus.COMPLETED)
+    assert cwq.format_active_job_ids(group) == "9.2"
+
+    set_status(batch, 9, [2], JobStatus.COMPLETED)
+    assert cwq.format_active_job_ids(group) == ""
+
+
+def test_heaps_are_compacted_when_stale_jobs_outnumber_active_ones(batch):
+    group_sizes = []
+    for proc_id in range(1000):
+        set_status(batch, 9, [proc_id], JobStatus.IDLE)
+        set_status(batch, 9, [proc_id], JobStatus.COMPLETED)
+        group = batch.groups["b"]
+        group_sizes.append((len(group._lowest_active), len(group._highest_active)))
+    set_status(batch, 10, [0], JobStatus.IDLE)
+
+    # each job is pushed while it is the one active job
+    assert max(max(sizes) for sizes in group_sizes) <= 2 * 1 + 64
+    assert cwq.format_active_job_ids(group) == "10.0"
+
+
+def test_time_budget_is_shared_between_event_logs(tmp_path):
+    big = str(tmp_path / "big.log")
+    small = str(tmp_path / "small.log")
+    write_events(big, finished_clusters(range(1, 51), 1000))
+    write_events(small, finished_clusters([1000], 10))
+    tracker = cwq.JobStateTracker(
+        [big, small], {}, group_by="cluster_id", reader="scan"
+    )
+
+    order = []
+    for path, reader in tracker.event_readers.items():
+        read = reader.read
+
+        def recording_read(path=path, read=read, **kwargs):
+            assert "deadline" in kwargs
+            order.append(path)
+            return read(**kwargs)
+
+        reader.read = recording_read
+
+    try:
+        tracker.process_events(max_seconds=0.01)
+        # the small event log is read in full on the first pass
+        assert tracker.cluster_id_to_cluster[1000].status_counts() == {
+            JobStatus.COMPLETED: 10
+        }
+        assert tracker.behind == {big}
+        assert tracker.totals[TOTAL] < 50 * 1000 + 10
+
+        # and each pass starts with a different event log
+        tracker.process_events(max_seconds=0.01)
+        assert order == [big, small, small, big]
+
+        while len(tracker.behind) > 0:
+            tracker.process_events(max_seconds=0.01)
+        assert tracker.totals[JobStatus.COMPLETED] == 50 * 1000 + 10
+        assert_counts_add_up(tracker)
+    finally:
+        tracker.close()
+
+
+def test_concurrent_reads_match_sequential_reads(tmp_path):
+    paths = [str(tmp_path / "{}.log".format(n)) for n in range(6)]
+    for n, path in enumerate(paths):
+        # clusters are shared between the logs, so the order batches are
+        # applied in shows in the final states
+        write_events(path, finished_clusters(range(1, 4), 20 + n))
+        write_events(path, [(1, 1, n), (12, 2, n)])
+
+    def read(read_workers):
+        tracker = cwq.JobStateTracker(
+            paths, {}, group_by="cluster_id", reader="scan", read_workers=read_workers
+        )
+        applied = []
+        tracker.add_job_listener(RecordingListener(applied))
+        try:
+            while True:
+                tracker.process_events(max_events=25)
+                if len(tracker.behind) == 0:
+                    break
+            assert (tracker._executor is not None) == (read_workers > 1)
+            states = {
+                (cluster.cluster_id, proc_id): status
+                for cluster in tracker.clusters
+                for proc_id, status in cluster
+            }
+            return applied, states, dict(tracker.totals)
+        finally:
+            tracker.close()
+
+    assert read(4) == read(1)
+
+
+class RecordingListener(object):
+    def __init__(self, changes):
+        self.changes = changes
+
+    def job_changed(self, cluster_id, proc_id, group, old_status, new_status):
+        self.changes.append((cluster_id, proc_id, old_status, new_status))
@@ -0,0 +1,70 @@
+import getpass
+import sys
+import threading
+import time
+
+import pytest
+
+import condor_watch_q as cwq
+from condor_watch_q import JobStatus
+from helpers import write_events
+
+
+class Picked(Exception):
+    pass
+
+
+def test_watches_the_current_users_jobs_by_default(monkeypatch):
+    def discovery(users, cluster_ids, event_logs, batches, **kwargs):
+        raise Picked(users, cluster_ids, event_logs, batches)
+
+    monkeypatch.setattr(cwq, "JobDiscovery", discovery)
+    with pytest.raises(Picked) as e:
+        cwq.Watcher()
+    assert e.value.args == ([getpass.getuser()], None, None, None)
+
+
+@pytest.fixture
+def watcher(tmp_path):
+    event_log = str(tmp_path / "events.log")
+    write_events(event_log, [(0, 1, 0)])
+    watcher = cwq.Watcher(event_logs=[event_log], reader="scan", rediscover_interval=0)
+    yield watcher
+    watcher.close()
+
+
+def test_close_waits_for_the_poll_in_progress(watcher):
+    assert watcher.poll().snapshot.totals[JobStatus.IDLE] == 1
+
+    polled = []
+    poller = threading.Thread(target=lambda: polled.append(watcher.poll(1.0)))
+    poller.start()
+    time.sleep(0.1)
+    watcher.close()
+    poller.join()
+
+    assert polled[0].snapshot.totals[JobStatus.IDLE] == 1
+    # and nothing is read once it is closed
+    assert watcher.poll().changes == ()
+
+
+def test_backlog_is_in_the_snapshot_not_the_changes(watcher):
+    update = watcher.poll(1.0)
+    while not update.snapshot.caught_up:
+        assert update.changes == ()
+        update = watcher.poll(1.0)
+    assert update.changes == ()
+    assert update.snapshot.totals[JobStatus.IDLE] == 1
+
+
+def test_watching_event_logs_does_not_need_the_bindings(tmp_path, monkeypatch):
+    # importing a module that is None in sys.modules raises ImportError
+    monkeypatch.setitem(sys.modules, "classad", None)
+    monkeypatch.setitem(sys.modules, "htcondor", None)
+
+    event_log = str(tmp_path / "events.log")
+    write_events(event_log, [(0, 1, 0)])
+    with cwq.Watcher(
+        event_logs=[event_log], reader="scan", rediscover_interval=0
+    ) as watcher:
+        assert watcher.poll(1.0).snapshot.totals[JobStatus.IDLE] == 1
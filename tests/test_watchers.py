@@ -0,0 +1,65 @@
+import sys
+
+import pytest
+
+import condor_watch_q as cwq
+
+pytestmark = pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="inotify is Linux only"
+)
+
+
+@pytest.fixture
+def paths(tmp_path):
+    paths = [str(tmp_path / "{}.log".format(n)) for n in range(3)]
+    for path in paths:
+        open(path, "w").close()
+    return paths
+
+
+def test_queue_overflow_reports_every_path(paths, monkeypatch):
+    watcher = cwq.InotifyWatcher(paths, sweep_interval=60)
+    overflow = watcher.EVENT_HEADER.pack(-1, watcher.IN_Q_OVERFLOW, 0, 0)
+    monkeypatch.setattr(cwq.os, "read", lambda fd, size: overflow)
+    try:
+        assert watcher.wait(0) == set(paths)
+    finally:
+        monkeypatch.undo()
+        watcher.close()
+
+
+def test_sweep_catches_changes_inotify_missed(paths):
+    watcher = cwq.InotifyWatcher(paths, sweep_interval=0.2)
+    try:
+        with open(paths[1], "a") as f:
+            f.write("000 (1.000.000) 2020-01-01 00:00:00 x\n...\n")
+        # throw away the events, as if the write happened on another host
+        watcher._read_events()
+
+        assert watcher.wait(0) == set()
+        assert watcher.wait(1) == {paths[1]}
+        # and it isn't reported again by the next sweep
+        assert watcher.wait(0.5) == set()
+    finally:
+        watcher.close()
+
+
+def num_watches(watcher):
+    with open("/proc/self/fdinfo/{}".format(watcher._fd)) as f:
+        return sum(1 for line in f if line.startswith("inotify wd:"))
+
+
+def test_rotated_files_dont_keep_their_watches(paths):
+    watcher = cwq.InotifyWatcher(paths[:1], poll_interval=0.05, sweep_interval=60)
+    try:
+        for n in range(5):
+            cwq.os.rename(paths[0], "{}.{}".format(paths[0], n))
+            assert paths[0] in watcher.wait(1)
+
+            open(paths[0], "w").close()
+            assert paths[0] in watcher.wait(1)
+            assert len(watcher._polled) == 0
+
+            assert num_watches(watcher) == 1
+    finally:
+        watcher.close()